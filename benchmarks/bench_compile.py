@@ -0,0 +1,29 @@
+"""torch.compile bucket benchmark.
+
+Compiles KModel with length buckets, then prints per-bucket compile time and
+eager vs compiled latency. Run it twice to see the persistent inductor cache
+cut the compile column.
+Usage:
+python benchmarks/bench_compile.py --buckets 64 128 256 512 --cache-dir /tmp/kokoro-inductor
+"""
+import argparse
+
+from kokoro import KModel
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("Benchmark KModel.compile buckets", add_help=True)
+    parser.add_argument("--repo-id", "--repo_id", default="hexgrad/Kokoro-82M", help="model to load")
+    parser.add_argument("--device", default="cpu", help="device to run on")
+    parser.add_argument("--buckets", type=int, nargs="+", default=[64, 128, 256, 512], help="token buckets")
+    parser.add_argument("--frame-buckets", type=int, nargs="+", default=None, help="frame buckets (default: 4x token buckets)")
+    parser.add_argument("--cache-dir", default=None, help="inductor cache directory")
+    args = parser.parse_args()
+
+    model = KModel(repo_id=args.repo_id).to(args.device).eval()
+    report = model.compile(buckets=args.buckets, frame_buckets=args.frame_buckets, cache_dir=args.cache_dir)
+
+    print(f"{'stage':<8} {'bucket':>7} {'compile':>9} {'eager':>10} {'compiled':>10} {'speedup':>8}")
+    for stage, buckets in report.items():
+        for bucket, r in buckets.items():
+            print(f"{stage:<8} {bucket:>7} {r['compile']:>8.1f}s {r['eager'] * 1000:>8.1f}ms {r['compiled'] * 1000:>8.1f}ms {r['speedup']:>7.2f}x")
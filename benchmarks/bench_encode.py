@@ -0,0 +1,46 @@
+"""Unpadded encode fast path benchmark.
+
+Times KModel.encode on single utterances two ways: with input_lengths, which
+packs every LSTM and copies into zero-padded buffers as for a padded batch,
+and without, which runs the LSTMs on the dense tensor. Short lengths are
+where the fixed per-chunk overhead shows.
+Usage:
+python benchmarks/bench_encode.py --lengths 8 16 32 64 128 --runs 50
+"""
+import argparse
+import statistics
+import time
+
+import torch
+
+from kokoro import KModel
+
+
+def time_encode(model, input_ids, ref_s, input_lengths, runs):
+    times = []
+    for _ in range(runs + 3):
+        start = time.perf_counter()
+        model.encode(input_ids, ref_s, input_lengths=input_lengths)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times[3:])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("Benchmark the unpadded encode fast path", add_help=True)
+    parser.add_argument("--repo-id", "--repo_id", default="hexgrad/Kokoro-82M", help="model to load")
+    parser.add_argument("--device", default="cpu", help="device to run on")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[8, 16, 32, 64, 128], help="phonemes per utterance")
+    parser.add_argument("--runs", "-n", type=int, default=50, help="timed runs per length")
+    args = parser.parse_args()
+
+    model = KModel(repo_id=args.repo_id).to(args.device).eval()
+    ref_s = torch.randn(1, 256, device=model.device)
+    vocab = sorted(set(model.vocab.values()))
+
+    print(f"{'phonemes':>8} {'packed':>10} {'dense':>10} {'saving':>10}")
+    with torch.no_grad():
+        for n in args.lengths:
+            input_ids = torch.LongTensor([[0, *(vocab[i % len(vocab)] for i in range(n)), 0]]).to(model.device)
+            packed = time_encode(model, input_ids, ref_s, torch.LongTensor([n + 2]).to(model.device), args.runs)
+            dense = time_encode(model, input_ids, ref_s, None, args.runs)
+            print(f"{n:>8} {packed * 1000:>8.2f}ms {dense * 1000:>8.2f}ms {(packed - dense) * 1000:>8.2f}ms")
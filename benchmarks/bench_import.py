@@ -0,0 +1,41 @@
+"""Import-time benchmark.
+
+Each statement runs in a fresh interpreter, so nothing is cached between runs.
+Usage:
+python benchmarks/bench_import.py --runs 10
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+STATEMENTS = {
+    "import kokoro": "import kokoro",
+    "kokoro.KModel": "import kokoro; kokoro.KModel",
+    "kokoro.KPipeline": "import kokoro; kokoro.KPipeline",
+}
+
+
+def time_statement(statement: str, runs: int) -> list:
+    # Subtract interpreter startup so that only the import itself is measured
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", statement], check=True)
+        elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        times.append(elapsed - (time.perf_counter() - start))
+    return times
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("Benchmark kokoro import time", add_help=True)
+    parser.add_argument("--runs", "-n", type=int, default=5, help="fresh interpreters per statement")
+    args = parser.parse_args()
+
+    print(f"{'statement':<20} {'median':>10} {'min':>10}")
+    for name, statement in STATEMENTS.items():
+        times = time_statement(statement, args.runs)
+        print(f"{name:<20} {statistics.median(times) * 1000:>8.1f}ms {min(times) * 1000:>8.1f}ms")
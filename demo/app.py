@@ -1,5 +1,5 @@
 import spaces
-from kokoro import KModel, KPipeline
+from kokoro import KModel, KokoroRuntime, tuning
 import gradio as gr
 import os
 import random
@@ -7,16 +7,20 @@ import torch
 
 CUDA_AVAILABLE = torch.cuda.is_available()
 models = {gpu: KModel().to('cuda' if gpu else 'cpu').eval() for gpu in [False] + ([True] if CUDA_AVAILABLE else [])}
-pipelines = {lang_code: KPipeline(lang_code=lang_code, model=False) for lang_code in 'ab'}
-pipelines['a'].g2p.lexicon.golds['kokoro'] = 'kˈOkəɹO'
-pipelines['b'].g2p.lexicon.golds['kokoro'] = 'kˈQkəɹQ'
+tuning.apply(models[False])
+models[False].warmup(lengths=[64], runs=2)  # one short shape, so startup stays fast
+
+def add_golds(pipeline):
+    pipeline.g2p.lexicon.golds['kokoro'] = {'a': 'kˈOkəɹO', 'b': 'kˈQkəɹQ'}[pipeline.lang_code]
+
+runtime = KokoroRuntime(model=False, on_load=add_golds)
 
 @spaces.GPU(duration=30)
 def forward_gpu(ps, ref_s, speed):
     return models[True](ps, ref_s, speed)
 
 def generate_first(text, voice='af_heart', speed=1, use_gpu=CUDA_AVAILABLE):
-    pipeline = pipelines[voice[0]]
+    pipeline = runtime.pipeline(voice)
     pack = pipeline.load_voice(voice)
     use_gpu = use_gpu and CUDA_AVAILABLE
     for _, ps, _ in pipeline(text, voice, speed):
@@ -41,13 +45,13 @@ def predict(text, voice='af_heart', speed=1):
     return generate_first(text, voice, speed, use_gpu=False)[0]
 
 def tokenize_first(text, voice='af_heart'):
-    pipeline = pipelines[voice[0]]
+    pipeline = runtime.pipeline(voice)
     for _, ps, _ in pipeline(text, voice):
         return ps
     return ''
 
 def generate_all(text, voice='af_heart', speed=1, use_gpu=CUDA_AVAILABLE):
-    pipeline = pipelines[voice[0]]
+    pipeline = runtime.pipeline(voice)
     pack = pipeline.load_voice(voice)
     use_gpu = use_gpu and CUDA_AVAILABLE
     first = True
@@ -115,7 +119,7 @@ CHOICES = {
 '🇬🇧 🚹 Daniel': 'bm_daniel',
 }
 for v in CHOICES.values():
-    pipelines[v[0]].load_voice(v)
+    runtime.pipeline(v).load_voice(v)
 
 TOKEN_NOTE = '''
 💡 Customize pronunciation with Markdown link syntax and /slashes/ like `[Kokoro](/kˈOkəɹO/)`
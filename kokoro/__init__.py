@@ -1,6 +1,8 @@
 __version__ = '0.9.4'
 
 from loguru import logger
+from typing import TYPE_CHECKING
+import importlib
 import sys
 
 # Remove default handler
@@ -19,5 +21,29 @@ logger.add(
 # Disable before release or as needed
 logger.disable("kokoro")
 
-from .model import KModel
-from .pipeline import KPipeline
+# KModel and KPipeline are imported on first access, so that `import kokoro`
+# does not pay for torch, misaki/spaCy and friends until they are needed
+_LAZY = {
+    'KModel': '.model',
+    'KPipeline': '.pipeline',
+    'KPipelinePool': '.pool',
+    'KokoroRuntime': '.runtime',
+}
+
+__all__ = ['KModel', 'KPipeline', 'KPipelinePool', 'KokoroRuntime']
+
+if TYPE_CHECKING:
+    from .model import KModel
+    from .pipeline import KPipeline
+    from .pool import KPipelinePool
+    from .runtime import KokoroRuntime
+
+def __getattr__(name: str):
+    if name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted({*globals(), *_LAZY})
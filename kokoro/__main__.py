@@ -5,6 +5,16 @@ python3 -m kokoro --text "The sky above the port was the color of television, tu
 echo "Bom dia mundo, como vão vocês" > text.txt
 python3 -m kokoro -i text.txt -l p --voice pm_alex > audio.wav
 
+Populate the local registry for offline use (see kokoro/registry.py):
+python3 -m kokoro fetch --repo-id hexgrad/Kokoro-82M --voices af_heart,pm_alex
+KOKORO_OFFLINE=1 python3 -m kokoro --text "No network needed." -o file.wav
+
+Re-render only the chunks of a long text that changed since the last run:
+python3 -m kokoro -i book.txt -o book.wav --incremental --seed 0
+
+Sweep CPU threads/workers/STFT backend once per machine; synthesis then applies the profile:
+python3 -m kokoro tune --p95 1.5
+
 Common issues:
 pip not installed: `uv pip install pip`
 (Temporary workaround while https://github.com/explosion/spaCy/issues/13747 is not fixed)
@@ -13,11 +23,11 @@ espeak not installed: `apt-get install espeak-ng`
 """
 
 import argparse
+import sys
 import wave
 from pathlib import Path
-from typing import Generator, TYPE_CHECKING
+from typing import Generator, List, Optional, TYPE_CHECKING
 
-import numpy as np
 from loguru import logger
 
 languages = [
@@ -37,26 +47,33 @@ if TYPE_CHECKING:
 
 
 def generate_audio(
-    text: str, kokoro_language: str, voice: str, speed=1
+    text: str, kokoro_language: str, voice: str, speed=1, seed: Optional[int] = None,
+    batch_chunks: Optional[int] = None
 ) -> Generator["KPipeline.Result", None, None]:
-    from kokoro import KPipeline
+    from kokoro import KPipeline, tuning
 
     if not voice.startswith(kokoro_language):
         logger.warning(f"Voice {voice} is not made for language {kokoro_language}")
     pipeline = KPipeline(lang_code=kokoro_language)
-    yield from pipeline(text, voice=voice, speed=speed, split_pattern=r"\n+")
+    profile = tuning.apply(pipeline.model)
+    if batch_chunks is None:
+        batch_chunks = profile.batch_chunks if profile else 1
+    yield from pipeline(text, voice=voice, speed=speed, split_pattern=r"\n+", seed=seed, batch_chunks=batch_chunks)
 
 
 def generate_and_save_audio(
-    output_file: Path, text: str, kokoro_language: str, voice: str, speed=1
+    output_file: Path, text: str, kokoro_language: str, voice: str, speed=1, seed: Optional[int] = None,
+    batch_chunks: Optional[int] = None
 ) -> None:
+    import numpy as np
+
     with wave.open(str(output_file.resolve()), "wb") as wav_file:
         wav_file.setnchannels(1)  # Mono audio
         wav_file.setsampwidth(2)  # 2 bytes per sample (16-bit audio)
         wav_file.setframerate(24000)  # Sample rate
 
         for result in generate_audio(
-            text, kokoro_language=kokoro_language, voice=voice, speed=speed
+            text, kokoro_language=kokoro_language, voice=voice, speed=speed, seed=seed, batch_chunks=batch_chunks
         ):
             logger.debug(result.phonemes)
             if result.audio is None:
@@ -65,7 +82,132 @@ def generate_and_save_audio(
             wav_file.writeframes(audio_bytes)
 
 
-def main() -> None:
+def fetch(argv: List[str]) -> None:
+    from kokoro.registry import LocalRegistry
+
+    parser = argparse.ArgumentParser(
+        prog="kokoro fetch",
+        description="Download a model and its voices into the local registry",
+    )
+    parser.add_argument(
+        "--root",
+        help="Registry directory (default: $KOKORO_HOME or ~/.cache/kokoro)",
+    )
+    parser.add_argument(
+        "--repo-id",
+        "--repo_id",
+        default="hexgrad/Kokoro-82M",
+        help="Model repo to fetch",
+    )
+    parser.add_argument(
+        "--voices",
+        help="Comma-separated voices to fetch (default: every voice in the repo)",
+    )
+    args = parser.parse_args(argv)
+    voices = args.voices.split(",") if args.voices else None
+    registry = LocalRegistry(args.root)
+    registry.fetch(args.repo_id, voices=voices)
+    print(f"Fetched {args.repo_id} into {registry.root}")
+
+
+def tune(argv: List[str]) -> None:
+    from kokoro import tuning
+
+    parser = argparse.ArgumentParser(
+        prog="kokoro tune",
+        description="Find the fastest CPU worker layout and save it as the tuning profile",
+    )
+    parser.add_argument(
+        "--repo-id",
+        "--repo_id",
+        default="hexgrad/Kokoro-82M",
+        help="Model to benchmark",
+    )
+    parser.add_argument(
+        "-m",
+        "--voice",
+        default="af_heart",
+        help="Voice name or .pt path",
+    )
+    parser.add_argument(
+        "--p95",
+        type=float,
+        default=2.0,
+        help="Target p95 latency per request, in seconds",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        help="Worker counts to try (default: 1, 2, 4, ... up to the CPU count)",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        nargs="+",
+        help="Intra-op threads per worker to try (default: 1, 2, 4, ... up to the CPU count)",
+    )
+    parser.add_argument(
+        "--stft",
+        nargs="+",
+        choices=["torch", "custom", "fft"],
+        help="STFT backends to try (default: all)",
+    )
+    parser.add_argument(
+        "--lengths",
+        type=int,
+        nargs="+",
+        default=list(tuning.LENGTHS),
+        help="Phoneme lengths of the request mix",
+    )
+    parser.add_argument(
+        "--requests",
+        type=int,
+        help="Requests per worker per configuration (default: twice the length mix)",
+    )
+    parser.add_argument(
+        "--batch-chunks",
+        "--batch_chunks",
+        type=int,
+        nargs="+",
+        default=list(tuning.BATCH_CHUNKS),
+        help="Chunks per model pass to try on the best layout, for whole-text synthesis",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Profile path (default: $KOKORO_TUNING or $KOKORO_HOME/tuning.json)",
+    )
+    args = parser.parse_args(argv)
+    profile, results = tuning.tune(
+        voice=args.voice,
+        target_p95=args.p95,
+        workers=args.workers,
+        threads=args.threads,
+        stfts=args.stft,
+        repo_id=args.repo_id,
+        lengths=args.lengths,
+        requests=args.requests,
+        batch_chunks=args.batch_chunks,
+    )
+    print(f"{'workers':>7} {'threads':>7} {'stft':>6} {'batch':>5} {'req/s':>8} {'p50':>8} {'p95':>8}")
+    for r in results:
+        print(f"{r['workers']:>7} {r['threads']:>7} {r['stft']:>6} {r['batch_chunks']:>5} {r['throughput']:>8.2f} {r['p50']:>7.3f}s {r['p95']:>7.3f}s")
+    path = tuning.save(profile, args.output)
+    print(f"Saved {profile.workers} worker(s) x {profile.threads} thread(s), stft={profile.stft}, batch_chunks={profile.batch_chunks} to {path}")
+
+
+COMMANDS = {
+    "fetch": fetch,
+    "tune": tune,
+}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "-m",
@@ -106,12 +248,28 @@ def main() -> None:
         default=1.0,
         help="Speech speed",
     )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only synthesize chunks that changed since the last run on this output file (keeps <output>.json)",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        help="Seed each chunk, so output is reproducible",
+    )
+    parser.add_argument(
+        "--batch-chunks",
+        "--batch_chunks",
+        type=int,
+        help="Synthesize this many chunks per model pass (default: the tuning profile's, else 1)",
+    )
     parser.add_argument(
         "--debug",
         action="store_true",
         help="Print DEBUG messages to console",
     )
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     if args.debug:
         logger.level("DEBUG")
     logger.debug(args)
@@ -126,21 +284,29 @@ def main() -> None:
         file: Path = args.input_file
         text = file.read_text()
     else:
-        import sys
         print("Press Ctrl+D to stop reading input and start generating", flush=True)
         text = '\n'.join(sys.stdin)
 
-    logger.debug(f"Input text: {text!r}")
+    logger.debug("Input text: {!r}", text)
 
     out_file: Path = args.output_file
     if not out_file.suffix == ".wav":
         logger.warning("The output file name should end with .wav")
+    if args.incremental:
+        from kokoro import KPipeline, manifest, tuning
+
+        pipeline = KPipeline(lang_code=lang)
+        tuning.apply(pipeline.model)
+        manifest.render(pipeline, text, str(out_file), voice=args.voice, speed=args.speed, seed=args.seed)
+        return
     generate_and_save_audio(
         output_file=out_file,
         text=text,
         kokoro_language=lang,
         voice=args.voice,
         speed=args.speed,
+        seed=args.seed,
+        batch_chunks=args.batch_chunks,
     )
 
 
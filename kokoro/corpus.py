@@ -0,0 +1,209 @@
+'''
+Pre-phonemized corpus: run G2P once, synthesize many times.
+
+    from kokoro import KPipeline
+    from kokoro.corpus import Corpus, write
+
+    pipeline = KPipeline(lang_code='a', model=False)
+    write('catalogue.kc', pipeline, texts)
+    corpus = Corpus('catalogue.kc')  # memory-mapped
+    for voice in ('af_heart', 'am_adam'):
+        for result in corpus.synthesize(model, pipeline.load_voice(voice)):
+            ...
+
+The file is a header followed by flat little-endian arrays, each 64-byte aligned:
+
+    b'KOKOROC1' | uint64 header length | JSON header | arrays...
+
+The header records the repo_id, lang_code, vocab and each array's dtype, shape
+and offset. Strings live in one utf-8 blob and are referenced by [start, end)
+byte spans. C is the number of chunks, T the number of tokens:
+
+    ids            uint8/int16 [N]  vocab ids of every chunk, back to back, no 0 pads
+    chunk_ids      int64 [C+1]      chunk i is ids[chunk_ids[i]:chunk_ids[i+1]]
+    chunk_length   int32 [C]        len(phonemes), which picks the voice pack row
+    chunk_text     int32 [C]        text_index, as in KPipeline.Result
+    chunk_spans    int64 [C, 4]     graphemes and phonemes spans into strings
+    chunk_tokens   int64 [C+1]      chunk i has tokens chunk_tokens[i]:chunk_tokens[i+1]
+    token_spans    int64 [T, 8]     text, tag, whitespace and phonemes spans into strings
+    strings        uint8 [S]
+
+Only English pipelines produce tokens, so other languages have T = 0.
+'''
+from .pipeline import KPipeline
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Dict, Generator, Iterable, List, Optional, Union
+import json
+import numpy as np
+import struct
+import torch
+
+if TYPE_CHECKING:
+    from .model import KModel
+    from misaki import en
+
+MAGIC = b'KOKOROC1'
+ALIGN = 64
+
+class Strings:
+    '''Append-only utf-8 blob handing out byte spans.'''
+    def __init__(self):
+        self.blob = bytearray()
+
+    def add(self, s: Optional[str]) -> List[int]:
+        start = len(self.blob)
+        self.blob += (s or '').encode('utf-8')
+        return [start, len(self.blob)]
+
+def write(
+    path: str,
+    pipeline: KPipeline,
+    text: Union[str, List[str]],
+    split_pattern: Optional[str] = r'\n+',
+    vocab: Optional[Dict[str, int]] = None
+) -> int:
+    '''
+    Phonemize and chunk text with a quiet pipeline (model=False) and write it to path.
+    vocab defaults to the pipeline's repo config. Returns the number of chunks.
+    '''
+    if pipeline.model is not None:
+        raise ValueError('Pass a quiet pipeline: KPipeline(lang_code=..., model=False)')
+    if vocab is None:
+        from .model import KModel
+        vocab = KModel.load_config(pipeline.repo_id)['vocab']
+    strings = Strings()
+    ids, chunk_ids, chunk_length, chunk_text, chunk_spans = [], [0], [], [], []
+    chunk_tokens, token_spans = [0], []
+    for result in pipeline(text, split_pattern=split_pattern):
+        ps = result.phonemes
+        ids.extend(i for i in map(vocab.get, ps) if i is not None)
+        chunk_ids.append(len(ids))
+        chunk_length.append(len(ps))
+        chunk_text.append(result.text_index or 0)
+        chunk_spans.append(strings.add(result.graphemes) + strings.add(ps))
+        for t in result.tokens or ():
+            token_spans.append(strings.add(t.text) + strings.add(t.tag) + strings.add(t.whitespace) + strings.add(t.phonemes))
+        chunk_tokens.append(len(token_spans))
+    arrays = {
+        'ids': np.asarray(ids, dtype=np.uint8 if max(vocab.values(), default=0) < 256 else np.int16),
+        'chunk_ids': np.asarray(chunk_ids, dtype=np.int64),
+        'chunk_length': np.asarray(chunk_length, dtype=np.int32),
+        'chunk_text': np.asarray(chunk_text, dtype=np.int32),
+        'chunk_spans': np.asarray(chunk_spans, dtype=np.int64).reshape(-1, 4),
+        'chunk_tokens': np.asarray(chunk_tokens, dtype=np.int64),
+        'token_spans': np.asarray(token_spans, dtype=np.int64).reshape(-1, 8),
+        'strings': np.frombuffer(bytes(strings.blob), dtype=np.uint8),
+    }
+    header = {
+        'version': 1, 'repo_id': pipeline.repo_id, 'lang_code': pipeline.lang_code, 'vocab': vocab,
+        'arrays': {}
+    }
+    # Offsets depend on the header length, which depends on the offsets: fix the point by iterating
+    size = 0
+    while True:
+        offset = Corpus.aligned(len(MAGIC) + 8 + size)
+        for name, array in arrays.items():
+            header['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            offset = Corpus.aligned(offset + array.nbytes)
+        encoded = json.dumps(header, ensure_ascii=False).encode('utf-8')
+        if len(encoded) <= size:
+            break
+        size = len(encoded)
+    with open(path, 'wb') as w:
+        w.write(MAGIC + struct.pack('<Q', size) + encoded.ljust(size))
+        for name, array in arrays.items():
+            w.write(b'\0' * (header['arrays'][name]['offset'] - w.tell()))
+            w.write(np.ascontiguousarray(array).tobytes())
+    return len(chunk_length)
+
+@dataclass
+class Chunk:
+    graphemes: str
+    phonemes: str
+    input_ids: torch.LongTensor  # no 0 pads, ready for KModel.forward_ids
+    text_index: int
+    tokens: Optional[List['en.MToken']] = None
+
+class Corpus:
+    '''Memory-mapped reader for files made by write(). Indexing returns a Chunk.'''
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as r:
+            if r.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{path} is not a kokoro corpus')
+            size, = struct.unpack('<Q', r.read(8))
+            self.header = json.loads(r.read(size).decode('utf-8'))
+        if self.header['version'] != 1:
+            raise ValueError(f"Unsupported corpus version {self.header['version']}")
+        self.repo_id, self.lang_code, self.vocab = self.header['repo_id'], self.header['lang_code'], self.header['vocab']
+        self.arrays = {
+            name: np.memmap(path, dtype=np.dtype(a['dtype']), mode='r', offset=a['offset'], shape=tuple(a['shape']))
+            if np.prod(a['shape']) else np.empty(a['shape'], dtype=np.dtype(a['dtype']))
+            for name, a in self.header['arrays'].items()
+        }
+
+    @staticmethod
+    def aligned(offset: int) -> int:
+        return -(-offset // ALIGN) * ALIGN
+
+    def __len__(self) -> int:
+        return len(self.arrays['chunk_length'])
+
+    def string(self, start: int, end: int) -> str:
+        return bytes(self.arrays['strings'][start:end]).decode('utf-8')
+
+    def input_ids(self, index: int) -> torch.LongTensor:
+        a, b = self.arrays['chunk_ids'][index:index+2]
+        return torch.from_numpy(np.asarray(self.arrays['ids'][a:b], dtype=np.int64))
+
+    def tokens(self, index: int) -> Optional[List['en.MToken']]:
+        a, b = self.arrays['chunk_tokens'][index:index+2]
+        if a == b:
+            return None
+        from misaki import en
+        return [
+            en.MToken(
+                text=self.string(*spans[0:2]), tag=self.string(*spans[2:4]),
+                whitespace=self.string(*spans[4:6]), phonemes=self.string(*spans[6:8])
+            )
+            for spans in self.arrays['token_spans'][a:b].tolist()
+        ]
+
+    def __getitem__(self, index: int) -> Chunk:
+        spans = self.arrays['chunk_spans'][index].tolist()
+        return Chunk(
+            graphemes=self.string(*spans[0:2]), phonemes=self.string(*spans[2:4]),
+            input_ids=self.input_ids(index), text_index=int(self.arrays['chunk_text'][index]),
+            tokens=self.tokens(index)
+        )
+
+    def __iter__(self) -> Iterable[Chunk]:
+        return (self[i] for i in range(len(self)))
+
+    def synthesize(
+        self,
+        model: 'KModel',
+        pack: torch.FloatTensor,
+        speed: Union[float, Callable[[int], float]] = 1,
+        indices: Optional[Iterable[int]] = None,
+        seed: Optional[int] = None
+    ) -> Generator[KPipeline.Result, None, None]:
+        '''
+        Synthesize chunks (default: all) with no G2P or phoneme lookup, yielding
+        what KPipeline would for the same text, voice pack, speed and seed.
+        '''
+        if model.vocab != self.vocab:
+            raise ValueError(f'{self.path} was written with a different vocab than the model')
+        pack = pack.to(model.device)
+        for i in range(len(self)) if indices is None else indices:
+            chunk = self[i]
+            n = int(self.arrays['chunk_length'][i])
+            output = model.forward_ids(
+                chunk.input_ids, pack[n-1], speed(n) if callable(speed) else speed, return_output=True, seed=seed
+            )
+            if chunk.tokens is not None and output.pred_dur is not None:
+                KPipeline.join_timestamps(chunk.tokens, output.pred_dur)
+            yield KPipeline.Result(
+                graphemes=chunk.graphemes, phonemes=chunk.phonemes, tokens=chunk.tokens,
+                output=output, text_index=chunk.text_index
+            )
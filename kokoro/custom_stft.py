@@ -1,9 +1,30 @@
-from attr import attr
 import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
+def overlap_add_frames(frames: torch.Tensor, hop_length: int):
+    """
+    Overlap-add (B, frames, n_fft) at hop_length => (B, 1, (frames - 1) * hop_length + n_fft).
+    """
+    n_frames, n_fft = frames.shape[1], frames.shape[2]
+    return F.fold(
+        frames.transpose(1, 2), output_size=(1, (n_frames - 1) * hop_length + n_fft),
+        kernel_size=(1, n_fft), stride=(1, hop_length)
+    ).squeeze(2)
+
+
+def irfft_overlap_add(magnitude: torch.Tensor, phase: torch.Tensor, window: torch.Tensor, hop_length: int):
+    """
+    irfft each (B, freq_bins, frames) column, window and overlap-add => returns waveform, envelope
+    envelope is the overlap-added squared window; dividing by it completes the inverse STFT.
+    """
+    spec = torch.complex(magnitude * torch.cos(phase), magnitude * torch.sin(phase))
+    frames = torch.fft.irfft(spec.transpose(1, 2), n=window.shape[-1], dim=-1) * window  # (B, frames, n_fft)
+    envelope = overlap_add_frames((window**2).expand(1, frames.shape[1], -1), hop_length)
+    return overlap_add_frames(frames, hop_length), envelope
+
+
 class CustomSTFT(nn.Module):
     """
     STFT/iSTFT without unfold/complex ops, using conv1d and conv_transpose1d.
@@ -74,19 +95,19 @@ class CustomSTFT(nn.Module):
         )
 
         # Precompute inverse DFT
-        # Real iFFT formula => scale = 1/n_fft, doubling for bins 1..freq_bins-2 if n_fft even, etc.
-        # For simplicity, we won't do the "DC/nyquist not doubled" approach here. 
-        # If you want perfect real iSTFT, you can add that logic. 
-        # This version just yields good approximate reconstruction with Hann + typical overlap.
-        inv_scale = 1.0 / self.n_fft
+        # Real iFFT formula => scale = 1/n_fft for DC (and Nyquist if n_fft is even),
+        # 2/n_fft for the bins in between, whose negative-frequency mirrors are not stored.
+        inv_scale = np.full(self.freq_bins, 2.0 / self.n_fft)
+        inv_scale[0] = 1.0 / self.n_fft
+        if self.n_fft % 2 == 0:
+            inv_scale[-1] = 1.0 / self.n_fft
         n = np.arange(self.n_fft)
         angle_t = 2 * np.pi * np.outer(n, k) / self.n_fft  # shape (n_fft, freq_bins)
-        idft_cos = np.cos(angle_t).T  # => (freq_bins, n_fft)
-        idft_sin = np.sin(angle_t).T  # => (freq_bins, n_fft)
+        idft_cos = np.cos(angle_t).T * inv_scale[:, None]  # => (freq_bins, n_fft)
+        idft_sin = np.sin(angle_t).T * inv_scale[:, None]  # => (freq_bins, n_fft)
 
         # Multiply by window again for typical overlap-add
-        # We also incorporate the scale factor 1/n_fft
-        inv_window = window_tensor.numpy() * inv_scale
+        inv_window = window_tensor.numpy()
         backward_real = idft_cos * inv_window  # (freq_bins, n_fft)
         backward_imag = idft_sin * inv_window
 
@@ -97,6 +118,7 @@ class CustomSTFT(nn.Module):
         self.register_buffer(
             "weight_backward_imag", torch.from_numpy(backward_imag).float().unsqueeze(1)
         )
+        self.register_buffer("window_sq", (window_tensor**2).view(1, 1, -1))
         
 
 
@@ -139,22 +161,18 @@ class CustomSTFT(nn.Module):
         return magnitude, phase
 
 
-    def inverse(self, magnitude: torch.Tensor, phase: torch.Tensor, length=None):
+    def overlap_add(self, magnitude: torch.Tensor, phase: torch.Tensor):
         """
-        Inverse STFT => returns waveform shape (B, T).
+        Windowed frames overlap-added, before normalization => returns waveform, envelope
+        Output shapes => (B, 1, (frames - 1) * hop_length + filter_length), (1, 1, same)
         """
         # magnitude, phase => (B, freq_bins, frames)
         # Re-create real/imag => shape (B, freq_bins, frames)
         real_part = magnitude * torch.cos(phase)
         imag_part = magnitude * torch.sin(phase)
 
-        # conv_transpose wants shape (B, freq_bins, frames). We'll treat "frames" as time dimension
-        # so we do (B, freq_bins, frames) => (B, freq_bins, frames)
-        # But PyTorch conv_transpose1d expects (B, in_channels, input_length)
-        real_part = real_part  # (B, freq_bins, frames)
-        imag_part = imag_part
-
         # real iSTFT => convolve with "backward_real", "backward_imag", and sum
+        # conv_transpose1d treats frames as the input length: (B, in_channels=freq_bins, frames)
         # We'll do 2 conv_transpose calls, each giving (B, 1, time),
         # then add them => (B, 1, time).
         real_rec = F.conv_transpose1d(
@@ -174,6 +192,23 @@ class CustomSTFT(nn.Module):
         # sum => (B, 1, time)
         waveform = real_rec - imag_rec  # typical real iFFT has minus for imaginary part
 
+        # Overlap-added squared window, which torch.istft divides by
+        envelope = F.conv_transpose1d(
+            torch.ones_like(magnitude[:1, :1]),
+            self.window_sq,  # shape (1, 1, filter_length)
+            bias=None,
+            stride=self.hop_length,
+            padding=0,
+        )
+        return waveform, envelope
+
+    def inverse(self, magnitude: torch.Tensor, phase: torch.Tensor, length=None):
+        """
+        Inverse STFT => returns waveform shape (B, 1, T).
+        """
+        waveform, envelope = self.overlap_add(magnitude, phase)
+        waveform = waveform / envelope.clamp(min=1e-11)
+
         # If we used "center=True" in forward, we should remove pad
         if self.center:
             pad_len = self.n_fft // 2
@@ -181,11 +216,12 @@ class CustomSTFT(nn.Module):
             # We remove `pad_len` from start & end if possible
             waveform = waveform[..., pad_len:-pad_len]
 
-        # If a specific length is desired, clamp
+        # If a specific length is desired, clamp or zero-pad
         if length is not None:
             waveform = waveform[..., :length]
+            waveform = F.pad(waveform, (0, length - waveform.shape[-1]))
 
-        # shape => (B, T)
+        # shape => (B, 1, T)
         return waveform
 
     def forward(self, x: torch.Tensor):
@@ -195,3 +231,136 @@ class CustomSTFT(nn.Module):
         """
         mag, phase = self.transform(x)
         return self.inverse(mag, phase, length=x.shape[-1])
+
+
+class FFTSTFT(nn.Module):
+    """
+    STFT/iSTFT with real FFTs over strided frames, using rfft/irfft and overlap-add.
+
+    - forward STFT => unfold into frames + rfft, O(N log K) rather than O(N K) for CustomSTFT
+    - inverse STFT => irfft + F.fold overlap-add + window-envelope normalization
+    - complex values only live between rfft/irfft and the real/imag split;
+      magnitude and phase in and out are real, like CustomSTFT
+    - reflect padding for 'center=True', so it matches torch.stft/istft
+    """
+
+    def __init__(
+        self,
+        filter_length=800,
+        hop_length=200,
+        win_length=800,
+        window="hann",
+        center=True,
+        pad_mode="reflect",
+    ):
+        super().__init__()
+        self.filter_length = filter_length
+        self.hop_length = hop_length
+        self.win_length = win_length
+        self.n_fft = filter_length
+        self.center = center
+        self.pad_mode = pad_mode
+
+        assert window == 'hann', window
+        window_tensor = torch.hann_window(win_length, periodic=True, dtype=torch.float32)
+        if self.win_length < self.n_fft:
+            # Centered zero-pad up to n_fft, as torch.stft does
+            left = (self.n_fft - self.win_length) // 2
+            window_tensor = F.pad(window_tensor, (left, self.n_fft - self.win_length - left))
+        elif self.win_length > self.n_fft:
+            window_tensor = window_tensor[: self.n_fft]
+        self.register_buffer("window", window_tensor)
+
+    def transform(self, waveform: torch.Tensor):
+        """
+        Forward STFT => returns magnitude, phase
+        Output shape => (batch, freq_bins, frames)
+        """
+        if self.center:
+            pad_len = self.n_fft // 2
+            waveform = F.pad(waveform.unsqueeze(1), (pad_len, pad_len), mode=self.pad_mode).squeeze(1)
+        frames = waveform.unfold(-1, self.n_fft, self.hop_length) * self.window  # (B, frames, n_fft)
+        spec = torch.fft.rfft(frames, dim=-1)
+        real, imag = spec.real.transpose(1, 2), spec.imag.transpose(1, 2)  # (B, freq_bins, frames)
+        magnitude = torch.sqrt(real**2 + imag**2)
+        phase = torch.atan2(imag, real)
+        return magnitude, phase
+
+    def overlap_add(self, magnitude: torch.Tensor, phase: torch.Tensor):
+        """
+        Windowed frames overlap-added, before normalization => returns waveform, envelope
+        Output shapes => (B, 1, (frames - 1) * hop_length + filter_length), (1, 1, same)
+        """
+        return irfft_overlap_add(magnitude, phase, self.window, self.hop_length)
+
+    def inverse(self, magnitude: torch.Tensor, phase: torch.Tensor, length=None):
+        """
+        Inverse STFT => returns waveform shape (B, 1, T).
+        """
+        waveform, envelope = self.overlap_add(magnitude, phase)
+        waveform = waveform / envelope.clamp(min=1e-11)
+        size = waveform.shape[-1]
+
+        if self.center:
+            pad_len = self.n_fft // 2
+            waveform = waveform[..., pad_len:size - pad_len]
+        if length is not None:
+            waveform = waveform[..., :length]
+            waveform = F.pad(waveform, (0, length - waveform.shape[-1]))
+        return waveform
+
+    def forward(self, x: torch.Tensor):
+        mag, phase = self.transform(x)
+        return self.inverse(mag, phase, length=x.shape[-1])
+
+
+class StreamingISTFT:
+    """
+    Incremental inverse STFT for a backend with overlap_add (CustomSTFT, FFTSTFT, TorchSTFT).
+
+    - push(magnitude, phase) takes (B, freq_bins, frames) blocks of any size and returns
+      the samples that no later frame overlaps, already window-sum normalized
+    - the unnormalized overlap-add tail and its window sum carry over between calls
+    - flush() returns the remaining samples and resets, ready for the next utterance
+    - concatenated outputs equal stft.inverse(magnitude, phase) on the whole spectrogram
+    """
+
+    def __init__(self, stft):
+        self.stft = stft
+        self.hop_length = stft.hop_length
+        self.pad_len = stft.filter_length // 2 if getattr(stft, 'center', True) else 0
+        self.reset()
+
+    def reset(self):
+        self.tail = self.envelope_tail = None
+        self.skip = self.pad_len  # center padding still to drop from the front
+
+    def _emit(self, waveform: torch.Tensor, envelope: torch.Tensor):
+        waveform = waveform / envelope.clamp(min=1e-11)
+        skip = min(self.skip, waveform.shape[-1])
+        self.skip -= skip
+        return waveform[..., skip:]
+
+    def push(self, magnitude: torch.Tensor, phase: torch.Tensor):
+        """
+        Add a block of frames => returns the completed samples, shape (B, 1, T)
+        """
+        waveform, envelope = self.stft.overlap_add(magnitude, phase)
+        if self.tail is not None:
+            overlap = self.tail.shape[-1]
+            waveform[..., :overlap] += self.tail
+            envelope[..., :overlap] += self.envelope_tail
+        # The next frame starts here, so everything before it is final
+        done = magnitude.shape[-1] * self.hop_length
+        self.tail, self.envelope_tail = waveform[..., done:], envelope[..., done:]
+        return self._emit(waveform[..., :done], envelope[..., :done])
+
+    def flush(self):
+        """
+        End the stream => returns the samples left in the tail, shape (B, 1, T)
+        """
+        assert self.tail is not None, 'flush() before any push()'
+        end = self.tail.shape[-1] - self.pad_len
+        waveform = self._emit(self.tail[..., :end], self.envelope_tail[..., :end])
+        self.reset()
+        return waveform
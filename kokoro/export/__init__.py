@@ -0,0 +1 @@
+'''Export targets for KModel. Each submodule imports its own optional dependencies.'''
@@ -0,0 +1,158 @@
+'''
+Ahead-of-time compiled KModel artifacts, via torch.export and AOTInductor.
+
+    from kokoro import KModel, KPipeline
+    from kokoro.export.aot import export
+
+    export(KModel(repo_id='hexgrad/Kokoro-82M'), 'kokoro-aot')  # once, on the target machine type
+    model = KModel.from_compiled('kokoro-aot')                   # in each worker: no compile step
+    pipeline = KPipeline(lang_code='a', repo_id='hexgrad/Kokoro-82M', model=model)
+
+An artifact is a directory holding two packages and their metadata:
+
+    encoder.pt2   input_ids, ref_s, speed -> pred_dur, d, t_en   (dynamic token axis)
+    decoder.pt2   en, asr, ref_s -> audio                        (dynamic frame axis)
+    kokoro.json   vocab, context_length, device and torch version
+
+The model is split at the duration alignment because the frame count depends on
+predicted durations, and the decoder's LSTM cannot be exported over a
+data-dependent length. Alignment runs eagerly between the two packages.
+
+Artifacts contain native code: load them with the torch version and device type
+they were compiled for. Exporting requires a C++ toolchain.
+'''
+from ..model import KModel
+from ..modules import EXPORTABLE
+from ..profiling import StageTimer, untimed
+from loguru import logger
+from typing import Dict, Hashable, Optional, Union
+import json
+import os
+import time
+import torch
+
+ENCODER = 'encoder.pt2'
+DECODER = 'decoder.pt2'
+METADATA = 'kokoro.json'
+
+class Encoder(torch.nn.Module):
+    def __init__(self, kmodel: KModel):
+        super().__init__()
+        self.kmodel = kmodel
+
+    def forward(self, input_ids: torch.LongTensor, ref_s: torch.FloatTensor, speed: torch.FloatTensor):
+        return self.kmodel.encode(input_ids, ref_s, speed)
+
+class Decoder(torch.nn.Module):
+    def __init__(self, kmodel: KModel):
+        super().__init__()
+        self.kmodel = kmodel
+
+    def forward(self, en: torch.FloatTensor, asr: torch.FloatTensor, ref_s: torch.FloatTensor):
+        return self.kmodel.decode(en, asr, ref_s)
+
+def export(kmodel: KModel, path: str, max_frames: Optional[int] = None) -> str:
+    '''
+    Export and AOT-compile kmodel into the directory path, for kmodel's device.
+
+    max_frames bounds the decoder's frame axis (default: context_length * 50,
+    the longest alignment max_dur allows).
+    '''
+    if not EXPORTABLE or not hasattr(torch._inductor, 'aoti_compile_and_package'):
+        raise RuntimeError(f'AOT export needs torch.export custom ops and AOTInductor packages, not in torch {torch.__version__}')
+    kmodel = kmodel.eval()
+    device = kmodel.device
+    os.makedirs(path, exist_ok=True)
+    tokens = torch.export.Dim('tokens', min=3, max=kmodel.context_length)
+    frames = torch.export.Dim('frames', min=3, max=max_frames or kmodel.context_length * 50)
+    input_ids = torch.randint(1, len(kmodel.vocab), (1, 50), device=device)
+    ref_s = torch.randn(1, 256, device=device)
+    speed = torch.ones(1, device=device)
+    with torch.no_grad():
+        pred_dur, d, t_en = kmodel.encode(input_ids, ref_s, speed)
+        en, asr = kmodel.align(pred_dur, d, t_en)
+        for module, args, dynamic_shapes, filename in (
+            (Encoder(kmodel), (input_ids, ref_s, speed), ({1: tokens}, None, None), ENCODER),
+            (Decoder(kmodel), (en, asr, ref_s), ({2: frames}, {2: frames}, None), DECODER),
+        ):
+            start = time.perf_counter()
+            program = torch.export.export(module, args, dynamic_shapes=dynamic_shapes, strict=False)
+            torch._inductor.aoti_compile_and_package(program, package_path=os.path.join(path, filename))
+            logger.info("Compiled {} in {:.1f}s", filename, time.perf_counter() - start)
+    with open(os.path.join(path, METADATA), 'w', encoding='utf-8') as w:
+        json.dump(dict(
+            repo_id=kmodel.repo_id, vocab=kmodel.vocab, context_length=kmodel.context_length,
+            device=device.type, torch=torch.__version__
+        ), w, ensure_ascii=False, indent=2)
+    return path
+
+class KModelAOT:
+    '''
+    KModelAOT runs an artifact written by export() behind the KModel interface:
+    forward(phonemes, ref_s, speed, return_output) -> KModel.Output | audio.
+    Construct it with KModel.from_compiled(path) and pass it as KPipeline(model=...).
+    '''
+    Output = KModel.Output
+
+    def __init__(self, path: str, device: Union[torch.device, str, None] = None):
+        with open(os.path.join(path, METADATA), 'r', encoding='utf-8') as r:
+            metadata = json.load(r)
+        if metadata['torch'] != torch.__version__:
+            logger.warning("{} was compiled with torch {}, running {}", path, metadata['torch'], torch.__version__)
+        self.repo_id = metadata['repo_id']
+        self.vocab = metadata['vocab']
+        self.context_length = metadata['context_length']
+        self._device = torch.device(device or metadata['device'])
+        self.encoder = torch._inductor.aoti_load_package(os.path.join(path, ENCODER))
+        self.decoder = torch._inductor.aoti_load_package(os.path.join(path, DECODER))
+
+    @property
+    def device(self) -> torch.device:
+        return self._device
+
+    align = KModel.align
+
+    @torch.no_grad()
+    def forward_with_tokens(
+        self,
+        input_ids: torch.LongTensor,
+        ref_s: torch.FloatTensor,
+        speed: float = 1,
+        timer: Optional[StageTimer] = None
+    ) -> tuple[torch.FloatTensor, torch.LongTensor]:
+        stage = timer or untimed
+        with stage('encoder'):
+            pred_dur, d, t_en = self.encoder(input_ids, ref_s, torch.tensor([speed], dtype=torch.float, device=self.device))
+        with stage('alignment'):
+            en, asr = self.align(pred_dur, d, t_en)
+        with stage('decoder'):
+            audio = self.decoder(en, asr, ref_s)
+        return audio, pred_dur
+
+    def forward(
+        self,
+        phonemes: str,
+        ref_s: torch.FloatTensor,
+        speed: float = 1,
+        return_output: bool = False,
+        timer: Optional[StageTimer] = None,
+        seed: Optional[int] = None,
+        style_key: Optional[Hashable] = None  # accepted for KModel compatibility, nothing to cache
+    ) -> Union['KModel.Output', torch.FloatTensor]:
+        input_ids = list(filter(lambda i: i is not None, map(lambda p: self.vocab.get(p), phonemes)))
+        logger.debug("phonemes: {} -> input_ids: {}", phonemes, input_ids)
+        assert len(input_ids)+2 <= self.context_length, (len(input_ids)+2, self.context_length)
+        input_ids = torch.LongTensor([[0, *input_ids, 0]]).to(self.device)
+        if seed is None:
+            audio, pred_dur = self.forward_with_tokens(input_ids, ref_s.to(self.device), speed, timer)
+        else:
+            # Compiled kernels draw from the global RNG and take no generator, so seed it for this call
+            with torch.random.fork_rng(devices=[self.device] if self.device.type == 'cuda' else []):
+                torch.manual_seed(seed)
+                audio, pred_dur = self.forward_with_tokens(input_ids, ref_s.to(self.device), speed, timer)
+        audio, pred_dur = audio.cpu(), pred_dur.cpu()
+        if not return_output:
+            return audio
+        return self.Output(audio=audio, pred_dur=pred_dur, timings=None if timer is None else timer.timings)
+
+    __call__ = forward
@@ -0,0 +1,196 @@
+'''
+ONNX export of KModel, and an onnxruntime backend usable by KPipeline.
+
+    from kokoro import KModel, KPipeline
+    from kokoro.export.onnx import KModelORT, export
+
+    export(KModel(repo_id='hexgrad/Kokoro-82M', disable_complex=True), 'kokoro.onnx')
+    model = KModelORT('kokoro.onnx', repo_id='hexgrad/Kokoro-82M', sessions=2, intra_op_num_threads=4)
+    pipeline = KPipeline(lang_code='a', repo_id='hexgrad/Kokoro-82M', model=model)
+
+Requires `pip install onnx onnxruntime`.
+'''
+from ..custom_stft import CustomSTFT
+from ..model import KModel, KModelForONNX
+from ..profiling import StageTimer, untimed
+from contextlib import contextmanager
+from loguru import logger
+from queue import Queue
+from typing import Dict, Hashable, List, Optional, Sequence, Union
+import numpy as np
+import torch
+
+INPUT_NAMES = ['input_ids', 'style', 'speed']
+OUTPUT_NAMES = ['waveform', 'duration']
+
+# forward_with_tokens aligns a single utterance, so batch stays 1 and only
+# the sequence axis (and everything derived from it) is dynamic
+DYNAMIC_AXES = {
+    'input_ids': {1: 'input_ids_len'},
+    'waveform': {0: 'num_samples'},
+    'duration': {0: 'input_ids_len'},
+}
+
+def vocab_size(kmodel: KModel) -> int:
+    return min(100, kmodel.bert.config.vocab_size)
+
+def sample_inputs(length: int, vocab_size: int = 100, seed: int = 0):
+    g = torch.Generator().manual_seed(seed)
+    input_ids = torch.randint(1, vocab_size, (length,), generator=g)
+    input_ids = torch.LongTensor([[0, *input_ids, 0]])
+    style = torch.randn(1, 256, generator=g)
+    speed = torch.FloatTensor([1])
+    return input_ids, style, speed
+
+@contextmanager
+def on_cpu(kmodel: KModel):
+    '''kmodel in eval mode on the CPU, moved back to its device and mode afterwards.'''
+    device, training = kmodel.device, kmodel.training
+    try:
+        yield kmodel.to('cpu').eval()
+    finally:
+        kmodel.to(device).train(training)
+
+def export(
+    kmodel: KModel,
+    path: str,
+    opset_version: int = 17,
+    validate: bool = True,
+    validate_lengths: Sequence[int] = (16, 128)
+) -> str:
+    if not isinstance(kmodel.decoder.generator.stft, CustomSTFT):
+        raise ValueError("ONNX export needs the conv STFT: construct KModel(..., stft='custom') or call select_stft(target='onnx')")
+    with on_cpu(kmodel):
+        torch.onnx.export(
+            KModelForONNX(kmodel).eval(),
+            args=sample_inputs(48, vocab_size(kmodel)),
+            f=path,
+            export_params=True,
+            input_names=INPUT_NAMES,
+            output_names=OUTPUT_NAMES,
+            opset_version=opset_version,
+            dynamic_axes=DYNAMIC_AXES,
+            do_constant_folding=True,
+            dynamo=False,
+        )
+    import onnx
+    onnx.checker.check_model(onnx.load(path))
+    logger.info("Exported {}", path)
+    if validate:
+        compare(kmodel, path, validate_lengths)
+    return path
+
+def compare(kmodel: KModel, path: str, lengths: Sequence[int] = (16, 128)) -> List[Dict]:
+    '''
+    Run PyTorch and onnxruntime on fixed inputs of each length.
+
+    Durations must match exactly. Waveforms can only match in length, since the
+    harmonic source adds random phase and noise; their relative RMS difference
+    is returned for inspection.
+    '''
+    import onnxruntime
+    session = onnxruntime.InferenceSession(path, providers=['CPUExecutionProvider'])
+    report = []
+    for length in lengths:
+        input_ids, style, speed = sample_inputs(length, vocab_size(kmodel))
+        with on_cpu(kmodel), torch.no_grad():
+            expected_audio, expected_dur = KModelForONNX(kmodel).eval()(input_ids, style, speed)
+        audio, dur = session.run(None, dict(zip(INPUT_NAMES, (input_ids.numpy(), style.numpy(), speed.numpy()))))
+        if not np.array_equal(dur, expected_dur.numpy()):
+            raise AssertionError(f'Duration mismatch at length {length}: {dur} != {expected_dur.numpy()}')
+        if audio.shape != tuple(expected_audio.shape):
+            raise AssertionError(f'Waveform shape mismatch at length {length}: {audio.shape} != {tuple(expected_audio.shape)}')
+        expected_audio = expected_audio.numpy()
+        rms = float(np.sqrt(np.mean((audio - expected_audio) ** 2)) / (np.sqrt(np.mean(expected_audio ** 2)) + 1e-9))
+        logger.info("Validated length {}: durations match, relative RMS diff {:.3f}", length, rms)
+        report.append(dict(length=length, samples=audio.shape[0], relative_rms=rms))
+    return report
+
+class KModelORT:
+    '''
+    KModelORT runs an exported graph with onnxruntime behind the KModel interface:
+    forward(phonemes, ref_s, speed, return_output) -> KModel.Output | audio.
+    Pass it as KPipeline(model=...) to synthesize without eager PyTorch.
+
+    A pool of `sessions` InferenceSessions lets that many threads run concurrently;
+    further callers wait for a free session. Thread counts apply per session.
+    '''
+    Output = KModel.Output
+
+    def __init__(
+        self,
+        path: str,
+        repo_id: Optional[str] = None,
+        config: Union[Dict, str, None] = None,
+        sessions: int = 1,
+        intra_op_num_threads: Optional[int] = None,
+        inter_op_num_threads: Optional[int] = None,
+        providers: Optional[List[str]] = None
+    ):
+        try:
+            import onnxruntime
+        except ImportError:
+            logger.error("You need to `pip install onnxruntime` to use KModelORT")
+            raise
+        if repo_id is None:
+            repo_id = 'hexgrad/Kokoro-82M'
+            print(f"WARNING: Defaulting repo_id to {repo_id}. Pass repo_id='{repo_id}' to suppress this warning.")
+        self.repo_id = repo_id
+        config = KModel.load_config(repo_id, config)
+        self.vocab = config['vocab']
+        self.context_length = config['plbert']['max_position_embeddings']
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        if intra_op_num_threads is not None:
+            options.intra_op_num_threads = intra_op_num_threads
+        if inter_op_num_threads is not None:
+            options.inter_op_num_threads = inter_op_num_threads
+        providers = providers or ['CPUExecutionProvider']
+        self.sessions = Queue()
+        for _ in range(sessions):
+            self.sessions.put(onnxruntime.InferenceSession(path, options, providers=providers))
+
+    @property
+    def device(self) -> torch.device:
+        return torch.device('cpu')
+
+    def forward_with_tokens(
+        self,
+        input_ids: torch.LongTensor,
+        ref_s: torch.FloatTensor,
+        speed: float = 1
+    ) -> tuple[torch.FloatTensor, torch.LongTensor]:
+        inputs = dict(zip(INPUT_NAMES, (
+            input_ids.cpu().numpy(), ref_s.cpu().numpy(), np.array([speed], dtype=np.float32)
+        )))
+        session = self.sessions.get()
+        try:
+            audio, pred_dur = session.run(None, inputs)
+        finally:
+            self.sessions.put(session)
+        return torch.from_numpy(audio), torch.from_numpy(pred_dur)
+
+    def forward(
+        self,
+        phonemes: str,
+        ref_s: torch.FloatTensor,
+        speed: float = 1,
+        return_output: bool = False,
+        timer: Optional[StageTimer] = None,
+        seed: Optional[int] = None,
+        style_key: Optional[Hashable] = None  # accepted for KModel compatibility, nothing to cache
+    ) -> Union['KModel.Output', torch.FloatTensor]:
+        if seed is not None:
+            raise ValueError('KModelORT cannot be seeded: the exported graph draws its own random numbers')
+        input_ids = list(filter(lambda i: i is not None, map(lambda p: self.vocab.get(p), phonemes)))
+        logger.debug("phonemes: {} -> input_ids: {}", phonemes, input_ids)
+        assert len(input_ids)+2 <= self.context_length, (len(input_ids)+2, self.context_length)
+        input_ids = torch.LongTensor([[0, *input_ids, 0]])
+        with (timer or untimed)('onnxruntime'):
+            audio, pred_dur = self.forward_with_tokens(input_ids, ref_s, speed)
+        if not return_output:
+            return audio
+        return self.Output(audio=audio, pred_dur=pred_dur, timings=None if timer is None else timer.timings)
+
+    __call__ = forward
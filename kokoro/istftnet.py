@@ -1,7 +1,12 @@
 # ADAPTED from https://github.com/yl4579/StyleTTS2/blob/main/Modules/istftnet.py
-from kokoro.custom_stft import CustomSTFT
+from kokoro.custom_stft import CustomSTFT, FFTSTFT, irfft_overlap_add
+from kokoro.profiling import untimed
+from loguru import logger
 from torch.nn.utils import weight_norm
+from typing import Dict, Optional
 import math
+import statistics
+import time
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
@@ -17,6 +22,57 @@ def get_padding(kernel_size, dilation=1):
     return int((kernel_size*dilation - dilation)/2)
 
 
+def randn_like(x, generator=None):
+    '''torch.randn_like, optionally drawing from a torch.Generator (which randn_like does not accept).'''
+    if generator is None:
+        return torch.randn_like(x)
+    return torch.randn(x.shape, generator=generator, dtype=x.dtype, device=x.device)
+
+
+def frame_mask(mask, x):
+    '''
+    Stretch a [B, 1, N] frame mask (True on a valid prefix) to x's length.
+    x is N frames upsampled by an integer factor, plus any edge padding, which counts as valid.
+    '''
+    scale = x.shape[-1] // mask.shape[-1]
+    valid = x.shape[-1] - (mask.shape[-1] - mask.sum(-1, keepdim=True)) * scale
+    return torch.arange(x.shape[-1], device=x.device) < valid
+
+
+class Style:
+    '''
+    A style vector with the fc(s) of its AdaIN1d/AdaLayerNorm layers precomputed.
+    Layers accept it wherever they take s; layers without an entry compute fc(s).
+    '''
+    def __init__(self, s, projections):
+        self.s = s
+        self.projections = projections
+
+    @staticmethod
+    def precompute(layers, s):
+        return Style(s, {layer.fc: layer.fc(s) for layer in layers})
+
+    @staticmethod
+    def cat(styles):
+        '''One Style for a batch of single-row Styles with the same layers.'''
+        return Style(
+            torch.cat([style.s for style in styles]),
+            {fc: torch.cat([style.projections[fc] for style in styles]) for fc in styles[0].projections}
+        )
+
+    @staticmethod
+    def tensor(s):
+        return s.s if isinstance(s, Style) else s
+
+
+def project(fc, s):
+    '''fc(s), looked up instead if s is a Style.'''
+    if isinstance(s, Style):
+        h = s.projections.get(fc)
+        return fc(s.s) if h is None else h
+    return fc(s)
+
+
 class AdaIN1d(nn.Module):
     def __init__(self, style_dim, num_features):
         super().__init__()
@@ -24,11 +80,20 @@ class AdaIN1d(nn.Module):
         self.norm = nn.InstanceNorm1d(num_features, affine=True)
         self.fc = nn.Linear(style_dim, num_features*2)
 
-    def forward(self, x, s):
-        h = self.fc(s)
+    def forward(self, x, s, mask=None):
+        h = project(self.fc, s)
         h = h.view(h.size(0), h.size(1), 1)
         gamma, beta = torch.chunk(h, chunks=2, dim=1)
-        return (1 + gamma) * self.norm(x) + beta
+        if mask is None:
+            return (1 + gamma) * self.norm(x) + beta
+        # Right-padded frames: normalize over valid frames only, and zero the padding
+        # so that the following convolutions see it as they would see edge padding
+        m = frame_mask(mask, x)
+        n = m.sum(-1, keepdim=True)
+        mean = (x * m).sum(-1, keepdim=True) / n
+        var = ((x - mean) * m).pow(2).sum(-1, keepdim=True) / n
+        x = (x - mean) * torch.rsqrt(var + self.norm.eps) * self.norm.weight[:, None] + self.norm.bias[:, None]
+        return ((1 + gamma) * x + beta) * m
 
 
 class AdaINResBlock1(nn.Module):
@@ -65,12 +130,12 @@ class AdaINResBlock1(nn.Module):
         self.alpha1 = nn.ParameterList([nn.Parameter(torch.ones(1, channels, 1)) for i in range(len(self.convs1))])
         self.alpha2 = nn.ParameterList([nn.Parameter(torch.ones(1, channels, 1)) for i in range(len(self.convs2))])
 
-    def forward(self, x, s):
+    def forward(self, x, s, mask=None):
         for c1, c2, n1, n2, a1, a2 in zip(self.convs1, self.convs2, self.adain1, self.adain2, self.alpha1, self.alpha2):
-            xt = n1(x, s)
+            xt = n1(x, s, mask)
             xt = xt + (1 / a1) * (torch.sin(a1 * xt) ** 2)  # Snake1D
             xt = c1(xt)
-            xt = n2(xt, s)
+            xt = n2(xt, s, mask)
             xt = xt + (1 / a2) * (torch.sin(a2 * xt) ** 2)  # Snake1D
             xt = c2(xt)
             x = xt + x
@@ -99,12 +164,51 @@ class TorchSTFT(nn.Module):
             self.filter_length, self.hop_length, self.win_length, window=self.window.to(magnitude.device))
         return inverse_transform.unsqueeze(-2)  # unsqueeze to stay consistent with conv_transpose1d implementation
 
+    def overlap_add(self, magnitude, phase):
+        # torch.istft's frames before normalization, for StreamingISTFT
+        extra = self.filter_length - self.win_length
+        window = F.pad(self.window.to(magnitude.device), (extra // 2, extra - extra // 2))
+        return irfft_overlap_add(magnitude, phase, window, self.hop_length)
+
     def forward(self, input_data):
         self.magnitude, self.phase = self.transform(input_data)
         reconstruction = self.inverse(self.magnitude, self.phase)
         return reconstruction
 
 
+STFT_BACKENDS = {'torch': TorchSTFT, 'custom': CustomSTFT, 'fft': FFTSTFT}
+# Backends each export target can trace: the TorchScript ONNX exporter has neither complex tensors nor FFTs
+STFT_TARGETS = {None: ('torch', 'custom', 'fft'), 'aot': ('torch', 'custom', 'fft'), 'onnx': ('custom',)}
+
+
+@torch.no_grad()
+def benchmark_stft(n_fft, hop_length, device='cpu', target=None, samples=24000, runs=5) -> Dict[str, float]:
+    '''Median seconds per STFT backend usable by target, for a transform + inverse round trip over samples.'''
+    device = torch.device(device)
+    x = torch.randn(1, samples, device=device)
+    timings = {}
+    for name in STFT_TARGETS[target]:
+        stft = STFT_BACKENDS[name](n_fft, hop_length, n_fft).to(device)
+        times = []
+        for _ in range(runs + 1):
+            start = time.perf_counter()
+            stft.inverse(*stft.transform(x))
+            if device.type == 'cuda':
+                torch.cuda.synchronize(device)
+            times.append(time.perf_counter() - start)
+        timings[name] = statistics.median(times[1:])  # the first run is warmup
+    return timings
+
+
+def select_stft(n_fft, hop_length, device='cpu', target=None) -> tuple[str, Dict[str, float]]:
+    '''Benchmark the STFT backends and return the fastest one that target can export, with all timings.'''
+    timings = benchmark_stft(n_fft, hop_length, device, target)
+    name = min(timings, key=timings.get)
+    logger.info("STFT backend on {} for {}: {} ({})", device, target or 'eager', name,
+                ', '.join(f"{k} {v * 1000:.2f}ms" for k, v in timings.items()))
+    return name, timings
+
+
 class SineGen(nn.Module):
     """ Definition of sine generator
     SineGen(samp_rate, harmonic_num = 0,
@@ -139,7 +243,7 @@ class SineGen(nn.Module):
         uv = (f0 > self.voiced_threshold).type(torch.float32)
         return uv
 
-    def _f02sine(self, f0_values):
+    def _f02sine(self, f0_values, generator=None):
         """ f0_values: (batchsize, length, dim)
             where dim indicates fundamental tone and overtones
         """
@@ -147,14 +251,15 @@ class SineGen(nn.Module):
         # because 2 * torch.pi * n doesn't affect phase
         rad_values = (f0_values / self.sampling_rate) % 1
         # initial phase noise (no noise for fundamental component)
-        rand_ini = torch.rand(f0_values.shape[0], f0_values.shape[2], device=f0_values.device)
+        rand_ini = torch.rand(f0_values.shape[0], f0_values.shape[2], device=f0_values.device, generator=generator)
         rand_ini[:, 0] = 0
         rad_values[:, 0, :] = rad_values[:, 0, :] + rand_ini
         # instantanouse phase sine[t] = sin(2*pi \sum_i=1 ^{t} rad)
         if not self.flag_for_pulse:
-            rad_values = F.interpolate(rad_values.transpose(1, 2), scale_factor=1/self.upsample_scale, mode="linear").transpose(1, 2)
+            # Explicit sizes (same result as scale_factor) keep the length symbolic under torch.export
+            rad_values = F.interpolate(rad_values.transpose(1, 2), size=rad_values.shape[1] // self.upsample_scale, mode="linear").transpose(1, 2)
             phase = torch.cumsum(rad_values, dim=1) * 2 * torch.pi
-            phase = F.interpolate(phase.transpose(1, 2) * self.upsample_scale, scale_factor=self.upsample_scale, mode="linear").transpose(1, 2)
+            phase = F.interpolate(phase.transpose(1, 2) * self.upsample_scale, size=phase.shape[1] * self.upsample_scale, mode="linear").transpose(1, 2)
             sines = torch.sin(phase)
         else:
             # If necessary, make sure that the first time step of every
@@ -182,7 +287,7 @@ class SineGen(nn.Module):
             sines = torch.cos(i_phase * 2 * torch.pi)
         return sines
 
-    def forward(self, f0):
+    def forward(self, f0, generator=None):
         """ sine_tensor, uv = forward(f0)
         input F0: tensor(batchsize=1, length, dim=1)
                   f0 for unvoiced steps should be 0
@@ -193,7 +298,7 @@ class SineGen(nn.Module):
         # fundamental component
         fn = torch.multiply(f0, torch.FloatTensor([[range(1, self.harmonic_num + 2)]]).to(f0.device))
         # generate sine waveforms
-        sine_waves = self._f02sine(fn) * self.sine_amp
+        sine_waves = self._f02sine(fn, generator) * self.sine_amp
         # generate uv signal
         # uv = torch.ones(f0.shape)
         # uv = uv * (f0 > self.voiced_threshold)
@@ -202,7 +307,7 @@ class SineGen(nn.Module):
         #        std = self.sine_amp/3 -> max value ~ self.sine_amp
         #        for voiced regions is self.noise_std
         noise_amp = uv * self.noise_std + (1 - uv) * self.sine_amp / 3
-        noise = noise_amp * torch.randn_like(sine_waves)
+        noise = noise_amp * randn_like(sine_waves, generator)
         # first: set the unvoiced part to 0 by uv
         # then: additive noise
         sine_waves = sine_waves * uv + noise
@@ -238,7 +343,7 @@ class SourceModuleHnNSF(nn.Module):
         self.l_linear = nn.Linear(harmonic_num + 1, 1)
         self.l_tanh = nn.Tanh()
 
-    def forward(self, x):
+    def forward(self, x, generator=None):
         """
         Sine_source, noise_source = SourceModuleHnNSF(F0_sampled)
         F0_sampled (batchsize, length, 1)
@@ -247,15 +352,15 @@ class SourceModuleHnNSF(nn.Module):
         """
         # source for harmonic branch
         with torch.no_grad():
-            sine_wavs, uv, _ = self.l_sin_gen(x)
+            sine_wavs, uv, _ = self.l_sin_gen(x, generator)
         sine_merge = self.l_tanh(self.l_linear(sine_wavs))
         # source for noise branch, in the same shape as uv
-        noise = torch.randn_like(uv) * self.sine_amp / 3
+        noise = randn_like(uv, generator) * self.sine_amp / 3
         return sine_merge, noise, uv
 
 
 class Generator(nn.Module):
-    def __init__(self, style_dim, resblock_kernel_sizes, upsample_rates, upsample_initial_channel, resblock_dilation_sizes, upsample_kernel_sizes, gen_istft_n_fft, gen_istft_hop_size, disable_complex=False):
+    def __init__(self, style_dim, resblock_kernel_sizes, upsample_rates, upsample_initial_channel, resblock_dilation_sizes, upsample_kernel_sizes, gen_istft_n_fft, gen_istft_hop_size, disable_complex=False, stft=None):
         super(Generator, self).__init__()
         self.num_kernels = len(resblock_kernel_sizes)
         self.num_upsamples = len(upsample_rates)
@@ -290,23 +395,27 @@ class Generator(nn.Module):
         self.ups.apply(init_weights)
         self.conv_post.apply(init_weights)
         self.reflection_pad = nn.ReflectionPad1d((1, 0))
-        self.stft = (
-            CustomSTFT(filter_length=gen_istft_n_fft, hop_length=gen_istft_hop_size, win_length=gen_istft_n_fft)
-            if disable_complex
-            else TorchSTFT(filter_length=gen_istft_n_fft, hop_length=gen_istft_hop_size, win_length=gen_istft_n_fft)
-        )
-
-    def forward(self, x, s, f0):
+        if stft is None:
+            stft = 'custom' if disable_complex else 'torch'
+        elif stft == 'auto':
+            stft, _ = select_stft(gen_istft_n_fft, gen_istft_hop_size)
+        self.stft = STFT_BACKENDS[stft](filter_length=gen_istft_n_fft, hop_length=gen_istft_hop_size, win_length=gen_istft_n_fft)
+
+    def forward(self, x, s, f0, timer=None, mask=None, generator=None):
+        stage = timer or untimed
         with torch.no_grad():
             f0 = self.f0_upsamp(f0[:, None]).transpose(1, 2)  # bs,n,t
-            har_source, noi_source, uv = self.m_source(f0)
+            har_source, noi_source, uv = self.m_source(f0, generator)
             har_source = har_source.transpose(1, 2).squeeze(1)
-            har_spec, har_phase = self.stft.transform(har_source)
+            with stage('stft'):
+                har_spec, har_phase = self.stft.transform(har_source)
             har = torch.cat([har_spec, har_phase], dim=1)
         for i in range(self.num_upsamples):
             x = F.leaky_relu(x, negative_slope=0.1) 
+            if mask is not None:
+                x = x * frame_mask(mask, x)
             x_source = self.noise_convs[i](har)
-            x_source = self.noise_res[i](x_source, s)
+            x_source = self.noise_res[i](x_source, s, mask)
             x = self.ups[i](x)
             if i == self.num_upsamples - 1:
                 x = self.reflection_pad(x)
@@ -314,15 +423,18 @@ class Generator(nn.Module):
             xs = None
             for j in range(self.num_kernels):
                 if xs is None:
-                    xs = self.resblocks[i*self.num_kernels+j](x, s)
+                    xs = self.resblocks[i*self.num_kernels+j](x, s, mask)
                 else:
-                    xs += self.resblocks[i*self.num_kernels+j](x, s)
+                    xs += self.resblocks[i*self.num_kernels+j](x, s, mask)
             x = xs / self.num_kernels
         x = F.leaky_relu(x)
+        if mask is not None:
+            x = x * frame_mask(mask, x)
         x = self.conv_post(x)
         spec = torch.exp(x[:,:self.post_n_fft // 2 + 1, :])
         phase = torch.sin(x[:, self.post_n_fft // 2 + 1:, :])
-        return self.stft.inverse(spec, phase)
+        with stage('stft'):
+            return self.stft.inverse(spec, phase)
 
 
 class UpSample1d(nn.Module):
@@ -365,18 +477,20 @@ class AdainResBlk1d(nn.Module):
             x = self.conv1x1(x)
         return x
 
-    def _residual(self, x, s):
-        x = self.norm1(x, s)
+    def _residual(self, x, s, mask=None):
+        x = self.norm1(x, s, mask)
         x = self.actv(x)
         x = self.pool(x)
+        if mask is not None and self.upsample_type != 'none':
+            x = x * frame_mask(mask, x)
         x = self.conv1(self.dropout(x))
-        x = self.norm2(x, s)
+        x = self.norm2(x, s, mask)
         x = self.actv(x)
         x = self.conv2(self.dropout(x))
         return x
 
-    def forward(self, x, s):
-        out = self._residual(x, s)
+    def forward(self, x, s, mask=None):
+        out = self._residual(x, s, mask)
         out = (out + self._shortcut(x)) * torch.rsqrt(torch.tensor(2))
         return out
 
@@ -389,7 +503,7 @@ class Decoder(nn.Module):
                  resblock_dilation_sizes,
                  upsample_kernel_sizes,
                  gen_istft_n_fft, gen_istft_hop_size,
-                 disable_complex=False):
+                 disable_complex=False, stft=None):
         super().__init__()
         self.encode = AdainResBlk1d(dim_in + 2, 1024, style_dim)
         self.decode = nn.ModuleList()
@@ -402,20 +516,22 @@ class Decoder(nn.Module):
         self.asr_res = nn.Sequential(weight_norm(nn.Conv1d(512, 64, kernel_size=1)))
         self.generator = Generator(style_dim, resblock_kernel_sizes, upsample_rates, 
                                    upsample_initial_channel, resblock_dilation_sizes, 
-                                   upsample_kernel_sizes, gen_istft_n_fft, gen_istft_hop_size, disable_complex=disable_complex)
+                                   upsample_kernel_sizes, gen_istft_n_fft, gen_istft_hop_size, disable_complex=disable_complex, stft=stft)
 
-    def forward(self, asr, F0_curve, N, s):
+    def forward(self, asr, F0_curve, N, s, timer=None, mask=None, generator=None):
+        stage = timer or untimed
         F0 = self.F0_conv(F0_curve.unsqueeze(1))
         N = self.N_conv(N.unsqueeze(1))
         x = torch.cat([asr, F0, N], axis=1)
-        x = self.encode(x, s)
+        x = self.encode(x, s, mask)
         asr_res = self.asr_res(asr)
         res = True
         for block in self.decode:
             if res:
                 x = torch.cat([x, asr_res, F0, N], axis=1)
-            x = block(x, s)
+            x = block(x, s, mask)
             if block.upsample_type != "none":
                 res = False
-        x = self.generator(x, s, F0_curve)
+        with stage('generator'):
+            x = self.generator(x, s, F0_curve, timer=timer, mask=mask, generator=generator)
         return x
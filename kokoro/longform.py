@@ -0,0 +1,227 @@
+'''
+Long-form rendering: G2P up front, chunks sharded over worker processes,
+checkpointed to disk, and reassembled in order.
+
+    from kokoro.longform import render
+
+    render(book, 'book.wav', voice='af_heart', lang_code='a', workers=4, seed=0)
+
+Work happens in <path>.parts/ (or workdir):
+
+    job.json       what is being rendered; a different job starts from scratch
+    corpus.kc      every chunk, phonemized once (see kokoro.corpus)
+    voice.pt       the voice pack, so workers need no G2P or voice lookup
+    000042.npz     audio and pred_dur of chunk 42, written atomically when done
+
+Rerunning the same render after a crash or Ctrl+C only synthesizes chunks that
+have no checkpoint yet. Chunks are handed out from a queue, so fast workers take
+more. When all are done, the audio is concatenated in chunk order into path
+(16-bit mono wav) and <path without extension>.timestamps.json lists each chunk's
+text_index, graphemes, start and end seconds, and word timestamps where the
+language has them (English). The parts directory is then removed unless keep=True.
+
+Each worker calls tuning.apply(model, worker=rank), so a tuning profile pins it
+to its own CPUs. Progress is logged with the real-time factor measured so far
+and an ETA extrapolated from phonemes remaining.
+'''
+from . import registry, tuning
+from .corpus import Corpus, write
+from .manifest import SAMPLE_RATE, to_pcm, voice_id
+from .model import KModel
+from .pipeline import KPipeline
+from .runtime import KokoroRuntime
+from dataclasses import dataclass
+from loguru import logger
+from typing import Callable, Dict, List, Optional, Union
+import hashlib
+import json
+import multiprocessing
+import numpy as np
+import os
+import queue
+import shutil
+import time
+import torch
+import wave
+
+@dataclass
+class Progress:
+    done: int  # chunks, including those from checkpoints
+    total: int
+    audio_seconds: float  # synthesized in this run
+    elapsed: float  # wall seconds in this run
+    rtf: Optional[float]  # wall seconds per audio second across all workers
+    eta: Optional[float]  # seconds
+
+def checkpoint_path(workdir: str, index: int) -> str:
+    return os.path.join(workdir, f'{index:06d}.npz')
+
+def save_checkpoint(workdir: str, index: int, output: KModel.Output):
+    path = checkpoint_path(workdir, index)
+    with open(path + '.tmp', 'wb') as w:
+        np.savez(
+            w, audio=output.audio.numpy(),
+            pred_dur=np.empty(0, dtype=np.int64) if output.pred_dur is None else output.pred_dur.numpy()
+        )
+    os.replace(path + '.tmp', path)
+
+def load_checkpoint(workdir: str, index: int) -> KModel.Output:
+    with np.load(checkpoint_path(workdir, index)) as npz:
+        audio, pred_dur = torch.from_numpy(npz['audio']), torch.from_numpy(npz['pred_dur'])
+    return KModel.Output(audio=audio, pred_dur=pred_dur if len(pred_dur) else None)
+
+def prepare(
+    workdir: str,
+    job: Dict,
+    text: Union[str, List[str]],
+    voice: Union[str, torch.FloatTensor],
+    split_pattern: Optional[str] = r'\n+',
+    config: Optional[str] = None
+) -> Corpus:
+    '''Phonemize text into workdir/corpus.kc and save the voice pack, unless workdir already holds the same job.'''
+    path = os.path.join(workdir, 'job.json')
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as r:
+            if json.load(r) == job:
+                logger.info("Resuming {}", workdir)
+                return Corpus(os.path.join(workdir, 'corpus.kc'))
+        logger.warning("{} holds a different job, starting over", workdir)
+        shutil.rmtree(workdir)
+    os.makedirs(workdir, exist_ok=True)
+    pipeline = KPipeline(lang_code=job['lang_code'], repo_id=job['repo_id'], model=False)
+    write(os.path.join(workdir, 'corpus.kc'), pipeline, text, split_pattern, KModel.load_config(job['repo_id'], config)['vocab'])
+    torch.save(pipeline.load_voice(voice), os.path.join(workdir, 'voice.pt'))
+    with open(path, 'w', encoding='utf-8') as w:
+        json.dump(job, w)
+    return Corpus(os.path.join(workdir, 'corpus.kc'))
+
+def load(spec: Dict, rank: int = 0):
+    '''The model (tuned for worker rank), corpus and voice pack that synthesize() needs.'''
+    model = KModel(repo_id=spec['repo_id'], config=spec['config'], model=spec['model']).to(spec['device']).eval()
+    tuning.apply(model, worker=rank)
+    corpus = Corpus(os.path.join(spec['workdir'], 'corpus.kc'))
+    pack = torch.load(os.path.join(spec['workdir'], 'voice.pt'), weights_only=True)
+    return model, corpus, pack
+
+def synthesize(spec: Dict, model: KModel, corpus: Corpus, pack: torch.FloatTensor, index: int) -> float:
+    '''Synthesize and checkpoint one chunk. Returns its audio seconds.'''
+    result = next(corpus.synthesize(model, pack, spec['speed'], indices=[index], seed=spec['seed']))
+    save_checkpoint(spec['workdir'], index, result.output)
+    return result.audio.shape[-1] / SAMPLE_RATE
+
+def _worker(rank: int, spec: Dict, tasks, results):
+    model, corpus, pack = load(spec, rank)
+    while (index := tasks.get()) is not None:
+        results.put((index, synthesize(spec, model, corpus, pack, index)))
+
+def assemble(corpus: Corpus, workdir: str, path: str) -> str:
+    '''Concatenate every checkpoint in chunk order into path and write the timestamp sidecar. Returns its path.'''
+    chunks, offset = [], 0
+    with wave.open(path + '.tmp', 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        for i, chunk in enumerate(corpus):
+            output = load_checkpoint(workdir, i)
+            w.writeframes(to_pcm(output.audio))
+            start, offset = offset, offset + output.audio.shape[-1] / SAMPLE_RATE
+            entry = dict(text_index=chunk.text_index, graphemes=chunk.graphemes, start=start, end=offset)
+            if chunk.tokens is not None and output.pred_dur is not None:
+                KPipeline.join_timestamps(chunk.tokens, output.pred_dur)
+                entry['words'] = [
+                    dict(text=t.text, start=start + t.start_ts, end=start + t.end_ts)
+                    for t in chunk.tokens if t.start_ts is not None and t.end_ts is not None
+                ]
+            chunks.append(entry)
+    os.replace(path + '.tmp', path)
+    sidecar = os.path.splitext(path)[0] + '.timestamps.json'
+    with open(sidecar, 'w', encoding='utf-8') as w:
+        json.dump(chunks, w, ensure_ascii=False)
+    return sidecar
+
+def render(
+    text: Union[str, List[str]],
+    path: str,
+    voice: Union[str, torch.FloatTensor],
+    lang_code: Optional[str] = None,
+    speed: float = 1,
+    seed: Optional[int] = None,
+    workers: Optional[int] = None,
+    repo_id: str = 'hexgrad/Kokoro-82M',
+    config: Optional[str] = None,
+    model: Optional[str] = None,
+    device: str = 'cpu',
+    split_pattern: Optional[str] = r'\n+',
+    workdir: Optional[str] = None,
+    keep: bool = False,
+    progress: Optional[Callable[[Progress], None]] = None
+) -> str:
+    '''
+    Render text to the wav at path, resuming from checkpoints in workdir (default: path + '.parts').
+    lang_code defaults to the voice's first letter; workers to the tuning profile's, else 1.
+    workers=0 synthesizes in this process. Returns the timestamp sidecar's path.
+    '''
+    lang_code = KokoroRuntime.route(voice if isinstance(voice, str) else None, lang_code)
+    if workers is None:
+        profile = tuning.load()
+        workers = profile.workers if profile else 1
+    workdir = workdir or path + '.parts'
+    digest = hashlib.sha256(json.dumps(text, ensure_ascii=False).encode('utf-8')).hexdigest()
+    job = dict(
+        text=digest, split_pattern=split_pattern, voice=voice_id(voice), lang_code=lang_code,
+        speed=float(speed), seed=seed, repo_id=repo_id, model=model
+    )
+    corpus = prepare(workdir, job, text, voice, split_pattern, config)
+
+    pending = [i for i in range(len(corpus)) if not os.path.exists(checkpoint_path(workdir, i))]
+    lengths = corpus.arrays['chunk_length']
+    remaining = int(lengths[pending].sum())
+    logger.info("{} of {} chunks to synthesize with {} worker(s)", len(pending), len(corpus), workers)
+    spec = dict(
+        workdir=workdir, repo_id=repo_id, config=config or registry.config_path(repo_id),
+        model=model or registry.weights_path(repo_id), device=device, speed=speed, seed=seed
+    )
+    start, audio_seconds, done, todo = time.perf_counter(), 0.0, len(corpus) - len(pending), remaining
+
+    def report(index: int, seconds: float):
+        nonlocal audio_seconds, done, remaining
+        done, audio_seconds, remaining = done + 1, audio_seconds + seconds, remaining - int(lengths[index])
+        elapsed = time.perf_counter() - start
+        p = Progress(
+            done=done, total=len(corpus), audio_seconds=audio_seconds, elapsed=elapsed,
+            rtf=elapsed / audio_seconds if audio_seconds else None,
+            eta=elapsed / (todo - remaining) * remaining if todo > remaining else None  # phonemes are the best predictor of work
+        )
+        logger.info("{}/{} chunks, RTF {:.3f}, ETA {:.0f}s", p.done, p.total, p.rtf or 0, p.eta or 0)
+        if progress is not None:
+            progress(p)
+
+    if pending and workers == 0:
+        loaded = load(spec)
+        for index in pending:
+            report(index, synthesize(spec, *loaded, index))
+    elif pending:
+        ctx = multiprocessing.get_context('spawn')
+        tasks, results = ctx.Queue(), ctx.Queue()
+        for index in [*pending, *[None] * workers]:
+            tasks.put(index)
+        processes = [ctx.Process(target=_worker, args=(rank, spec, tasks, results), daemon=True) for rank in range(workers)]
+        for p in processes:
+            p.start()
+        for _ in pending:
+            while True:
+                try:
+                    report(*results.get(timeout=1))
+                    break
+                except queue.Empty:
+                    failed = [p.exitcode for p in processes if p.exitcode not in (None, 0)]
+                    if failed:
+                        raise RuntimeError(f'Render worker exited with code {failed[0]}, rerun to resume from {workdir}')
+        for p in processes:
+            p.join()
+
+    sidecar = assemble(corpus, workdir, path)
+    if not keep:
+        shutil.rmtree(workdir)
+    logger.info("Wrote {} and {}", path, sidecar)
+    return sidecar
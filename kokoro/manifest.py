@@ -0,0 +1,150 @@
+'''
+Incremental re-synthesis of long documents: after an edit, only changed chunks are synthesized.
+
+    from kokoro import KPipeline
+    from kokoro.manifest import render
+
+    pipeline = KPipeline(lang_code='a')
+    render(pipeline, book, 'book.wav', voice='af_heart', seed=0)
+    # ... edit a sentence of book ...
+    report = render(pipeline, book, 'book.wav', voice='af_heart', seed=0)
+    report.synthesized, report.reused  # 1, 2047
+
+render() writes a 16-bit mono wav and its manifest, <wav>.json by default:
+
+    {"version": 1, "sample_rate": 24000, "chunks": [
+        {"hash": "9f2c...", "graphemes": "...", "phonemes": "...", "text_index": 0, "offset": 0, "length": 51200}, ...]}
+
+A chunk's hash covers its graphemes, phonemes, voice, speed, model repo_id and
+seed, and offset/length locate its samples in the wav. On the next run the text
+is re-chunked (G2P only), chunks whose hash is in the old manifest are copied
+from the old wav, and the rest are synthesized. With a seed, the spliced file is
+identical to a full re-render; without one, reused chunks keep their old takes.
+'''
+from .model import KModel
+from .pipeline import KPipeline
+from dataclasses import asdict, dataclass, field
+from loguru import logger
+from typing import Callable, List, Optional, Union
+import hashlib
+import json
+import numpy as np
+import os
+import torch
+import wave
+
+SAMPLE_RATE = 24000
+
+@dataclass
+class Entry:
+    hash: str
+    graphemes: str
+    phonemes: str
+    text_index: int
+    offset: int  # in samples
+    length: int
+
+@dataclass
+class Report:
+    path: str
+    manifest: str
+    chunks: List[Entry] = field(default_factory=list)
+    synthesized: int = 0
+    reused: int = 0
+
+def manifest_path(path: str) -> str:
+    return path + '.json'
+
+def load(path: str) -> List[Entry]:
+    '''Entries of the manifest at path, or [] if there is none.'''
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as r:
+        manifest = json.load(r)
+    if manifest.get('version') != 1 or manifest.get('sample_rate') != SAMPLE_RATE:
+        logger.warning("Ignoring incompatible manifest {}", path)
+        return []
+    return [Entry(**e) for e in manifest['chunks']]
+
+def save(path: str, entries: List[Entry]):
+    with open(path, 'w', encoding='utf-8') as w:
+        json.dump(dict(version=1, sample_rate=SAMPLE_RATE, chunks=[asdict(e) for e in entries]), w, ensure_ascii=False)
+
+def voice_id(voice: Union[str, torch.FloatTensor]) -> str:
+    '''Voice name, or a digest of the voice pack when given as a tensor.'''
+    if isinstance(voice, str):
+        return voice
+    return 'sha256:' + hashlib.sha256(voice.detach().cpu().float().numpy().tobytes()).hexdigest()
+
+def chunk_hash(graphemes: str, phonemes: str, voice: str, speed: float, model: str, seed: Optional[int]) -> str:
+    key = json.dumps([graphemes, phonemes, voice, float(speed), model, seed], ensure_ascii=False)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+def to_pcm(audio: torch.FloatTensor) -> bytes:
+    return (audio.numpy() * 32767).astype(np.int16).tobytes()
+
+def render(
+    pipeline: KPipeline,
+    text: Union[str, List[str]],
+    path: str,
+    voice: Union[str, torch.FloatTensor],
+    speed: Union[float, Callable[[int], float]] = 1,
+    seed: Optional[int] = None,
+    split_pattern: Optional[str] = r'\n+',
+    model: Optional[KModel] = None,
+    manifest: Optional[str] = None
+) -> Report:
+    '''
+    Write text to the wav at path, reusing every unchanged chunk of the previous
+    render recorded in manifest (default: path + '.json'). model defaults to the
+    pipeline's. The wav, then the manifest, are only replaced once the render is done.
+    '''
+    model = model or pipeline.model
+    if not model:
+        raise ValueError('render() needs a model: pass one or use a pipeline with a model')
+    manifest = manifest or manifest_path(path)
+    entries = load(manifest) if os.path.exists(path) else []
+    old = wave.open(path, 'rb') if entries else None
+    if old is not None and (old.getparams()[:4] != (1, 2, SAMPLE_RATE, sum(e.length for e in entries))):
+        # e.g. the wav was rewritten by something else since
+        logger.warning("{} does not match {}, synthesizing every chunk", path, manifest)
+        old.close()
+        old, entries = None, []
+    previous = {e.hash: e for e in reversed(entries)}
+    pack, voice_key = pipeline.load_pack(voice, model.device)
+    vid = voice_id(voice)
+    report = Report(path=path, manifest=manifest)
+    tmp = path + '.tmp'
+    try:
+        with wave.open(tmp, 'wb') as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(SAMPLE_RATE)
+            offset = 0
+            for result in pipeline(text, split_pattern=split_pattern, model=False):
+                ps = result.phonemes
+                if not ps:
+                    continue
+                s = speed(len(ps)) if callable(speed) else speed
+                h = chunk_hash(result.graphemes, ps, vid, s, model.repo_id, seed)
+                hit = previous.get(h)
+                if hit is not None:
+                    old.setpos(hit.offset)
+                    pcm = old.readframes(hit.length)
+                    report.reused += 1
+                else:
+                    output = KPipeline.infer(model, ps, pack, s, seed=seed, voice_key=voice_key)
+                    pcm = to_pcm(output.audio)
+                    report.synthesized += 1
+                length = len(pcm) // 2
+                w.writeframes(pcm)
+                report.chunks.append(Entry(h, result.graphemes, ps, result.text_index or 0, offset, length))
+                offset += length
+    finally:
+        if old is not None:
+            old.close()
+    os.replace(tmp, path)
+    save(manifest + '.tmp', report.chunks)
+    os.replace(manifest + '.tmp', manifest)
+    logger.info("Rendered {}: {} chunks synthesized, {} reused", path, report.synthesized, report.reused)
+    return report
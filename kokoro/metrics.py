@@ -0,0 +1,149 @@
+'''
+Counters and histograms published by KPipeline and KModel.
+
+Nothing is recorded until a registry is installed:
+
+    from kokoro import metrics
+    registry = metrics.PrometheusRegistry()
+    metrics.set_registry(registry)
+    ...
+    print(registry.render())  # Prometheus text exposition format
+    registry.write('/var/lib/node_exporter/kokoro.prom')  # textfile collector
+
+To forward metrics elsewhere (statsd, OpenTelemetry, prometheus_client, ...),
+subclass MetricsRegistry and implement inc/observe.
+'''
+from abc import ABC, abstractmethod
+from threading import Lock
+from typing import Dict, Optional, Sequence, Tuple
+import math
+import os
+
+# name => (type, help, histogram buckets)
+METRICS = {
+    'kokoro_chunks_total': ('counter', 'Chunks synthesized by KModel.', None),
+    'kokoro_phonemes_total': ('counter', 'Phonemes synthesized by KModel.', None),
+    'kokoro_audio_seconds_total': ('counter', 'Seconds of audio produced by KModel.', None),
+    'kokoro_real_time_factor': (
+        'histogram', 'Synthesis seconds per second of audio, per chunk.',
+        (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+    ),
+    'kokoro_chunk_phonemes': (
+        'histogram', 'Phonemes per synthesized chunk.',
+        (16, 32, 64, 128, 256, 384, 510)
+    ),
+    'kokoro_g2p_seconds': (
+        'histogram', 'Seconds spent in G2P per call.',
+        (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+    ),
+    'kokoro_truncations_total': ('counter', 'Chunks truncated to 510 phonemes.', None),
+    'kokoro_voice_loads_total': ('counter', 'Voice packs loaded from disk or the Hub.', None),
+    'kokoro_voice_cache_hits_total': ('counter', 'Voice requests served from KPipeline.voices.', None),
+    'kokoro_g2p_loads_total': ('counter', 'Language pipelines built by KokoroRuntime.', None),
+    'kokoro_g2p_evictions_total': ('counter', 'Language pipelines evicted by KokoroRuntime.', None),
+}
+
+class MetricsRegistry(ABC):
+    @abstractmethod
+    def inc(self, name: str, value: float = 1, **labels: str):
+        '''Add value to the counter name.'''
+
+    @abstractmethod
+    def observe(self, name: str, value: float, **labels: str):
+        '''Record value in the histogram name.'''
+
+class PrometheusRegistry(MetricsRegistry):
+    '''
+    In-memory, thread-safe registry that renders the Prometheus text format.
+    It never opens a socket: serve render() from your own HTTP handler, or
+    write() to a file for the node_exporter textfile collector.
+    '''
+    def __init__(self):
+        self.lock = Lock()
+        self.counters: Dict[Tuple[str, Tuple], float] = {}
+        # (name, labels) => [bucket counts..., sum, count]
+        self.histograms: Dict[Tuple[str, Tuple], list] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str):
+        buckets = PrometheusRegistry.buckets(name)
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            h = self.histograms.setdefault(key, [0] * len(buckets) + [0.0, 0])
+            for i, le in enumerate(buckets):
+                if value <= le:
+                    h[i] += 1
+            h[-2] += value
+            h[-1] += 1
+
+    @staticmethod
+    def buckets(name: str) -> Sequence[float]:
+        _, _, buckets = METRICS.get(name, (None, None, None))
+        return (*(buckets or ()), math.inf)
+
+    @staticmethod
+    def format_labels(labels: Tuple, **extra: str) -> str:
+        labels = (*labels, *extra.items())
+        if not labels:
+            return ''
+        return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+
+    @staticmethod
+    def format_value(value: float) -> str:
+        if value == math.inf:
+            return '+Inf'
+        return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+    def render(self) -> str:
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((k, list(v)) for k, v in self.histograms.items())
+        lines = []
+        for kind, series in (('counter', counters), ('histogram', histograms)):
+            for name in sorted({n for (n, _), _ in series}):
+                doc = METRICS.get(name, (None, None, None))[1]
+                if doc:
+                    lines.append(f'# HELP {name} {doc}')
+                lines.append(f'# TYPE {name} {kind}')
+                for (n, labels), value in series:
+                    if n != name:
+                        continue
+                    if kind == 'counter':
+                        lines.append(f'{name}{self.format_labels(labels)} {self.format_value(value)}')
+                        continue
+                    for le, count in zip(self.buckets(name), value):
+                        lines.append(f'{name}_bucket{self.format_labels(labels, le=self.format_value(le))} {count}')
+                    lines.append(f'{name}_sum{self.format_labels(labels)} {self.format_value(value[-2])}')
+                    lines.append(f'{name}_count{self.format_labels(labels)} {value[-1]}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str):
+        # Write then rename, so scrapers never read a partial file
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as w:
+            w.write(self.render())
+        os.replace(tmp, path)
+
+_registry: Optional[MetricsRegistry] = None
+
+def set_registry(registry: Optional[MetricsRegistry]):
+    global _registry
+    _registry = registry
+
+def get_registry() -> Optional[MetricsRegistry]:
+    return _registry
+
+def enabled() -> bool:
+    return _registry is not None
+
+def inc(name: str, value: float = 1, **labels: str):
+    if _registry is not None:
+        _registry.inc(name, value, **labels)
+
+def observe(name: str, value: float, **labels: str):
+    if _registry is not None:
+        _registry.observe(name, value, **labels)
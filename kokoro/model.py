@@ -1,12 +1,51 @@
-from .istftnet import Decoder
-from .modules import CustomAlbert, ProsodyPredictor, TextEncoder
+from . import metrics, registry
+from .istftnet import STFT_BACKENDS, AdaIN1d, Decoder, Style, select_stft
+from .modules import AdaLayerNorm, AlbertConfig, CustomAlbert, ProsodyPredictor, TextEncoder, run_lstm
+from .profiling import StageTimer, untimed
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
 from dataclasses import dataclass
-from huggingface_hub import hf_hub_download
 from loguru import logger
-from transformers import AlbertConfig
-from typing import Dict, Optional, Union
+from typing import TYPE_CHECKING, Callable, Dict, Hashable, List, Optional, Sequence, Tuple, Union
 import json
+import os
+import statistics
+import threading
+import time
 import torch
+import torch.nn.functional as F
+
+if TYPE_CHECKING:
+    from .export.aot import KModelAOT
+
+_inductor_lock = threading.Lock()
+_inductor_scopes = dict(depth=0, previous=None)
+
+@contextmanager
+def inductor_cache(cache_dir: Optional[str]):
+    '''
+    Point TORCHINDUCTOR_CACHE_DIR at cache_dir for the block, and restore it once
+    the last overlapping block (in any thread) exits. Inductor only reads the
+    variable when it compiles, so only compiled calls need the scope.
+    '''
+    if cache_dir is None:
+        yield
+        return
+    with _inductor_lock:
+        if _inductor_scopes['depth'] == 0:
+            _inductor_scopes['previous'] = os.environ.get('TORCHINDUCTOR_CACHE_DIR')
+            os.environ['TORCHINDUCTOR_CACHE_DIR'] = cache_dir
+        _inductor_scopes['depth'] += 1
+    try:
+        yield
+    finally:
+        with _inductor_lock:
+            _inductor_scopes['depth'] -= 1
+            if _inductor_scopes['depth'] == 0:
+                if _inductor_scopes['previous'] is None:
+                    os.environ.pop('TORCHINDUCTOR_CACHE_DIR', None)
+                else:
+                    os.environ['TORCHINDUCTOR_CACHE_DIR'] = _inductor_scopes['previous']
 
 class KModel(torch.nn.Module):
     '''
@@ -21,33 +60,41 @@ class KModel(torch.nn.Module):
 
     KModel stores self.vocab and thus knows how to map phonemes -> input_ids,
     so there is no need to repeatedly download config.json outside of KModel.
+
+    stft picks the generator's STFT backend: 'torch' (complex), 'custom' (conv,
+    what disable_complex selects), 'fft' (rfft/irfft) or 'auto' to benchmark them
+    on CPU at load time. Call select_stft() again after moving to another device.
+
+    style_cache_size bounds the LRU of precomputed style projections (see styles()),
+    and text_cache_size the LRU of voice-independent encoder outputs (see text_features()).
+    0 disables either.
     '''
 
-    MODEL_NAMES = {
-        'hexgrad/Kokoro-82M': 'kokoro-v1_0.pth',
-        'hexgrad/Kokoro-82M-v1.1-zh': 'kokoro-v1_1-zh.pth',
-    }
+    MODEL_NAMES = registry.MODEL_NAMES
 
     def __init__(
         self,
         repo_id: Optional[str] = None,
         config: Union[Dict, str, None] = None,
         model: Optional[str] = None,
-        disable_complex: bool = False
+        disable_complex: bool = False,
+        stft: Optional[str] = None,
+        style_cache_size: int = 128,
+        text_cache_size: int = 16
     ):
         super().__init__()
         if repo_id is None:
             repo_id = 'hexgrad/Kokoro-82M'
             print(f"WARNING: Defaulting repo_id to {repo_id}. Pass repo_id='{repo_id}' to suppress this warning.")
         self.repo_id = repo_id
-        if not isinstance(config, dict):
-            if not config:
-                logger.debug("No config provided, downloading from HF")
-                config = hf_hub_download(repo_id=repo_id, filename='config.json')
-            with open(config, 'r', encoding='utf-8') as r:
-                config = json.load(r)
-                logger.debug(f"Loaded config: {config}")
+        config = KModel.load_config(repo_id, config)
         self.vocab = config['vocab']
+        self.buckets = self.frame_buckets = self.inductor_cache_dir = None
+        self.style_cache_size = style_cache_size
+        self.style_cache: OrderedDict = OrderedDict()
+        self.text_cache_size = text_cache_size
+        self.text_cache: OrderedDict = OrderedDict()
+        self.cache_lock = threading.Lock()
         self.bert = CustomAlbert(AlbertConfig(vocab_size=config['n_token'], **config['plbert']))
         self.bert_encoder = torch.nn.Linear(self.bert.config.hidden_size, config['hidden_dim'])
         self.context_length = self.bert.config.max_position_embeddings
@@ -61,80 +108,649 @@ class KModel(torch.nn.Module):
         )
         self.decoder = Decoder(
             dim_in=config['hidden_dim'], style_dim=config['style_dim'],
-            dim_out=config['n_mels'], disable_complex=disable_complex, **config['istftnet']
+            dim_out=config['n_mels'], disable_complex=disable_complex, stft=stft, **config['istftnet']
         )
         if not model:
-            model = hf_hub_download(repo_id=repo_id, filename=KModel.MODEL_NAMES[repo_id])
+            model = registry.weights_path(repo_id)
         for key, state_dict in torch.load(model, map_location='cpu', weights_only=True).items():
             assert hasattr(self, key), key
             try:
                 getattr(self, key).load_state_dict(state_dict)
             except:
-                logger.debug(f"Did not load {key} from state_dict")
+                logger.debug("Did not load {} from state_dict", key)
                 state_dict = {k[7:]: v for k, v in state_dict.items()}
                 getattr(self, key).load_state_dict(state_dict, strict=False)
 
+    @staticmethod
+    def load_config(repo_id: str, config: Union[Dict, str, None] = None) -> Dict:
+        if isinstance(config, dict):
+            return config
+        if not config:
+            logger.debug("No config provided, resolving from local registry or HF")
+            config = registry.config_path(repo_id)
+        with open(config, 'r', encoding='utf-8') as r:
+            config = json.load(r)
+            logger.debug("Loaded config: {}", config)
+        return config
+
+    @staticmethod
+    def from_compiled(path: str, device: Optional[str] = None) -> 'KModelAOT':
+        '''Load an artifact written by kokoro.export.aot.export: no weights to init, nothing to compile.'''
+        from .export.aot import KModelAOT
+        return KModelAOT(path, device)
+
+    def select_stft(self, target: Optional[str] = None) -> Dict[str, float]:
+        '''
+        Benchmark the STFT backends on self.device and switch the generator to the fastest.
+        target limits the choice to what an export path can trace: None (eager, torch.compile),
+        'aot' or 'onnx'. Returns median round-trip seconds per backend.
+        '''
+        generator = self.decoder.generator
+        name, timings = select_stft(generator.post_n_fft, generator.stft.hop_length, self.device, target)
+        self.set_stft(name)
+        return timings
+
+    def set_stft(self, name: str):
+        '''Switch the generator to STFT backend name: 'torch', 'custom' or 'fft'.'''
+        generator = self.decoder.generator
+        n_fft, hop_length = generator.post_n_fft, generator.stft.hop_length
+        generator.stft = STFT_BACKENDS[name](n_fft, hop_length, n_fft).to(self.device)
+
+    def styles(self, ref_s: torch.FloatTensor, key: Optional[Hashable] = None) -> Tuple[Style, Style]:
+        '''
+        Precompute every AdaIN1d/AdaLayerNorm projection of ref_s: returns (predictor, decoder) Styles.
+        With a key that identifies ref_s, such as (KPipeline.voice_key(pack), len(phonemes) - 1),
+        results are kept in a bounded LRU, so forward passes for the same pack row skip all
+        the style fc matmuls.
+        '''
+        def precompute():
+            layers = lambda module: [m for m in module.modules() if isinstance(m, (AdaIN1d, AdaLayerNorm))]
+            with torch.no_grad():
+                return (
+                    Style.precompute(layers(self.predictor), ref_s[:, 128:]),
+                    Style.precompute(layers(self.decoder), ref_s[:, :128])
+                )
+        key = None if key is None else (key, str(ref_s.device))
+        return KModel.cached(self.style_cache, self.style_cache_size, key, precompute, self.cache_lock)
+
+    def text_features(
+        self,
+        input_ids: torch.LongTensor,
+        timer: Optional[StageTimer] = None,
+        cpu_ids: Optional[torch.LongTensor] = None
+    ) -> Tuple[torch.FloatTensor, torch.FloatTensor]:
+        '''
+        encode_text() for one unpadded [1, T] utterance. Results are kept in a bounded LRU
+        keyed by the ids, so rendering the same phonemes in many voices runs bert once.
+        Pass the ids as they were before moving to the device as cpu_ids, so the key
+        needs no copy back from the device.
+        With a timer, the lookup is the text_cache stage; bert, bert_encoder and
+        text_encoder nest in it on a miss and are absent on a hit.
+        '''
+        def encode():
+            with torch.no_grad():
+                return self.encode_text(input_ids, timer)
+        key = ((input_ids if cpu_ids is None else cpu_ids).cpu().numpy().tobytes(), str(input_ids.device))
+        with (timer or untimed)('text_cache'):
+            return KModel.cached(self.text_cache, self.text_cache_size, key, encode, self.cache_lock)
+
+    @staticmethod
+    def cached(cache: OrderedDict, size: int, key: Optional[Hashable], compute: Callable, lock: Optional[threading.Lock] = None):
+        '''
+        LRU lookup: compute() on a miss, keeping at most size entries. No key or size means no caching.
+        With a lock, the cache may be shared between threads; compute() runs outside it.
+        '''
+        if key is None or not size:
+            return compute()
+        with lock or nullcontext():
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+        value = compute()
+        with lock or nullcontext():
+            value = cache.setdefault(key, value)
+            while len(cache) > size:
+                cache.popitem(last=False)
+        return value
+
     @property
     def device(self):
         return self.bert.device
 
     @dataclass
     class Output:
+        '''
+        timings and allocated are only set when forward is called with a StageTimer.
+        Stages: bert, bert_encoder, predictor.text_encoder, duration, text_encoder,
+        alignment, F0Ntrain, decoder > generator > stft (nested stages included).
+        When the text cache is used (see text_features()), bert, bert_encoder and
+        text_encoder nest in a text_cache stage, and are missing on a cache hit.
+        After compile(), the stages are encode, alignment and decode.
+        '''
         audio: torch.FloatTensor
         pred_dur: Optional[torch.LongTensor] = None
+        timings: Optional[Dict[str, float]] = None
+        allocated: Optional[Dict[str, int]] = None
+
+    @dataclass
+    class State:
+        '''
+        Everything about one utterance that does not depend on speed, from prepare().
+        render() it at any speed without rerunning bert or the encoders.
+        '''
+        input_ids: torch.LongTensor
+        ref_s: torch.FloatTensor
+        duration: torch.FloatTensor  # frames per token at speed 1, before rounding
+        d: torch.FloatTensor
+        t_en: torch.FloatTensor
+        styles: Optional[Tuple[Style, Style]] = None
 
     @torch.no_grad()
-    def forward_with_tokens(
+    def encode(
         self,
         input_ids: torch.LongTensor,
         ref_s: torch.FloatTensor,
-        speed: float = 1
-    ) -> tuple[torch.FloatTensor, torch.LongTensor]:
-        input_lengths = torch.full(
-            (input_ids.shape[0],), 
-            input_ids.shape[-1], 
-            device=input_ids.device,
-            dtype=torch.long
-        )
+        speed: float = 1,
+        timer: Optional[StageTimer] = None,
+        input_lengths: Optional[torch.LongTensor] = None,
+        styles: Optional[Tuple[Style, Style]] = None,
+        text: Optional[Tuple[torch.FloatTensor, torch.FloatTensor]] = None
+    ) -> tuple[torch.LongTensor, torch.FloatTensor, torch.FloatTensor]:
+        '''
+        Token-rate half of forward_with_tokens: returns (pred_dur, d, t_en).
+        Pass input_lengths if input_ids are right-padded; outputs keep the padded length.
+        Pass styles from self.styles(ref_s) to reuse precomputed style projections.
+        '''
+        duration, d, t_en = self.encode_unscaled(input_ids, ref_s, timer, input_lengths, styles, text)
+        return KModel.round_durations(duration, speed), d, t_en
+
+    def encode_unscaled(
+        self,
+        input_ids: torch.LongTensor,
+        ref_s: torch.FloatTensor,
+        timer: Optional[StageTimer] = None,
+        input_lengths: Optional[torch.LongTensor] = None,
+        styles: Optional[Tuple[Style, Style]] = None,
+        text: Optional[Tuple[torch.FloatTensor, torch.FloatTensor]] = None
+    ) -> tuple[torch.FloatTensor, torch.FloatTensor, torch.FloatTensor]:
+        '''
+        encode() before speed is applied: returns (duration, d, t_en), duration unrounded.
+        Pass text from encode_text() or text_features() to skip the voice-independent stages.
+        '''
+        stage = timer or untimed
+        text_mask = self.text_mask(input_ids, input_lengths)
+        d_en, t_en = self.encode_text(input_ids, timer, input_lengths, text_mask) if text is None else text
+        s = ref_s[:, 128:] if styles is None else styles[0]
+        with stage('predictor.text_encoder'):
+            d = self.predictor.text_encoder(d_en, s, input_lengths, text_mask)
+        with stage('duration'):
+            x = run_lstm(self.predictor.lstm, d, input_lengths)
+            duration = self.predictor.duration_proj(x)
+            duration = torch.sigmoid(duration).sum(axis=-1)
+        return duration, d, t_en
+
+    def text_mask(self, input_ids: torch.LongTensor, input_lengths: Optional[torch.LongTensor] = None) -> torch.BoolTensor:
+        '''True on padding. No input_lengths means nothing is padded.'''
+        if input_lengths is None:
+            input_lengths = torch.full(
+                (input_ids.shape[0],), 
+                input_ids.shape[-1], 
+                device=input_ids.device,
+                dtype=torch.long
+            )
+        # Sized from the static shape rather than input_lengths.max(), so torch.export sees no data-dependent size
+        text_mask = torch.arange(input_ids.shape[-1], device=input_ids.device).unsqueeze(0).expand(input_lengths.shape[0], -1)
+        return torch.gt(text_mask+1, input_lengths.unsqueeze(1)).to(self.device)
+
+    def encode_text(
+        self,
+        input_ids: torch.LongTensor,
+        timer: Optional[StageTimer] = None,
+        input_lengths: Optional[torch.LongTensor] = None,
+        text_mask: Optional[torch.BoolTensor] = None
+    ) -> Tuple[torch.FloatTensor, torch.FloatTensor]:
+        '''The stages of encode() that ignore the voice: returns (d_en, t_en) from bert, bert_encoder and text_encoder.'''
+        stage = timer or untimed
+        if text_mask is None:
+            text_mask = self.text_mask(input_ids, input_lengths)
+        with stage('bert'):
+            bert_dur = self.bert(input_ids, attention_mask=(~text_mask).int())
+        with stage('bert_encoder'):
+            d_en = self.bert_encoder(bert_dur).transpose(-1, -2)
+        with stage('text_encoder'):
+            t_en = self.text_encoder(input_ids, input_lengths, text_mask)
+        return d_en, t_en
+
+    @staticmethod
+    def round_durations(duration: torch.FloatTensor, speed: float = 1) -> torch.LongTensor:
+        return torch.round(duration / speed).clamp(min=1).long().squeeze()
 
-        text_mask = torch.arange(input_lengths.max()).unsqueeze(0).expand(input_lengths.shape[0], -1).type_as(input_lengths)
-        text_mask = torch.gt(text_mask+1, input_lengths.unsqueeze(1)).to(self.device)
-        bert_dur = self.bert(input_ids, attention_mask=(~text_mask).int())
-        d_en = self.bert_encoder(bert_dur).transpose(-1, -2)
-        s = ref_s[:, 128:]
-        d = self.predictor.text_encoder(d_en, s, input_lengths, text_mask)
-        x, _ = self.predictor.lstm(d)
-        duration = self.predictor.duration_proj(x)
-        duration = torch.sigmoid(duration).sum(axis=-1) / speed
-        pred_dur = torch.round(duration).clamp(min=1).long().squeeze()
-        indices = torch.repeat_interleave(torch.arange(input_ids.shape[1], device=self.device), pred_dur)
-        pred_aln_trg = torch.zeros((input_ids.shape[1], indices.shape[0]), device=self.device)
+    def align(
+        self,
+        pred_dur: torch.LongTensor,
+        d: torch.FloatTensor,
+        t_en: torch.FloatTensor
+    ) -> tuple[torch.FloatTensor, torch.FloatTensor]:
+        '''Expand token-rate features to frame rate by pred_dur: returns (en, asr).'''
+        indices = torch.repeat_interleave(torch.arange(t_en.shape[-1], device=self.device), pred_dur)
+        pred_aln_trg = torch.zeros((t_en.shape[-1], indices.shape[0]), device=self.device)
         pred_aln_trg[indices, torch.arange(indices.shape[0])] = 1
         pred_aln_trg = pred_aln_trg.unsqueeze(0).to(self.device)
-        en = d.transpose(-1, -2) @ pred_aln_trg
-        F0_pred, N_pred = self.predictor.F0Ntrain(en, s)
-        t_en = self.text_encoder(input_ids, input_lengths, text_mask)
-        asr = t_en @ pred_aln_trg
-        audio = self.decoder(asr, F0_pred, N_pred, ref_s[:, :128]).squeeze()
+        return d.transpose(-1, -2) @ pred_aln_trg, t_en @ pred_aln_trg
+
+    @torch.no_grad()
+    def decode(
+        self,
+        en: torch.FloatTensor,
+        asr: torch.FloatTensor,
+        ref_s: torch.FloatTensor,
+        timer: Optional[StageTimer] = None,
+        mask: Optional[torch.BoolTensor] = None,
+        generator: Optional[torch.Generator] = None,
+        styles: Optional[Tuple[Style, Style]] = None
+    ) -> torch.FloatTensor:
+        '''
+        Frame-rate half of forward_with_tokens: returns audio.
+        Pass a [B, 1, frames] mask, True on valid frames, if en and asr are right-padded.
+        The source's random phases and noise come from generator (default: global RNG).
+        '''
+        stage = timer or untimed
+        s_pred, s_dec = (ref_s[:, 128:], ref_s[:, :128]) if styles is None else styles
+        with stage('F0Ntrain'):
+            F0_pred, N_pred = self.predictor.F0Ntrain(en, s_pred, mask)
+        with stage('decoder'):
+            return self.decoder(asr, F0_pred, N_pred, s_dec, timer=timer, mask=mask, generator=generator).squeeze()
+
+    @torch.no_grad()
+    def forward_with_tokens(
+        self,
+        input_ids: torch.LongTensor,
+        ref_s: torch.FloatTensor,
+        speed: float = 1,
+        timer: Optional[StageTimer] = None,
+        generator: Optional[torch.Generator] = None,
+        styles: Optional[Tuple[Style, Style]] = None,
+        text: Optional[Tuple[torch.FloatTensor, torch.FloatTensor]] = None
+    ) -> tuple[torch.FloatTensor, torch.LongTensor]:
+        if self.buckets is not None:
+            return self.forward_bucketed(input_ids, ref_s, speed, timer, generator)
+        pred_dur, d, t_en = self.encode(input_ids, ref_s, speed, timer, styles=styles, text=text)
+        with (timer or untimed)('alignment'):
+            en, asr = self.align(pred_dur, d, t_en)
+        audio = self.decode(en, asr, ref_s, timer, generator=generator, styles=styles)
         return audio, pred_dur
 
+    @staticmethod
+    def bucket(n: int, buckets: Sequence[int]) -> int:
+        '''Smallest bucket that fits n, else n rounded up to a multiple of the largest bucket.'''
+        return next((b for b in buckets if b >= n), -(-n // buckets[-1]) * buckets[-1])
+
+    @torch.no_grad()
+    def forward_bucketed(
+        self,
+        input_ids: torch.LongTensor,
+        ref_s: torch.FloatTensor,
+        speed: float = 1,
+        timer: Optional[StageTimer] = None,
+        generator: Optional[torch.Generator] = None
+    ) -> tuple[torch.FloatTensor, torch.LongTensor]:
+        stage = timer or untimed
+        n = input_ids.shape[-1]
+        T = KModel.bucket(n, self.buckets)
+        input_lengths = torch.full((input_ids.shape[0],), n, dtype=torch.long, device=input_ids.device)
+        # A tensor speed, so that new speeds do not trigger recompiles
+        speed = torch.tensor([speed], dtype=torch.float, device=self.device)
+        with stage('encode'), inductor_cache(self.inductor_cache_dir):
+            pred_dur, d, t_en = self._encode(F.pad(input_ids, (0, T - n)), ref_s, speed, input_lengths=input_lengths)
+        pred_dur, d, t_en = pred_dur[:n], d[:, :n], t_en[..., :n]
+        with stage('alignment'):
+            en, asr = self.align(pred_dur, d, t_en)
+        frames = en.shape[-1]
+        N = KModel.bucket(frames, self.frame_buckets)
+        mask = (torch.arange(N, device=self.device) < frames).view(1, 1, N)
+        with stage('decode'), inductor_cache(self.inductor_cache_dir):
+            audio = self._decode(F.pad(en, (0, N - frames)), F.pad(asr, (0, N - frames)), ref_s, mask=mask, generator=generator)
+        return audio[:audio.shape[-1] // N * frames], pred_dur
+
+    @torch.no_grad()
+    def compile(
+        self,
+        buckets: Sequence[int] = (64, 128, 256, 512),
+        frame_buckets: Optional[Sequence[int]] = None,
+        cache_dir: Optional[str] = None,
+        warmup: bool = True,
+        **kwargs
+    ) -> Dict[str, Dict[int, Dict[str, float]]]:
+        '''
+        Opt in to torch.compile with a fixed set of shapes. input_ids are right-padded
+        to the smallest token bucket that fits, and the aligned frame axis to the
+        smallest frame bucket (default: 4x each token bucket; longer alignments round
+        up to a multiple of the largest), so compiles are bounded by the bucket count.
+
+        Token padding is masked exactly, by the attention mask and LSTM packing. Frame
+        padding is masked in every AdaIN (statistics over valid frames, padding zeroed)
+        and in the F0/N LSTM; only the few frames before the cut can differ from an
+        unpadded run, and the audio is trimmed there.
+
+        The inductor cache persists in cache_dir (default: $TORCHINDUCTOR_CACHE_DIR,
+        else $KOKORO_HOME/inductor), so later processes load kernels instead of
+        compiling them. The variable is only set while compiled code runs (see
+        inductor_cache()), so other torch.compile users keep their own cache.
+        kwargs go to torch.compile.
+
+        With warmup, every bucket is compiled now and timed against eager mode:
+        returns {'encode': {bucket: timings}, 'decode': {frame_bucket: timings}}
+        with seconds for 'compile', 'eager' and 'compiled', and their 'speedup'.
+        '''
+        self.buckets = sorted(buckets)
+        self.frame_buckets = sorted(frame_buckets or (4 * b for b in self.buckets))
+        self.inductor_cache_dir = cache_dir or os.environ.get('TORCHINDUCTOR_CACHE_DIR') or os.path.join(registry.home(), 'inductor')
+        logger.debug("Inductor cache: {}", self.inductor_cache_dir)
+        kwargs.setdefault('dynamic', False)
+        if 'mode' not in kwargs:  # torch.compile takes mode or options, not both
+            kwargs['options'] = {'fx_graph_cache': True, **(kwargs.get('options') or {})}
+        self._encode = torch.compile(self.encode, **kwargs)
+        self._decode = torch.compile(self.decode, **kwargs)
+        report = dict(encode={}, decode={})
+        if not warmup:
+            return report
+        ids = torch.tensor(list(self.vocab.values()), device=self.device)
+        ref_s = torch.randn(1, 256, device=self.device) * 0.1
+        speed = torch.ones(1, device=self.device)
+        def run(fn, *args, **kwargs):
+            timer = StageTimer(self.device)
+            with timer('run'), inductor_cache(self.inductor_cache_dir):
+                fn(*args, **kwargs)
+            return timer.timings['run']
+        def add(kind, bucket, compile, eager, compiled):
+            report[kind][bucket] = dict(compile=compile, eager=eager, compiled=compiled, speedup=eager / compiled)
+            logger.info("{} bucket {}: compile {:.1f}s, eager {:.3f}s, compiled {:.3f}s ({:.2f}x)", kind, bucket, compile, eager, compiled, eager / compiled)
+        for T in self.buckets:
+            input_ids = ids[torch.randint(len(ids), (1, min(T, self.context_length)), device=self.device)]
+            lengths = torch.tensor([input_ids.shape[-1]], device=input_ids.device)
+            add('encode', T,
+                run(self._encode, input_ids, ref_s, speed, input_lengths=lengths),
+                run(self.encode, input_ids, ref_s),
+                run(self._encode, input_ids, ref_s, speed, input_lengths=lengths))
+        _, d, t_en = self.encode(input_ids, ref_s)
+        for N in self.frame_buckets:
+            en, asr = (torch.randn(1, x.shape[1], N, device=self.device) for x in (d.transpose(-1, -2), t_en))
+            mask = torch.ones(1, 1, N, dtype=torch.bool, device=self.device)
+            add('decode', N,
+                run(self._decode, en, asr, ref_s, mask=mask),
+                run(self.decode, en, asr, ref_s),
+                run(self._decode, en, asr, ref_s, mask=mask))
+        return report
+
+    @torch.no_grad()
+    def warmup(
+        self,
+        lengths: Sequence[int] = (16, 64, 128, 256, 500),
+        ref_s: Optional[torch.FloatTensor] = None,
+        runs: int = 3
+    ) -> Dict[int, Dict[str, float]]:
+        '''
+        Run forward a few times on random phonemes of each length, so that allocator growth,
+        oneDNN primitive creation and, after compile(), kernel loading happen before real
+        requests do. ref_s is a style [1, 256] or a voice pack indexed by length as in
+        KPipeline (default: a random style). Lengths are capped to fit the context.
+        Returns {length: timings} with seconds for the 'first' run, the median 'steady'
+        run of the rest, and the 'audio' produced.
+        '''
+        ref_s = torch.randn(1, 256) * 0.1 if ref_s is None else ref_s
+        vocab = sorted(set(self.vocab.values()))
+        generator = torch.Generator().manual_seed(0)
+        report = {}
+        for n in lengths:
+            n = max(1, min(n, self.context_length - 2))
+            input_ids = torch.LongTensor([[0, *(vocab[i] for i in torch.randint(len(vocab), (n,), generator=generator)), 0]]).to(self.device)
+            s = (ref_s[n - 1] if ref_s.dim() == 3 else ref_s).to(self.device)
+            times = []
+            for _ in range(max(runs, 2)):
+                timer = StageTimer(self.device)
+                with timer('forward'):
+                    audio, _ = self.forward_with_tokens(input_ids, s)
+                times.append(timer.timings['forward'])
+            report[n] = dict(first=times[0], steady=statistics.median(times[1:]), audio=audio.shape[-1] / 24000)
+            logger.info("Warmup {} phonemes: first {:.3f}s, steady {:.3f}s", n, times[0], report[n]['steady'])
+        return report
+
     def forward(
         self,
         phonemes: str,
         ref_s: torch.FloatTensor,
         speed: float = 1,
-        return_output: bool = False
+        return_output: bool = False,
+        timer: Optional[StageTimer] = None,
+        seed: Optional[int] = None,
+        style_key: Optional[Hashable] = None
     ) -> Union['KModel.Output', torch.FloatTensor]:
+        '''
+        With a seed, randomness comes from a per-call torch.Generator instead of the
+        global RNG, so the same inputs and seed give identical audio on a given device.
+        With a style_key identifying ref_s, e.g. (KPipeline.voice_key(pack), len(phonemes) - 1),
+        its style projections are cached and reused (see styles()).
+        '''
         input_ids = list(filter(lambda i: i is not None, map(lambda p: self.vocab.get(p), phonemes)))
-        logger.debug(f"phonemes: {phonemes} -> input_ids: {input_ids}")
+        logger.debug("phonemes: {} -> input_ids: {}", phonemes, input_ids)
+        return self.forward_ids(torch.LongTensor(input_ids), ref_s, speed, return_output, timer, seed, style_key)
+
+    def forward_ids(
+        self,
+        input_ids: torch.LongTensor,
+        ref_s: torch.FloatTensor,
+        speed: float = 1,
+        return_output: bool = False,
+        timer: Optional[StageTimer] = None,
+        seed: Optional[int] = None,
+        style_key: Optional[Hashable] = None
+    ) -> Union['KModel.Output', torch.FloatTensor]:
+        '''forward() for phonemes already mapped to vocab ids, without the 0 padding at both ends.'''
         assert len(input_ids)+2 <= self.context_length, (len(input_ids)+2, self.context_length)
-        input_ids = torch.LongTensor([[0, *input_ids, 0]]).to(self.device)
+        cpu_ids = F.pad(input_ids.long(), (1, 1)).unsqueeze(0)
+        input_ids = cpu_ids.to(self.device)
+        ref_s = ref_s.to(self.device)
+        generator = None if seed is None else torch.Generator(self.device).manual_seed(seed)
+        styles = None if style_key is None or not self.style_cache_size else self.styles(ref_s, style_key)
+        start = time.perf_counter() if metrics.enabled() else None
+        text = self.text_features(input_ids, timer, cpu_ids) if self.text_cache_size and self.buckets is None else None
+        audio, pred_dur = self.forward_with_tokens(input_ids, ref_s, speed, timer, generator, styles, text)
+        return self._finish(audio, pred_dur, input_ids.shape[-1] - 2, start, return_output, timer)
+
+    @torch.no_grad()
+    def prepare(
+        self,
+        phonemes: Union[str, torch.LongTensor],
+        ref_s: torch.FloatTensor,
+        timer: Optional[StageTimer] = None,
+        style_key: Optional[Hashable] = None
+    ) -> 'KModel.State':
+        '''
+        Run the speed-independent stages for phonemes (or vocab ids without the 0 pads)
+        and ref_s, for rendering at several speeds:
+
+            state = model.prepare(phonemes, pack[len(phonemes)-1])
+            for speed in (0.8, 1, 1.2):
+                audio = model.render(state, speed)
+        '''
+        cpu_ids = self._token_ids(phonemes)
+        input_ids = cpu_ids.to(self.device)
         ref_s = ref_s.to(self.device)
-        audio, pred_dur = self.forward_with_tokens(input_ids, ref_s, speed)
+        styles = None if style_key is None or not self.style_cache_size else self.styles(ref_s, style_key)
+        text = self.text_features(input_ids, timer, cpu_ids)
+        duration, d, t_en = self.encode_unscaled(input_ids, ref_s, timer, styles=styles, text=text)
+        return self.State(input_ids=input_ids, ref_s=ref_s, duration=duration, d=d, t_en=t_en, styles=styles)
+
+    @torch.no_grad()
+    def prepare_voices(
+        self,
+        phonemes: Union[str, torch.LongTensor],
+        ref_s: Union[Sequence[torch.FloatTensor], torch.FloatTensor],
+        timer: Optional[StageTimer] = None
+    ) -> List['KModel.State']:
+        '''
+        prepare() for the same phonemes in several voices, given one [1, 256] ref_s per voice
+        or a [V, 256] batch: the text side runs once, the style-conditioned predictor as one batch.
+        '''
+        cpu_ids = self._token_ids(phonemes)
+        input_ids = cpu_ids.to(self.device)
+        ref_s = (ref_s if torch.is_tensor(ref_s) else torch.cat(list(ref_s))).reshape(-1, 256).to(self.device)
+        d_en, t_en = self.text_features(input_ids, timer, cpu_ids)
+        voices = ref_s.shape[0]
+        duration, d, _ = self.encode_unscaled(input_ids.expand(voices, -1), ref_s, timer, text=(d_en.expand(voices, -1, -1), t_en))
+        return [
+            self.State(input_ids=input_ids, ref_s=ref_s[i:i+1], duration=duration[i:i+1], d=d[i:i+1], t_en=t_en)
+            for i in range(voices)
+        ]
+
+    def forward_voices(
+        self,
+        phonemes: Union[str, torch.LongTensor],
+        ref_s: Union[Sequence[torch.FloatTensor], torch.FloatTensor],
+        speed: float = 1,
+        return_output: bool = False,
+        seed: Optional[int] = None
+    ) -> List[Union['KModel.Output', torch.FloatTensor]]:
+        '''
+        forward() for the same phonemes in each voice of ref_s (see prepare_voices()).
+        Voices predict different durations, so the decoder still runs once per voice.
+        '''
+        return [self.render(state, speed, return_output, seed=seed) for state in self.prepare_voices(phonemes, ref_s)]
+
+    def _token_ids(self, phonemes: Union[str, torch.LongTensor]) -> torch.LongTensor:
+        '''Phonemes (or vocab ids without the 0 pads) as a padded [1, T] batch, not yet moved to this device.'''
+        if isinstance(phonemes, str):
+            phonemes = torch.LongTensor([i for i in map(self.vocab.get, phonemes) if i is not None])
+        assert len(phonemes)+2 <= self.context_length, (len(phonemes)+2, self.context_length)
+        return F.pad(phonemes.long(), (1, 1)).unsqueeze(0)
+
+    def _input_ids(self, phonemes: Union[str, torch.LongTensor]) -> torch.LongTensor:
+        '''Phonemes (or vocab ids without the 0 pads) as a padded [1, T] batch on this device.'''
+        return self._token_ids(phonemes).to(self.device)
+
+    @torch.no_grad()
+    def render(
+        self,
+        state: 'KModel.State',
+        speed: float = 1,
+        return_output: bool = False,
+        timer: Optional[StageTimer] = None,
+        seed: Optional[int] = None
+    ) -> Union['KModel.Output', torch.FloatTensor]:
+        '''
+        forward() for a prepare()d state: only rounds durations, aligns and decodes.
+        Gives the same audio as forward() with the same speed and seed.
+        '''
+        generator = None if seed is None else torch.Generator(self.device).manual_seed(seed)
+        start = time.perf_counter() if metrics.enabled() else None
+        with (timer or untimed)('duration'):
+            pred_dur = KModel.round_durations(state.duration, speed)
+        with (timer or untimed)('alignment'):
+            en, asr = self.align(pred_dur, state.d, state.t_en)
+        audio = self.decode(en, asr, state.ref_s, timer, generator=generator, styles=state.styles)
+        return self._finish(audio, pred_dur, state.input_ids.shape[-1] - 2, start, return_output, timer)
+
+    def _finish(
+        self,
+        audio: torch.FloatTensor,
+        pred_dur: Optional[torch.LongTensor],
+        n: int,
+        start: Optional[float],
+        return_output: bool,
+        timer: Optional[StageTimer]
+    ) -> Union['KModel.Output', torch.FloatTensor]:
         audio = audio.squeeze().cpu()
         pred_dur = pred_dur.cpu() if pred_dur is not None else None
-        logger.debug(f"pred_dur: {pred_dur}")
-        return self.Output(audio=audio, pred_dur=pred_dur) if return_output else audio
+        logger.debug("pred_dur: {}", pred_dur)
+        if start is not None:
+            KModel.record([n], [audio.shape[-1] / 24000], time.perf_counter() - start)
+        if not return_output:
+            return audio
+        if timer is None:
+            return self.Output(audio=audio, pred_dur=pred_dur)
+        return self.Output(
+            audio=audio, pred_dur=pred_dur,
+            timings=timer.timings, allocated=timer.allocated if timer.memory else None
+        )
+
+    @staticmethod
+    def record(phonemes: Sequence[int], seconds: Sequence[float], elapsed: float):
+        '''Metrics for chunks synthesized together in elapsed seconds.'''
+        for n, s in zip(phonemes, seconds):
+            metrics.inc('kokoro_chunks_total')
+            metrics.inc('kokoro_phonemes_total', n)
+            metrics.inc('kokoro_audio_seconds_total', s)
+            metrics.observe('kokoro_chunk_phonemes', n)
+        if sum(seconds):
+            metrics.observe('kokoro_real_time_factor', elapsed / sum(seconds))
+
+    @staticmethod
+    def frame_groups(frames: Sequence[int], waste: float = 0.2) -> List[List[int]]:
+        '''
+        Indices of frames grouped by similar length, shortest first, so that padding each
+        group to its longest adds at most `waste` of the group's real frames.
+        '''
+        groups = []
+        for i in sorted(range(len(frames)), key=frames.__getitem__):
+            group = groups[-1] if groups else None
+            if group is not None and frames[i] * (len(group) + 1) <= (1 + waste) * (sum(frames[j] for j in group) + frames[i]):
+                group.append(i)
+            else:
+                groups.append([i])
+        return groups
+
+    @torch.no_grad()
+    def forward_batch(
+        self,
+        phonemes: Sequence[Union[str, torch.LongTensor]],
+        ref_s: Union[Sequence[torch.FloatTensor], torch.FloatTensor],
+        speed: Union[float, Sequence[float]] = 1,
+        return_output: bool = False,
+        timer: Optional[StageTimer] = None,
+        seed: Optional[int] = None,
+        style_keys: Optional[Sequence[Optional[Hashable]]] = None
+    ) -> List[Union['KModel.Output', torch.FloatTensor]]:
+        '''
+        forward() for several chunks at once, one ref_s row and speed per chunk. The encoder
+        runs as one padded batch, the decoder once per group of similar frame lengths.
+        Audio matches forward() up to float rounding, except for the source's random phases
+        and noise, which are drawn per group rather than per chunk.
+        style_keys has one forward() style_key per chunk.
+        '''
+        stage = timer or untimed
+        ids = [self._input_ids(p)[0] for p in phonemes]
+        lengths = torch.tensor([len(i) for i in ids], device=self.device)
+        input_ids = torch.nn.utils.rnn.pad_sequence(ids, batch_first=True)
+        ref_s = (ref_s if torch.is_tensor(ref_s) else torch.cat(list(ref_s))).reshape(-1, 256).to(self.device)
+        speed = torch.tensor(speed, dtype=torch.float, device=self.device).expand(len(ids)).unsqueeze(-1)
+        generator = None if seed is None else torch.Generator(self.device).manual_seed(seed)
+        rows = None
+        if style_keys is not None and self.style_cache_size:
+            rows = [self.styles(ref_s[i:i+1], key) for i, key in enumerate(style_keys)]
+        styles = lambda group: None if rows is None else tuple(Style.cat([rows[i][j] for i in group]) for j in (0, 1))
+        start = time.perf_counter() if metrics.enabled() else None
+        pred_dur, d, t_en = self.encode(input_ids, ref_s, speed, timer, input_lengths=lengths, styles=styles(range(len(ids))))
+        pred_dur = pred_dur.view(len(ids), -1)
+        with stage('alignment'):
+            pred_dur = [pred_dur[i, :n] for i, n in enumerate(lengths.tolist())]
+            aligned = [self.align(p, d[i:i+1, :len(p)], t_en[i:i+1, :, :len(p)]) for i, p in enumerate(pred_dur)]
+            frames = [en.shape[-1] for en, _ in aligned]
+        audio = [None] * len(ids)
+        for group in KModel.frame_groups(frames):
+            N = frames[group[-1]]
+            en = torch.cat([F.pad(aligned[i][0], (0, N - frames[i])) for i in group])
+            asr = torch.cat([F.pad(aligned[i][1], (0, N - frames[i])) for i in group])
+            mask = (torch.arange(N, device=self.device) < torch.tensor([frames[i] for i in group], device=self.device)[:, None]).unsqueeze(1)
+            out = self.decode(en, asr, ref_s[group], timer, mask=mask, generator=generator, styles=styles(group)).view(len(group), -1)
+            hop = out.shape[-1] // N
+            for j, i in enumerate(group):
+                audio[i] = out[j, :hop * frames[i]]
+        outputs = [self._finish(a, p, len(i) - 2, None, return_output, None) for a, p, i in zip(audio, pred_dur, ids)]
+        if start is not None:
+            KModel.record([len(i) - 2 for i in ids], [len(a) / 24000 for a in audio], time.perf_counter() - start)
+        if return_output and timer is not None:
+            outputs[0].timings, outputs[0].allocated = timer.timings, timer.allocated if timer.memory else None
+        return outputs
 
 class KModelForONNX(torch.nn.Module):
     def __init__(self, kmodel: KModel):
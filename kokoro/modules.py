@@ -1,13 +1,54 @@
 # https://github.com/yl4579/StyleTTS2/blob/main/models.py
-from .istftnet import AdainResBlk1d
+from .istftnet import AdainResBlk1d, Style, project
+from dataclasses import dataclass
 from torch.nn.utils import weight_norm
-from transformers import AlbertModel
+from typing import List, Optional
 import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
 
+# torch.export support needs torch.library.custom_op and torch.compiler.is_exporting.
+# Older torch still runs eager inference, with export unavailable.
+compiler = getattr(torch, 'compiler', None)
+EXPORTABLE = hasattr(torch.library, 'custom_op') and hasattr(compiler, 'is_exporting')
+compiler_disable = compiler.disable if hasattr(compiler, 'disable') else lambda fn: fn
+
+def lstm_eager(x: torch.Tensor, params: List[torch.Tensor], bidirectional: bool) -> torch.Tensor:
+    '''Single-layer batch_first LSTM as one opaque op, so torch.export keeps its time axis dynamic.'''
+    h = x.new_zeros(2 if bidirectional else 1, x.shape[0], params[1].shape[1])
+    return torch._VF.lstm(x, (h, h), params, True, 1, 0.0, False, bidirectional, True)[0]
+
+if EXPORTABLE:
+    lstm_op = torch.library.custom_op('kokoro::lstm', mutates_args=())(lstm_eager)
+
+    @lstm_op.register_fake
+    def _(x, params, bidirectional):
+        return x.new_empty(x.shape[0], x.shape[1], params[1].shape[1] * (2 if bidirectional else 1))
+
+def run_lstm(lstm, x, lengths=None):
+    '''Run lstm over [B, T, C] x, packed by lengths (if given) so that padding is skipped.'''
+    if EXPORTABLE and compiler.is_exporting():
+        # Exported graphs take a single unpadded utterance; packing cannot be traced,
+        # and nn.LSTM itself would be unrolled over a fixed number of steps
+        return lstm_op(x, lstm._flat_weights, lstm.bidirectional)
+    if lengths is None:
+        return lstm(x)[0]
+    return run_packed_lstm(lstm, x, lengths)
+
+@compiler_disable
+def run_packed_lstm(lstm, x, lengths):
+    # Packed shapes depend on lengths, so torch.compile runs this eagerly rather than recompiling per length
+    total_length = x.shape[1]
+    lengths = lengths if lengths.device == torch.device('cpu') else lengths.to('cpu')
+    x = nn.utils.rnn.pack_padded_sequence(x, lengths, batch_first=True, enforce_sorted=False)
+    lstm.flatten_parameters()
+    x, _ = lstm(x)
+    x, _ = nn.utils.rnn.pad_packed_sequence(x, batch_first=True, total_length=total_length)
+    return x
+
+
 class LinearNorm(nn.Module):
     def __init__(self, in_dim, out_dim, bias=True, w_init_gain='linear'):
         super(LinearNorm, self).__init__()
@@ -48,24 +89,25 @@ class TextEncoder(nn.Module):
         self.lstm = nn.LSTM(channels, channels//2, 1, batch_first=True, bidirectional=True)
 
     def forward(self, x, input_lengths, m):
+        # input_lengths=None means nothing is padded: skip the masking and run the LSTM unpacked
         x = self.embedding(x)  # [B, T, emb]
         x = x.transpose(1, 2)  # [B, emb, T]
         m = m.unsqueeze(1)
-        x.masked_fill_(m, 0.0)
+        padded = input_lengths is not None
+        if padded:
+            x.masked_fill_(m, 0.0)
         for c in self.cnn:
             x = c(x)
-            x.masked_fill_(m, 0.0)
+            if padded:
+                x.masked_fill_(m, 0.0)
         x = x.transpose(1, 2)  # [B, T, chn]
-        lengths = input_lengths if input_lengths.device == torch.device('cpu') else input_lengths.to('cpu')
-        x = nn.utils.rnn.pack_padded_sequence(x, lengths, batch_first=True, enforce_sorted=False)
-        self.lstm.flatten_parameters()
-        x, _ = self.lstm(x)
-        x, _ = nn.utils.rnn.pad_packed_sequence(x, batch_first=True)
+        x = run_lstm(self.lstm, x, input_lengths)
         x = x.transpose(-1, -2)
-        x_pad = torch.zeros([x.shape[0], x.shape[1], m.shape[-1]], device=x.device)
-        x_pad[:, :, :x.shape[-1]] = x
-        x = x_pad
-        x.masked_fill_(m, 0.0)
+        if padded:
+            x_pad = torch.zeros([x.shape[0], x.shape[1], m.shape[-1]], device=x.device)
+            x_pad[:, :, :x.shape[-1]] = x
+            x = x_pad
+            x.masked_fill_(m, 0.0)
         return x
 
 
@@ -79,7 +121,7 @@ class AdaLayerNorm(nn.Module):
     def forward(self, x, s):
         x = x.transpose(-1, -2)
         x = x.transpose(1, -1)
-        h = self.fc(s)
+        h = project(self.fc, s)
         h = h.view(h.size(0), h.size(1), 1)
         gamma, beta = torch.chunk(h, chunks=2, dim=1)
         gamma, beta = gamma.transpose(1, -1), beta.transpose(1, -1)
@@ -109,27 +151,24 @@ class ProsodyPredictor(nn.Module):
     def forward(self, texts, style, text_lengths, alignment, m):
         d = self.text_encoder(texts, style, text_lengths, m)
         m = m.unsqueeze(1)
-        lengths = text_lengths if text_lengths.device == torch.device('cpu') else text_lengths.to('cpu')
-        x = nn.utils.rnn.pack_padded_sequence(d, lengths, batch_first=True, enforce_sorted=False)
-        self.lstm.flatten_parameters()
-        x, _ = self.lstm(x)
-        x, _ = nn.utils.rnn.pad_packed_sequence(x, batch_first=True)
-        x_pad = torch.zeros([x.shape[0], m.shape[-1], x.shape[-1]], device=x.device)
-        x_pad[:, :x.shape[1], :] = x
-        x = x_pad
+        x = run_lstm(self.lstm, d, text_lengths)
+        if text_lengths is not None:
+            x_pad = torch.zeros([x.shape[0], m.shape[-1], x.shape[-1]], device=x.device)
+            x_pad[:, :x.shape[1], :] = x
+            x = x_pad
         duration = self.duration_proj(nn.functional.dropout(x, 0.5, training=False))
         en = (d.transpose(-1, -2) @ alignment)
         return duration.squeeze(-1), en
 
-    def F0Ntrain(self, x, s):
-        x, _ = self.shared(x.transpose(-1, -2))
+    def F0Ntrain(self, x, s, mask=None):
+        x = run_lstm(self.shared, x.transpose(-1, -2), None if mask is None else mask.sum(-1).flatten())
         F0 = x.transpose(-1, -2)
         for block in self.F0:
-            F0 = block(F0, s)
+            F0 = block(F0, s, mask)
         F0 = self.F0_proj(F0)
         N = x.transpose(-1, -2)
         for block in self.N:
-            N = block(N, s)
+            N = block(N, s, mask)
         N = self.N_proj(N)
         return F0.squeeze(1), N.squeeze(1)
 
@@ -146,38 +185,148 @@ class DurationEncoder(nn.Module):
         self.sty_dim = sty_dim
 
     def forward(self, x, style, text_lengths, m):
+        # text_lengths=None means nothing is padded, as in TextEncoder
         masks = m
+        padded = text_lengths is not None
         x = x.permute(2, 0, 1)
-        s = style.expand(x.shape[0], x.shape[1], -1)
+        s = Style.tensor(style).expand(x.shape[0], x.shape[1], -1)
         x = torch.cat([x, s], axis=-1)
-        x.masked_fill_(masks.unsqueeze(-1).transpose(0, 1), 0.0)
+        if padded:
+            x.masked_fill_(masks.unsqueeze(-1).transpose(0, 1), 0.0)
         x = x.transpose(0, 1)
         x = x.transpose(-1, -2)
         for block in self.lstms:
             if isinstance(block, AdaLayerNorm):
                 x = block(x.transpose(-1, -2), style).transpose(-1, -2)
                 x = torch.cat([x, s.permute(1, 2, 0)], axis=1)
-                x.masked_fill_(masks.unsqueeze(-1).transpose(-1, -2), 0.0)
+                if padded:
+                    x.masked_fill_(masks.unsqueeze(-1).transpose(-1, -2), 0.0)
             else:
-                lengths = text_lengths if text_lengths.device == torch.device('cpu') else text_lengths.to('cpu')
-                x = x.transpose(-1, -2)
-                x = nn.utils.rnn.pack_padded_sequence(
-                    x, lengths, batch_first=True, enforce_sorted=False)
-                block.flatten_parameters()
-                x, _ = block(x)
-                x, _ = nn.utils.rnn.pad_packed_sequence(
-                    x, batch_first=True)
+                x = run_lstm(block, x.transpose(-1, -2), text_lengths)
                 x = F.dropout(x, p=self.dropout, training=False)
                 x = x.transpose(-1, -2)
-                x_pad = torch.zeros([x.shape[0], x.shape[1], m.shape[-1]], device=x.device)
-                x_pad[:, :, :x.shape[-1]] = x
-                x = x_pad
+                if padded:
+                    x_pad = torch.zeros([x.shape[0], x.shape[1], m.shape[-1]], device=x.device)
+                    x_pad[:, :, :x.shape[-1]] = x
+                    x = x_pad
 
         return x.transpose(-1, -2)
 
 
+# Same fields and defaults as transformers.AlbertConfig
+@dataclass
+class AlbertConfig:
+    vocab_size: int = 30000
+    embedding_size: int = 128
+    hidden_size: int = 4096
+    num_hidden_layers: int = 12
+    num_hidden_groups: int = 1
+    num_attention_heads: int = 64
+    intermediate_size: int = 16384
+    inner_group_num: int = 1
+    hidden_act: str = 'gelu_new'
+    max_position_embeddings: int = 512
+    type_vocab_size: int = 2
+    layer_norm_eps: float = 1e-12
+    dropout: float = 0.1
+
+
+ACT2FN = {
+    'gelu': F.gelu,
+    'gelu_new': lambda x: F.gelu(x, approximate='tanh'),
+    'relu': F.relu,
+}
+
+
+class AlbertEmbeddings(nn.Module):
+    def __init__(self, config):
+        super().__init__()
+        self.word_embeddings = nn.Embedding(config.vocab_size, config.embedding_size)
+        self.position_embeddings = nn.Embedding(config.max_position_embeddings, config.embedding_size)
+        self.token_type_embeddings = nn.Embedding(config.type_vocab_size, config.embedding_size)
+        self.LayerNorm = nn.LayerNorm(config.embedding_size, eps=config.layer_norm_eps)
+
+    def forward(self, input_ids):
+        position_ids = torch.arange(input_ids.shape[1], device=input_ids.device)
+        x = self.word_embeddings(input_ids) + self.position_embeddings(position_ids) + self.token_type_embeddings.weight[0]
+        return self.LayerNorm(x)
+
+
+class AlbertAttention(nn.Module):
+    def __init__(self, config):
+        super().__init__()
+        self.num_heads = config.num_attention_heads
+        self.query = nn.Linear(config.hidden_size, config.hidden_size)
+        self.key = nn.Linear(config.hidden_size, config.hidden_size)
+        self.value = nn.Linear(config.hidden_size, config.hidden_size)
+        self.dense = nn.Linear(config.hidden_size, config.hidden_size)
+        self.LayerNorm = nn.LayerNorm(config.hidden_size, eps=config.layer_norm_eps)
+
+    def forward(self, x, mask=None):
+        B, T, C = x.shape
+        # [B, T, C] -> [B, heads, T, C // heads]
+        q, k, v = (f(x).view(B, T, self.num_heads, -1).transpose(1, 2) for f in (self.query, self.key, self.value))
+        h = F.scaled_dot_product_attention(q, k, v, attn_mask=mask)
+        h = h.transpose(1, 2).reshape(B, T, C)
+        return self.LayerNorm(x + self.dense(h))
+
+
+class AlbertLayer(nn.Module):
+    def __init__(self, config):
+        super().__init__()
+        self.attention = AlbertAttention(config)
+        self.ffn = nn.Linear(config.hidden_size, config.intermediate_size)
+        self.ffn_output = nn.Linear(config.intermediate_size, config.hidden_size)
+        self.full_layer_layer_norm = nn.LayerNorm(config.hidden_size, eps=config.layer_norm_eps)
+        self.activation = ACT2FN[config.hidden_act]
+
+    def forward(self, x, mask=None):
+        x = self.attention(x, mask)
+        return self.full_layer_layer_norm(x + self.ffn_output(self.activation(self.ffn(x))))
+
+
+class AlbertLayerGroup(nn.Module):
+    def __init__(self, config):
+        super().__init__()
+        self.albert_layers = nn.ModuleList([AlbertLayer(config) for _ in range(config.inner_group_num)])
+
+
+class AlbertEncoder(nn.Module):
+    def __init__(self, config):
+        super().__init__()
+        self.num_hidden_layers = config.num_hidden_layers
+        self.layers_per_group = config.num_hidden_layers // config.num_hidden_groups
+        self.embedding_hidden_mapping_in = nn.Linear(config.embedding_size, config.hidden_size)
+        self.albert_layer_groups = nn.ModuleList([AlbertLayerGroup(config) for _ in range(config.num_hidden_groups)])
+
+    def forward(self, x, mask=None):
+        x = self.embedding_hidden_mapping_in(x)
+        # ALBERT shares parameters: num_hidden_layers passes over a few layer groups
+        for i in range(self.num_hidden_layers):
+            for layer in self.albert_layer_groups[i // self.layers_per_group].albert_layers:
+                x = layer(x, mask)
+        return x
+
+
 # https://github.com/yl4579/StyleTTS2/blob/main/Utils/PLBERT/util.py
-class CustomAlbert(AlbertModel):
-    def forward(self, *args, **kwargs):
-        outputs = super().forward(*args, **kwargs)
-        return outputs.last_hidden_state
+class CustomAlbert(nn.Module):
+    '''
+    Inference-only ALBERT returning last_hidden_state, without transformers.
+    Parameter names match transformers.AlbertModel, so PLBERT state dicts load as-is.
+    '''
+    def __init__(self, config: AlbertConfig):
+        super().__init__()
+        self.config = config
+        self.embeddings = AlbertEmbeddings(config)
+        self.encoder = AlbertEncoder(config)
+        # Unused, but part of the checkpoint
+        self.pooler = nn.Linear(config.hidden_size, config.hidden_size)
+
+    @property
+    def device(self):
+        return self.embeddings.word_embeddings.weight.device
+
+    def forward(self, input_ids, attention_mask: Optional[torch.Tensor] = None):
+        # Key padding mask: [B, T] with 1 = attend -> [B, 1, 1, T] bool
+        mask = None if attention_mask is None else attention_mask.bool()[:, None, None, :]
+        return self.encoder(self.embeddings(input_ids), mask)
@@ -1,12 +1,22 @@
+from . import metrics, registry, tracing
 from .model import KModel
+from .profiling import StageTimer, untimed
+from .tracing import Trace
 from dataclasses import dataclass
-from huggingface_hub import hf_hub_download
+from itertools import islice, repeat
 from loguru import logger
-from misaki import en, espeak
-from typing import Callable, Generator, List, Optional, Tuple, Union
+from typing import TYPE_CHECKING, Any, Callable, Dict, Generator, Hashable, Iterable, List, Optional, Sequence, Tuple, Union
+import copy
 import re
+import threading
+import time
 import torch
 import os
+import weakref
+
+if TYPE_CHECKING:
+    # G2P modules are imported per language in __init__: misaki.en alone pulls in spaCy
+    from misaki import en
 
 ALIASES = {
     'en-us': 'a',
@@ -43,7 +53,7 @@ class KPipeline:
     '''
     KPipeline is a language-aware support class with 2 main responsibilities:
     1. Perform language-specific G2P, mapping (and chunking) text -> phonemes
-    2. Manage and store voices, lazily downloaded from HF if needed
+    2. Manage and store voices, lazily loaded from the local registry or HF
 
     You are expected to have one KPipeline per language. If you have multiple
     KPipelines, you should reuse one KModel instance across all of them.
@@ -60,6 +70,12 @@ class KPipeline:
     any audio. You can use this to phonemize and chunk your text in advance.
 
     A "loud" KPipeline _with_ a model yields (graphemes, phonemes, audio).
+
+    A KPipeline may be shared between threads. Voice loading is locked, each
+    call works on its own tokens, and calls into the G2P are serialized by
+    g2p_lock, since the misaki backends do not document thread safety. Model
+    inference runs concurrently. Use KPipelinePool when G2P itself should
+    run in parallel.
     '''
     def __init__(
         self,
@@ -74,7 +90,7 @@ class KPipeline:
         
         Args:
             lang_code: Language code for G2P processing
-            model: KModel instance, True to create new model, False for no model
+            model: KModel (or KModelORT) instance, True to create new model, False for no model
             trf: Whether to use transformer-based G2P
             device: Override default device selection ('cuda' or 'cpu', or None for auto)
                    If None, will auto-select cuda if available
@@ -89,31 +105,16 @@ class KPipeline:
         assert lang_code in LANG_CODES, (lang_code, LANG_CODES)
         self.lang_code = lang_code
         self.model = None
-        if isinstance(model, KModel):
+        if not isinstance(model, bool):
+            # Any object with the KModel forward interface, e.g. export.onnx.KModelORT
             self.model = model
         elif model:
-            if device == 'cuda' and not torch.cuda.is_available():
-                raise RuntimeError("CUDA requested but not available")
-            if device == 'mps' and not torch.backends.mps.is_available():
-                raise RuntimeError("MPS requested but not available")
-            if device == 'mps' and os.environ.get('PYTORCH_ENABLE_MPS_FALLBACK') != '1':
-                raise RuntimeError("MPS requested but fallback not enabled")
-            if device is None:
-                if torch.cuda.is_available():
-                    device = 'cuda'
-                elif os.environ.get('PYTORCH_ENABLE_MPS_FALLBACK') == '1' and torch.backends.mps.is_available():
-                    device = 'mps'
-                else:
-                    device = 'cpu'
-            try:
-                self.model = KModel(repo_id=repo_id).to(device).eval()
-            except RuntimeError as e:
-                if device == 'cuda':
-                    raise RuntimeError(f"""Failed to initialize model on CUDA: {e}. 
-                                       Try setting device='cpu' or check CUDA installation.""")
-                raise
+            self.model = KPipeline.load_model(repo_id, device)
         self.voices = {}
+        self.lock = threading.Lock()  # guards voices
+        self.g2p_lock = threading.Lock()
         if lang_code in 'ab':
+            from misaki import en, espeak
             try:
                 fallback = espeak.EspeakFallback(british=lang_code=='b')
             except Exception as e:
@@ -139,24 +140,53 @@ class KPipeline:
                 logger.error("You need to `pip install misaki[zh]` to use lang_code='z'")
                 raise
         else:
+            from misaki import espeak
             language = LANG_CODES[lang_code]
             logger.warning(f"Using EspeakG2P(language='{language}'). Chunking logic not yet implemented, so long texts may be truncated unless you split them with '\\n'.")
             self.g2p = espeak.EspeakG2P(language=language)
 
+    @staticmethod
+    def load_model(repo_id: str, device: Optional[str] = None) -> KModel:
+        '''Create a KModel on device, auto-selecting cuda, then mps (with fallback enabled), then cpu.'''
+        if device == 'cuda' and not torch.cuda.is_available():
+            raise RuntimeError("CUDA requested but not available")
+        if device == 'mps' and not torch.backends.mps.is_available():
+            raise RuntimeError("MPS requested but not available")
+        if device == 'mps' and os.environ.get('PYTORCH_ENABLE_MPS_FALLBACK') != '1':
+            raise RuntimeError("MPS requested but fallback not enabled")
+        if device is None:
+            if torch.cuda.is_available():
+                device = 'cuda'
+            elif os.environ.get('PYTORCH_ENABLE_MPS_FALLBACK') == '1' and torch.backends.mps.is_available():
+                device = 'mps'
+            else:
+                device = 'cpu'
+        try:
+            return KModel(repo_id=repo_id).to(device).eval()
+        except RuntimeError as e:
+            if device == 'cuda':
+                raise RuntimeError(f"""Failed to initialize model on CUDA: {e}. 
+                                   Try setting device='cpu' or check CUDA installation.""")
+            raise
+
     def load_single_voice(self, voice: str):
-        if voice in self.voices:
-            return self.voices[voice]
+        with self.lock:
+            pack = self.voices.get(voice)
+        if pack is not None:
+            metrics.inc('kokoro_voice_cache_hits_total', lang=self.lang_code)
+            return pack
         if voice.endswith('.pt'):
             f = voice
         else:
-            f = hf_hub_download(repo_id=self.repo_id, filename=f'voices/{voice}.pt')
+            f = registry.voice_path(self.repo_id, voice)
             if not voice.startswith(self.lang_code):
                 v = LANG_CODES.get(voice, voice)
                 p = LANG_CODES.get(self.lang_code, self.lang_code)
                 logger.warning(f'Language mismatch, loading {v} voice into {p} pipeline.')
         pack = torch.load(f, weights_only=True)
-        self.voices[voice] = pack
-        return pack
+        metrics.inc('kokoro_voice_loads_total', lang=self.lang_code)
+        with self.lock:  # threads that loaded the same voice concurrently all get the first pack
+            return self.voices.setdefault(voice, pack)
 
     """
     load_voice is a helper function that lazily downloads and loads a voice:
@@ -167,22 +197,73 @@ class KPipeline:
     def load_voice(self, voice: Union[str, torch.FloatTensor], delimiter: str = ",") -> torch.FloatTensor:
         if isinstance(voice, torch.FloatTensor):
             return voice
-        if voice in self.voices:
-            return self.voices[voice]
-        logger.debug(f"Loading voice: {voice}")
+        with self.lock:
+            pack = self.voices.get(voice)
+        if pack is not None:
+            metrics.inc('kokoro_voice_cache_hits_total', lang=self.lang_code)
+            return pack
+        logger.debug("Loading voice: {}", voice)
         packs = [self.load_single_voice(v) for v in voice.split(delimiter)]
         if len(packs) == 1:
             return packs[0]
-        self.voices[voice] = torch.mean(torch.stack(packs), dim=0)
-        return self.voices[voice]
+        with self.lock:
+            return self.voices.setdefault(voice, torch.mean(torch.stack(packs), dim=0))
+
+    @staticmethod
+    def voice_key(pack: torch.FloatTensor) -> Hashable:
+        '''
+        Identity of a loaded pack for KModel's style cache: the tensor, held weakly so a
+        later pack at the same address never matches, and its in-place version counter.
+        Names and paths are not enough, since they can resolve to a different pack.
+        '''
+        return (weakref.ref(pack), pack._version)
+
+    def load_pack(self, voice: Union[str, torch.FloatTensor], device: torch.device) -> Tuple[torch.FloatTensor, Hashable]:
+        '''load_voice(voice) on device, with the voice_key() of the loaded pack.'''
+        pack = self.load_voice(voice)
+        return pack.to(device), KPipeline.voice_key(pack)
+
+    def warmup(
+        self,
+        voices: Sequence[str] = (),
+        lengths: Sequence[int] = (16, 64, 128, 256, 500),
+        text: Optional[str] = None
+    ) -> Dict[str, Any]:
+        '''
+        Get ready to serve: load each voice and keep it on the model's device, run text
+        through G2P if given, then KModel.warmup() on lengths with the first voice.
+        Returns {'voices': {voice: seconds}, 'g2p': seconds or None,
+        'model': the KModel.warmup() report, 'seconds': total}.
+        '''
+        start = time.perf_counter()
+        report = dict(voices={}, g2p=None, model={})
+        device = self.model.device if self.model else 'cpu'
+        packs = []
+        for voice in voices:
+            t = time.perf_counter()
+            pack = self.load_voice(voice).to(device)
+            with self.lock:  # requests then skip the copy in __call__
+                self.voices[voice] = pack
+            packs.append(pack)
+            report['voices'][voice] = time.perf_counter() - t
+        if text is not None:
+            t = time.perf_counter()
+            for _ in self(text, model=False):
+                pass
+            report['g2p'] = time.perf_counter() - t
+        if isinstance(self.model, KModel):
+            report['model'] = self.model.warmup(lengths, packs[0] if packs else None)
+        report['seconds'] = time.perf_counter() - start
+        logger.info("Warmed up in {:.2f}s", report['seconds'])
+        return report
 
     @staticmethod
-    def tokens_to_ps(tokens: List[en.MToken]) -> str:
+    def tokens_to_ps(tokens: List['en.MToken']) -> str:
         return ''.join(t.phonemes + (' ' if t.whitespace else '') for t in tokens).strip()
 
     @staticmethod
     def waterfall_last(
-        tokens: List[en.MToken],
+        tokens: List['en.MToken'],
         next_count: int,
         waterfall: List[str] = ['!.?…', ':;', ',—'],
         bumps: List[str] = [')', '”']
@@ -199,13 +280,13 @@ class KPipeline:
         return len(tokens)
 
     @staticmethod
-    def tokens_to_text(tokens: List[en.MToken]) -> str:
+    def tokens_to_text(tokens: List['en.MToken']) -> str:
         return ''.join(t.text + t.whitespace for t in tokens).strip()
 
     def en_tokenize(
         self,
-        tokens: List[en.MToken]
-    ) -> Generator[Tuple[str, str, List[en.MToken]], None, None]:
+        tokens: List['en.MToken']
+    ) -> Generator[Tuple[str, str, List['en.MToken']], None, None]:
         tks = []
         pcount = 0
         for t in tokens:
@@ -216,7 +297,7 @@ class KPipeline:
             if next_pcount > 510:
                 z = KPipeline.waterfall_last(tks, next_pcount)
                 text = KPipeline.tokens_to_text(tks[:z])
-                logger.debug(f"Chunking text at {z}: '{text[:30]}{'...' if len(text) > 30 else ''}'")
+                logger.debug("Chunking text at {}: '{}{}'", z, text[:30], '...' if len(text) > 30 else '')
                 ps = KPipeline.tokens_to_ps(tks[:z])
                 yield text, ps, tks[:z]
                 tks = tks[z:]
@@ -230,23 +311,88 @@ class KPipeline:
             ps = KPipeline.tokens_to_ps(tks)
             yield ''.join(text).strip(), ''.join(ps).strip(), tks
 
+    @staticmethod
+    def laps(items: Iterable[Any], profile: bool) -> Iterable[Tuple[Optional[float], Any]]:
+        '''Pairs each item with the seconds spent producing it, or None if not profiling.'''
+        if not profile:
+            return zip(repeat(None), items)
+        def timed():
+            it = iter(items)
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+                yield time.perf_counter() - start, item
+        return timed()
+
+    @staticmethod
+    def collect_timings(
+        output: Optional[KModel.Output],
+        **timings: Optional[float]
+    ) -> Dict[str, float]:
+        timings = {k: v for k, v in timings.items() if v is not None}
+        if output is not None and output.timings:
+            timings.update(output.timings)
+        return timings
+
     @staticmethod
     def infer(
         model: KModel,
         ps: str,
         pack: torch.FloatTensor,
-        speed: Union[float, Callable[[int], float]] = 1
+        speed: Union[float, Callable[[int], float]] = 1,
+        profile: bool = False,
+        trace: Optional[Trace] = None,
+        seed: Optional[int] = None,
+        voice_key: Optional[Hashable] = None
     ) -> KModel.Output:
+        '''With the pack's voice_key(), the model caches style projections per (pack, row).'''
         if callable(speed):
             speed = speed(len(ps))
-        return model(ps, pack[len(ps)-1], speed, return_output=True)
+        timer = StageTimer(model.device, trace=trace) if profile or trace is not None else None
+        style_key = None if voice_key is None else (voice_key, len(ps)-1)
+        return model(ps, pack[len(ps)-1], speed, return_output=True, timer=timer, seed=seed, style_key=style_key)
+
+    @staticmethod
+    def infer_batch(
+        model: KModel,
+        results: List['KPipeline.Result'],
+        pack: torch.FloatTensor,
+        speed: Union[float, Callable[[int], float]] = 1,
+        profile: bool = False,
+        seed: Optional[int] = None,
+        trace: Optional[Trace] = None,
+        voice_key: Optional[Hashable] = None
+    ) -> List['KPipeline.Result']:
+        '''
+        Synthesizes G2P-only results in one KModel.forward_batch() and attaches each output
+        and its word timestamps. With profile, the batch's stage timings go on the first.
+        '''
+        speeds = [speed(len(r.phonemes)) if callable(speed) else speed for r in results]
+        timer = StageTimer(model.device, trace=trace) if profile or trace is not None else None
+        style_keys = None if voice_key is None else [(voice_key, len(r.phonemes)-1) for r in results]
+        outputs = model.forward_batch(
+            [r.phonemes for r in results], [pack[len(r.phonemes)-1] for r in results], speeds,
+            return_output=True, timer=timer, seed=seed, style_keys=style_keys
+        )
+        for r, output in zip(results, outputs):
+            r.output = output
+            if r.tokens and output.pred_dur is not None:
+                KPipeline.join_timestamps(r.tokens, output.pred_dur)
+            if profile:
+                r.timings = KPipeline.collect_timings(output, **(r.timings or {}))
+        return results
 
     def generate_from_tokens(
         self,
-        tokens: Union[str, List[en.MToken]],
+        tokens: Union[str, List['en.MToken']],
         voice: str,
         speed: float = 1,
-        model: Optional[KModel] = None
+        model: Union[KModel, bool, None] = None,
+        profile: bool = False,
+        seed: Optional[int] = None
     ) -> Generator['KPipeline.Result', None, None]:
         """Generate audio from either raw phonemes or pre-processed tokens.
         
@@ -254,7 +400,9 @@ class KPipeline:
             tokens: Either a phoneme string or list of pre-processed MTokens
             voice: The voice to use for synthesis
             speed: Speech speed modifier (default: 1)
-            model: Optional KModel instance (uses pipeline's model if not provided)
+            model: Optional KModel instance (uses pipeline's model if not provided, False to skip synthesis)
+            profile: Attach per-stage timings (chunking + model stages) to each Result
+            seed: Seed every chunk's randomness, so the same input always gives the same audio
         
         Yields:
             KPipeline.Result containing the input tokens and generated audio
@@ -262,37 +410,42 @@ class KPipeline:
         Raises:
             ValueError: If no voice is provided or token sequence exceeds model limits
         """
-        model = model or self.model
+        model = self.model if model is None else model  # model=False: G2P and chunking only
         if model and voice is None:
             raise ValueError('Specify a voice: pipeline.generate_from_tokens(..., voice="af_heart")')
         
-        pack = self.load_voice(voice).to(model.device) if model else None
+        pack, voice_key = self.load_pack(voice, model.device) if model else (None, None)
+        trace = tracing.sample('KPipeline.generate_from_tokens')
 
         # Handle raw phoneme string
         if isinstance(tokens, str):
             logger.debug("Processing phonemes from raw string")
             if len(tokens) > 510:
                 raise ValueError(f'Phoneme string too long: {len(tokens)} > 510')
-            output = KPipeline.infer(model, tokens, pack, speed) if model else None
-            yield self.Result(graphemes='', phonemes=tokens, output=output)
+            output = KPipeline.infer(model, tokens, pack, speed, profile, trace, seed, voice_key) if model else None
+            timings = KPipeline.collect_timings(output) if profile else None
+            yield self.Result(graphemes='', phonemes=tokens, output=output, timings=timings)
             return
         
         logger.debug("Processing MTokens")
-        # Handle pre-processed tokens
-        for gs, ps, tks in self.en_tokenize(tokens):
+        # Handle pre-processed tokens, copied since chunking and timestamps write to them
+        tokens = [copy.copy(t) for t in tokens]
+        for chunking, (gs, ps, tks) in KPipeline.laps(self.en_tokenize(tokens), profile):
             if not ps:
                 continue
             elif len(ps) > 510:
                 logger.warning(f"Unexpected len(ps) == {len(ps)} > 510 and ps == '{ps}'")
                 logger.warning("Truncating to 510 characters")
+                metrics.inc('kokoro_truncations_total', lang=self.lang_code)
                 ps = ps[:510]
-            output = KPipeline.infer(model, ps, pack, speed) if model else None
+            output = KPipeline.infer(model, ps, pack, speed, profile, trace, seed, voice_key) if model else None
             if output is not None and output.pred_dur is not None:
                 KPipeline.join_timestamps(tks, output.pred_dur)
-            yield self.Result(graphemes=gs, phonemes=ps, tokens=tks, output=output)
+            timings = KPipeline.collect_timings(output, chunking=chunking) if profile else None
+            yield self.Result(graphemes=gs, phonemes=ps, tokens=tks, output=output, timings=timings)
 
     @staticmethod
-    def join_timestamps(tokens: List[en.MToken], pred_dur: torch.LongTensor):
+    def join_timestamps(tokens: List['en.MToken'], pred_dur: torch.LongTensor):
         # Multiply by 600 to go from pred_dur frames to sample_rate 24000
         # Equivalent to dividing pred_dur frames by 40 to get timestamp in seconds
         # We will count nice round half-frames, so the divisor is 80
@@ -331,11 +484,19 @@ class KPipeline:
 
     @dataclass
     class Result:
+        '''
+        timings is only set when the pipeline is called with profile=True. It holds
+        seconds spent in g2p and chunking plus the KModel.Output stage timings.
+        G2P and chunking run once per text segment for some languages, in which case
+        their time is reported on the first Result of that segment and 0 afterwards,
+        so summing timings over all Results never double counts.
+        '''
         graphemes: str
         phonemes: str
-        tokens: Optional[List[en.MToken]] = None
+        tokens: Optional[List['en.MToken']] = None
         output: Optional[KModel.Output] = None
         text_index: Optional[int] = None
+        timings: Optional[Dict[str, float]] = None
 
         @property
         def audio(self) -> Optional[torch.FloatTensor]:
@@ -364,12 +525,50 @@ class KPipeline:
         voice: Optional[str] = None,
         speed: Union[float, Callable[[int], float]] = 1,
         split_pattern: Optional[str] = r'\n+',
-        model: Optional[KModel] = None
+        model: Union[KModel, bool, None] = None,
+        profile: bool = False,
+        seed: Optional[int] = None,
+        batch_chunks: int = 1
     ) -> Generator['KPipeline.Result', None, None]:
-        model = model or self.model
+        '''
+        batch_chunks > 1 synthesizes that many chunks at a time with KModel.forward_batch(),
+        still yielding Results in order. It trades latency to the first chunk for throughput,
+        so it suits callers that want the whole text rather than streaming playback.
+        Models without forward_batch(), such as KModelORT and KModelAOT, go one chunk at a time.
+        '''
+        model = self.model if model is None else model  # model=False: G2P and chunking only
         if model and voice is None:
             raise ValueError('Specify a voice: en_us_pipeline(text="Hello world!", voice="af_heart")')
-        pack = self.load_voice(voice).to(model.device) if model else None
+        pack, voice_key = self.load_pack(voice, model.device) if model else (None, None)
+        trace = tracing.sample('KPipeline')
+        span = untimed if trace is None else trace.span
+        with span('request'):
+            if not (model and batch_chunks > 1 and hasattr(model, 'forward_batch')):
+                yield from self._generate(text, pack, voice_key, speed, split_pattern, model, profile, seed, trace)
+                return
+            results = self._generate(text, None, None, speed, split_pattern, False, profile, seed, trace)
+            while batch := list(islice(results, batch_chunks)):
+                with span('batch', chunks=len(batch)):
+                    KPipeline.infer_batch(model, batch, pack, speed, profile, seed, trace, voice_key)
+                for result in batch:
+                    with span('yield'):
+                        yield result
+
+    def _generate(
+        self,
+        text: Union[str, List[str]],
+        pack: Optional[torch.FloatTensor],
+        voice_key: Optional[Hashable],
+        speed: Union[float, Callable[[int], float]],
+        split_pattern: Optional[str],
+        model: Union[KModel, bool],
+        profile: bool,
+        seed: Optional[int],
+        trace: Optional[Trace]
+    ) -> Generator['KPipeline.Result', None, None]:
+        '''__call__ one chunk at a time, on a loaded pack and within the caller's request span.'''
+        clock = profile or metrics.enabled()
+        span = untimed if trace is None else trace.span
         
         # Convert input to list of segments
         if isinstance(text, str):
@@ -379,64 +578,89 @@ class KPipeline:
         for graphemes_index, graphemes in enumerate(text):
             if not graphemes.strip():  # Skip empty segments
                 continue
-                
-            # English processing (unchanged)
-            if self.lang_code in 'ab':
-                logger.debug(f"Processing English text: {graphemes[:50]}{'...' if len(graphemes) > 50 else ''}")
-                _, tokens = self.g2p(graphemes)
-                for gs, ps, tks in self.en_tokenize(tokens):
-                    if not ps:
-                        continue
-                    elif len(ps) > 510:
-                        logger.warning(f"Unexpected len(ps) == {len(ps)} > 510 and ps == '{ps}'")
-                        ps = ps[:510]
-                    output = KPipeline.infer(model, ps, pack, speed) if model else None
-                    if output is not None and output.pred_dur is not None:
-                        KPipeline.join_timestamps(tks, output.pred_dur)
-                    yield self.Result(graphemes=gs, phonemes=ps, tokens=tks, output=output, text_index=graphemes_index)
             
-            # Non-English processing with chunking
-            else:
-                # Split long text into smaller chunks (roughly 400 characters each)
-                # Using sentence boundaries when possible
-                chunk_size = 400
-                chunks = []
-                
-                # Try to split on sentence boundaries first
-                sentences = re.split(r'([.!?]+)', graphemes)
-                current_chunk = ""
-                
-                for i in range(0, len(sentences), 2):
-                    sentence = sentences[i]
-                    # Add the punctuation back if it exists
-                    if i + 1 < len(sentences):
-                        sentence += sentences[i + 1]
-                        
-                    if len(current_chunk) + len(sentence) <= chunk_size:
-                        current_chunk += sentence
-                    else:
-                        if current_chunk:
-                            chunks.append(current_chunk.strip())
-                        current_chunk = sentence
-                
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                
-                # If no chunks were created (no sentence boundaries), fall back to character-based chunking
-                if not chunks:
-                    chunks = [graphemes[i:i+chunk_size] for i in range(0, len(graphemes), chunk_size)]
-                
-                # Process each chunk
-                for chunk in chunks:
-                    if not chunk.strip():
-                        continue
-                        
-                    ps, _ = self.g2p(chunk)
-                    if not ps:
-                        continue
-                    elif len(ps) > 510:
-                        logger.warning(f'Truncating len(ps) == {len(ps)} > 510')
-                        ps = ps[:510]
-                        
-                    output = KPipeline.infer(model, ps, pack, speed) if model else None
-                    yield self.Result(graphemes=chunk, phonemes=ps, output=output, text_index=graphemes_index)
+            with span('segment', index=graphemes_index):
+                # English processing (unchanged)
+                if self.lang_code in 'ab':
+                    logger.debug("Processing English text: {}{}", graphemes[:50], '...' if len(graphemes) > 50 else '')
+                    start = time.perf_counter() if clock else None
+                    with span('g2p'), self.g2p_lock:
+                        _, tokens = self.g2p(graphemes)
+                    g2p = time.perf_counter() - start if clock else None
+                    if g2p is not None:
+                        metrics.observe('kokoro_g2p_seconds', g2p, lang=self.lang_code)
+                    g2p = g2p if profile else None
+                    for chunking, (gs, ps, tks) in KPipeline.laps(self.en_tokenize(tokens), profile):
+                        if not ps:
+                            continue
+                        elif len(ps) > 510:
+                            logger.warning(f"Unexpected len(ps) == {len(ps)} > 510 and ps == '{ps}'")
+                            metrics.inc('kokoro_truncations_total', lang=self.lang_code)
+                            ps = ps[:510]
+                        with span('chunk', phonemes=len(ps)):
+                            output = KPipeline.infer(model, ps, pack, speed, profile, trace, seed, voice_key) if model else None
+                            if output is not None and output.pred_dur is not None:
+                                KPipeline.join_timestamps(tks, output.pred_dur)
+                        timings = KPipeline.collect_timings(output, g2p=g2p, chunking=chunking) if profile else None
+                        with span('yield'):
+                            yield self.Result(graphemes=gs, phonemes=ps, tokens=tks, output=output, text_index=graphemes_index, timings=timings)
+                        g2p = 0.0 if profile else None
+        
+                # Non-English processing with chunking
+                else:
+                    # Split long text into smaller chunks (roughly 400 characters each)
+                    # Using sentence boundaries when possible
+                    start = time.perf_counter() if profile else None
+                    chunk_size = 400
+                    chunks = []
+            
+                    # Try to split on sentence boundaries first
+                    sentences = re.split(r'([.!?]+)', graphemes)
+                    current_chunk = ""
+            
+                    for i in range(0, len(sentences), 2):
+                        sentence = sentences[i]
+                        # Add the punctuation back if it exists
+                        if i + 1 < len(sentences):
+                            sentence += sentences[i + 1]
+                    
+                        if len(current_chunk) + len(sentence) <= chunk_size:
+                            current_chunk += sentence
+                        else:
+                            if current_chunk:
+                                chunks.append(current_chunk.strip())
+                            current_chunk = sentence
+            
+                    if current_chunk:
+                        chunks.append(current_chunk.strip())
+            
+                    # If no chunks were created (no sentence boundaries), fall back to character-based chunking
+                    if not chunks:
+                        chunks = [graphemes[i:i+chunk_size] for i in range(0, len(graphemes), chunk_size)]
+                    chunking = time.perf_counter() - start if profile else None
+            
+                    # Process each chunk
+                    for chunk in chunks:
+                        if not chunk.strip():
+                            continue
+                    
+                        start = time.perf_counter() if clock else None
+                        with span('g2p'), self.g2p_lock:
+                            ps, _ = self.g2p(chunk)
+                        g2p = time.perf_counter() - start if clock else None
+                        if g2p is not None:
+                            metrics.observe('kokoro_g2p_seconds', g2p, lang=self.lang_code)
+                        g2p = g2p if profile else None
+                        if not ps:
+                            continue
+                        elif len(ps) > 510:
+                            logger.warning(f'Truncating len(ps) == {len(ps)} > 510')
+                            metrics.inc('kokoro_truncations_total', lang=self.lang_code)
+                            ps = ps[:510]
+                    
+                        with span('chunk', phonemes=len(ps)):
+                            output = KPipeline.infer(model, ps, pack, speed, profile, trace, seed, voice_key) if model else None
+                        timings = KPipeline.collect_timings(output, g2p=g2p, chunking=chunking) if profile else None
+                        with span('yield'):
+                            yield self.Result(graphemes=chunk, phonemes=ps, output=output, text_index=graphemes_index, timings=timings)
+                        chunking = 0.0 if profile else None
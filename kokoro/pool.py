@@ -0,0 +1,70 @@
+from .model import KModel
+from .pipeline import KPipeline
+from contextlib import contextmanager
+from typing import Callable, Generator, Iterator, List, Optional, Union
+import threading
+import torch
+
+class KPipelinePool:
+    '''
+    KPipelinePool holds size KPipelines for one language that share one model and
+    one voice cache, so server threads can run G2P in parallel without a whole
+    pipeline, model included, per thread:
+
+        pool = KPipelinePool(lang_code='a', size=4, repo_id='hexgrad/Kokoro-82M')
+        # in any thread
+        for result in pool(text, voice='af_heart'):
+            ...
+
+    A single KPipeline is already safe to share, but runs one G2P call at a time.
+    Each call here goes to the pipeline with the fewest calls in flight, so up to
+    size G2P calls run at once. Model inference is not limited by the pool.
+    '''
+    def __init__(
+        self,
+        lang_code: str,
+        size: int = 2,
+        repo_id: Optional[str] = None,
+        model: Union[KModel, bool] = True,
+        trf: bool = False,
+        en_callable: Optional[Callable[[str], str]] = None,
+        device: Optional[str] = None
+    ):
+        if size < 1:
+            raise ValueError(f'size must be at least 1, got {size}')
+        first = KPipeline(lang_code, repo_id=repo_id, model=model, trf=trf, en_callable=en_callable, device=device)
+        self.pipelines: List[KPipeline] = [first]
+        for _ in range(size - 1):
+            pipeline = KPipeline(lang_code, repo_id=first.repo_id, model=first.model or False, trf=trf, en_callable=en_callable)
+            pipeline.voices, pipeline.lock = first.voices, first.lock
+            self.pipelines.append(pipeline)
+        self.in_flight = [0] * size
+        self.lock = threading.Lock()
+
+    @property
+    def model(self) -> Optional[KModel]:
+        return self.pipelines[0].model
+
+    def load_voice(self, voice: Union[str, torch.FloatTensor], delimiter: str = ',') -> torch.FloatTensor:
+        return self.pipelines[0].load_voice(voice, delimiter)
+
+    @contextmanager
+    def acquire(self) -> Iterator[KPipeline]:
+        '''The least busy pipeline, counted as busy until the block exits.'''
+        with self.lock:
+            i = min(range(len(self.pipelines)), key=self.in_flight.__getitem__)
+            self.in_flight[i] += 1
+        try:
+            yield self.pipelines[i]
+        finally:
+            with self.lock:
+                self.in_flight[i] -= 1
+
+    def __call__(self, *args, **kwargs) -> Generator[KPipeline.Result, None, None]:
+        '''KPipeline.__call__ on the least busy pipeline.'''
+        with self.acquire() as pipeline:
+            yield from pipeline(*args, **kwargs)
+
+    def generate_from_tokens(self, *args, **kwargs) -> Generator[KPipeline.Result, None, None]:
+        with self.acquire() as pipeline:
+            yield from pipeline.generate_from_tokens(*args, **kwargs)
@@ -0,0 +1,69 @@
+from contextlib import contextmanager, nullcontext
+from typing import TYPE_CHECKING, Dict, Optional, Union
+import time
+import torch
+
+if TYPE_CHECKING:
+    from .tracing import Trace
+
+_UNTIMED = nullcontext()
+
+def untimed(name: str, **args) -> nullcontext:
+    '''Stand-in for StageTimer/Trace.span when instrumentation is off: a shared no-op context.'''
+    return _UNTIMED
+
+class StageTimer:
+    '''
+    StageTimer records wall time, and optionally allocated bytes, per named stage.
+
+    Pass one to KModel.forward_with_tokens(..., timer=timer) to instrument a call,
+    then read timer.timings (seconds) and timer.allocated (bytes). When no timer
+    is passed, every stage runs under a shared no-op context instead.
+
+    Stages may nest (decoder > generator > stft), in which case the outer stage
+    includes the inner ones. Repeated stages accumulate.
+
+    On CUDA/MPS the device is synchronized at stage boundaries so that times are
+    attributed to the stage that launched the work. Allocated bytes are the change
+    in allocator usage across a stage, and are only tracked on CUDA/MPS.
+
+    If a tracing.Trace is given, every stage is also recorded as a span on it.
+    '''
+    def __init__(
+        self,
+        device: Union[torch.device, str, None] = None,
+        memory: bool = False,
+        trace: Optional['Trace'] = None
+    ):
+        self.device = torch.device('cpu' if device is None else device)
+        self.memory = memory and self.device.type in ('cuda', 'mps')
+        self.trace = trace
+        self.timings: Dict[str, float] = {}
+        self.allocated: Dict[str, int] = {}
+
+    def synchronize(self):
+        if self.device.type == 'cuda':
+            torch.cuda.synchronize(self.device)
+        elif self.device.type == 'mps':
+            torch.mps.synchronize()
+
+    def allocated_bytes(self) -> Optional[int]:
+        if self.device.type == 'cuda':
+            return torch.cuda.memory_allocated(self.device)
+        elif self.device.type == 'mps':
+            return torch.mps.current_allocated_memory()
+        return None
+
+    @contextmanager
+    def __call__(self, name: str):
+        self.synchronize()
+        before = self.allocated_bytes() if self.memory else None
+        start = time.perf_counter()
+        try:
+            with self.trace.span(name) if self.trace is not None else _UNTIMED:
+                yield
+                self.synchronize()
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+            if before is not None:
+                self.allocated[name] = self.allocated.get(name, 0) + self.allocated_bytes() - before
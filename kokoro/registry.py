@@ -0,0 +1,167 @@
+'''
+Local model and voice registry, so that deployments never talk to the Hub.
+
+Populate it ahead of time with `kokoro fetch`, which writes this layout:
+
+    <root>/manifest.json
+    <root>/hexgrad/Kokoro-82M/config.json
+    <root>/hexgrad/Kokoro-82M/kokoro-v1_0.pth
+    <root>/hexgrad/Kokoro-82M/voices/af_heart.pt
+
+manifest.json maps each repo_id to its files (paths relative to root) and checksums:
+
+    {"version": 1, "models": {"hexgrad/Kokoro-82M": {
+        "config": "hexgrad/Kokoro-82M/config.json",
+        "weights": "hexgrad/Kokoro-82M/kokoro-v1_0.pth",
+        "voices": {"af_heart": "hexgrad/Kokoro-82M/voices/af_heart.pt"},
+        "sha256": {"hexgrad/Kokoro-82M/config.json": "..."}
+    }}}
+
+The root is $KOKORO_HOME, defaulting to ~/.cache/kokoro. KModel and KPipeline
+look there first and only fall back to huggingface_hub for files the manifest
+does not list. With KOKORO_OFFLINE=1 (or set_registry(..., offline=True)) that
+fallback raises instead, and huggingface_hub is never imported.
+'''
+from loguru import logger
+from typing import Dict, Iterable, Optional
+import hashlib
+import json
+import os
+
+MODEL_NAMES = {
+    'hexgrad/Kokoro-82M': 'kokoro-v1_0.pth',
+    'hexgrad/Kokoro-82M-v1.1-zh': 'kokoro-v1_1-zh.pth',
+}
+
+DEFAULT_ROOT = os.path.join('~', '.cache', 'kokoro')
+
+def home() -> str:
+    return os.path.expanduser(os.environ.get('KOKORO_HOME') or DEFAULT_ROOT)
+
+def sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as r:
+        for block in iter(lambda: r.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+class LocalRegistry:
+    def __init__(self, root: Optional[str] = None, verify: bool = False):
+        '''
+        Args:
+            root: Registry directory (default: $KOKORO_HOME or ~/.cache/kokoro)
+            verify: Check sha256 of every file on resolution (costly for weights)
+        '''
+        self.root = os.path.expanduser(root) if root else home()
+        self.verify = verify
+        self.manifest_path = os.path.join(self.root, 'manifest.json')
+        self.manifest = {'version': 1, 'models': {}}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as r:
+                self.manifest = json.load(r)
+
+    def entry(self, repo_id: str) -> Optional[Dict]:
+        return self.manifest['models'].get(repo_id)
+
+    def path(self, relpath: Optional[str]) -> Optional[str]:
+        if relpath is None:
+            return None
+        path = os.path.join(self.root, relpath)
+        if not os.path.exists(path):
+            logger.warning("Registry lists missing file {}", path)
+            return None
+        if self.verify:
+            expected = next((
+                entry['sha256'][relpath] for entry in self.manifest['models'].values()
+                if relpath in entry.get('sha256', {})
+            ), None)
+            if expected is not None and sha256(path) != expected:
+                raise ValueError(f'Checksum mismatch for {path}')
+        return path
+
+    def config(self, repo_id: str) -> Optional[str]:
+        entry = self.entry(repo_id) or {}
+        return self.path(entry.get('config'))
+
+    def weights(self, repo_id: str) -> Optional[str]:
+        entry = self.entry(repo_id) or {}
+        return self.path(entry.get('weights'))
+
+    def voice(self, repo_id: str, voice: str) -> Optional[str]:
+        entry = self.entry(repo_id) or {}
+        return self.path(entry.get('voices', {}).get(voice))
+
+    def voices(self, repo_id: str) -> Iterable[str]:
+        entry = self.entry(repo_id) or {}
+        return sorted(entry.get('voices', {}))
+
+    def save(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = f'{self.manifest_path}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as w:
+            json.dump(self.manifest, w, indent=2, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    def fetch(self, repo_id: str, voices: Optional[Iterable[str]] = None):
+        '''Download config, weights and voices (default: all) of repo_id into the registry.'''
+        from huggingface_hub import hf_hub_download, list_repo_files
+        if voices is None:
+            voices = sorted(
+                f[len('voices/'):-len('.pt')] for f in list_repo_files(repo_id)
+                if f.startswith('voices/') and f.endswith('.pt')
+            )
+        local_dir = os.path.join(self.root, *repo_id.split('/'))
+        entry = self.manifest['models'].setdefault(repo_id, {})
+        checksums = entry.setdefault('sha256', {})
+        def download(filename: str) -> str:
+            logger.info("Fetching {}/{}", repo_id, filename)
+            path = hf_hub_download(repo_id=repo_id, filename=filename, local_dir=local_dir)
+            relpath = os.path.relpath(path, self.root).replace(os.sep, '/')
+            checksums[relpath] = sha256(path)
+            return relpath
+        entry['config'] = download('config.json')
+        entry['weights'] = download(MODEL_NAMES[repo_id])
+        entry.setdefault('voices', {}).update({v: download(f'voices/{v}.pt') for v in voices})
+        self.save()
+
+_registry: Optional[LocalRegistry] = None
+_offline: Optional[bool] = None
+
+def set_registry(registry: Optional[LocalRegistry], offline: Optional[bool] = None):
+    '''Use registry for lookups. offline=None leaves offline mode to KOKORO_OFFLINE.'''
+    global _registry, _offline
+    _registry, _offline = registry, offline
+
+def get_registry() -> Optional[LocalRegistry]:
+    global _registry
+    if _registry is None:
+        registry = LocalRegistry()
+        if os.path.exists(registry.manifest_path) or offline():
+            _registry = registry
+    return _registry
+
+def offline() -> bool:
+    return os.environ.get('KOKORO_OFFLINE') == '1' if _offline is None else _offline
+
+def resolve(repo_id: str, filename: str, local: Optional[str]) -> str:
+    if local is not None:
+        return local
+    if offline():
+        raise FileNotFoundError(
+            f'{repo_id}/{filename} is not in the local registry and offline mode is on. '
+            f'Run `kokoro fetch --repo-id {repo_id}` first.'
+        )
+    from huggingface_hub import hf_hub_download
+    return hf_hub_download(repo_id=repo_id, filename=filename)
+
+def config_path(repo_id: str) -> str:
+    registry = get_registry()
+    return resolve(repo_id, 'config.json', registry and registry.config(repo_id))
+
+def weights_path(repo_id: str) -> str:
+    registry = get_registry()
+    return resolve(repo_id, MODEL_NAMES[repo_id], registry and registry.weights(repo_id))
+
+def voice_path(repo_id: str, voice: str) -> str:
+    registry = get_registry()
+    return resolve(repo_id, f'voices/{voice}.pt', registry and registry.voice(repo_id, voice))
@@ -0,0 +1,161 @@
+'''
+Streaming output stage for telephony: polyphase resampling of 24 kHz audio to
+16 or 8 kHz, then 16-bit PCM, μ-law or A-law (G.711) bytes, chunk by chunk.
+
+    from kokoro.resample import transcode
+
+    for payload in transcode(pipeline(text, voice='af_heart'), sample_rate=8000, encoding='ulaw'):
+        rtp.send(payload)
+
+StreamingResampler keeps the last few input samples as filter history, so any
+split of the input gives the same output as resampling it in one go: there are
+no clicks at chunk boundaries. Output lags the input by half the filter length,
+about 1 ms, and flush() emits that tail at the end of a stream.
+
+The filter is a Kaiser-windowed sinc, as in scipy.signal.resample_poly, with
+unity gain and its cutoff at the lower Nyquist frequency.
+'''
+from math import gcd
+from typing import Generator, Iterable, Optional, Union
+import numpy as np
+import torch
+
+ENCODINGS = ('pcm', 'ulaw', 'alaw')
+
+def design_filter(up: int, down: int, half_width: int = 10, beta: float = 5.0) -> np.ndarray:
+    '''Lowpass for resampling by up/down, at the upsampled rate, with gain up.'''
+    fc = 1 / max(up, down)
+    half = half_width * max(up, down)
+    n = np.arange(-half, half + 1)
+    h = np.sinc(fc * n) * np.kaiser(2 * half + 1, beta)
+    return h / h.sum() * up
+
+class StreamingResampler:
+    '''
+    Stateful polyphase resampler from orig_sr to target_sr. push() takes float
+    audio chunks and returns as many output samples as the input so far allows.
+    flush() returns the rest and resets, so the resampler can be reused.
+    '''
+    def __init__(self, orig_sr: int = 24000, target_sr: int = 8000, half_width: int = 10, beta: float = 5.0):
+        g = gcd(orig_sr, target_sr)
+        self.up, self.down = target_sr // g, orig_sr // g
+        h = design_filter(self.up, self.down, half_width, beta)
+        self.delay = len(h) // 2  # in upsampled samples, so output n is centred on input n * down / up
+        self.taps = -(-len(h) // self.up)
+        h = np.pad(h, (0, self.taps * self.up - len(h)))
+        # phases[p, k] = h[p + k * up]: output samples with (n * down + delay) % up == p use row p
+        self.phases = h.reshape(self.taps, self.up).T.astype(np.float32)
+        self.reset()
+
+    def reset(self):
+        self.buffer = np.zeros(self.taps - 1, dtype=np.float32)  # input from index self.start on; zeros before 0
+        self.start = -(self.taps - 1)
+        self.received = 0  # input samples
+        self.emitted = 0  # output samples
+
+    def _emit(self, end: int) -> np.ndarray:
+        '''Output samples [self.emitted, end), which must only need buffered input.'''
+        n = np.arange(self.emitted, end)
+        t = n * self.down + self.delay
+        last = t // self.up  # newest input sample each output needs
+        windows = (last - self.start)[:, None] - np.arange(self.taps)[None, :]
+        y = np.einsum('nk,nk->n', self.buffer[windows], self.phases[t % self.up])
+        self.emitted = end
+        keep = (end * self.down + self.delay) // self.up - (self.taps - 1)  # oldest input the next output needs
+        if keep > self.start:
+            self.buffer = self.buffer[keep - self.start:]
+            self.start = keep
+        return y
+
+    def push(self, audio: Union[np.ndarray, torch.Tensor]) -> np.ndarray:
+        if isinstance(audio, torch.Tensor):
+            audio = audio.detach().cpu().numpy()
+        audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+        self.buffer = np.concatenate([self.buffer, audio])
+        self.received += len(audio)
+        # Output n needs input up to (n * down + delay) // up
+        end = (self.received * self.up - 1 - self.delay) // self.down + 1
+        return self._emit(max(end, self.emitted))
+
+    def flush(self) -> np.ndarray:
+        '''The remaining output, as if the input were followed by silence; then reset().'''
+        total = -(-self.received * self.up // self.down)
+        pad = max(0, (total * self.down + self.delay) // self.up + 1 - (self.start + len(self.buffer)))
+        self.buffer = np.concatenate([self.buffer, np.zeros(pad, dtype=np.float32)])
+        y = self._emit(max(total, self.emitted))
+        self.reset()
+        return y
+
+def resample(audio: Union[np.ndarray, torch.Tensor], orig_sr: int = 24000, target_sr: int = 8000) -> np.ndarray:
+    '''One-shot resampling, len(audio) * target_sr / orig_sr samples rounded up.'''
+    resampler = StreamingResampler(orig_sr, target_sr)
+    return np.concatenate([resampler.push(audio), resampler.flush()])
+
+def to_int16(audio: np.ndarray) -> np.ndarray:
+    return np.clip(np.asarray(audio) * 32767, -32768, 32767).astype(np.int16)
+
+# G.711 segment end points, as in the reference implementation (Sun Microsystems g711.c)
+ULAW_SEG_END = np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF])
+ALAW_SEG_END = np.array([0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF])
+
+def ulaw_encode(pcm: np.ndarray) -> np.ndarray:
+    '''int16 samples to G.711 μ-law bytes.'''
+    pcm = np.asarray(pcm, dtype=np.int32) >> 2
+    mask = np.where(pcm < 0, 0x7F, 0xFF)
+    pcm = np.minimum(np.abs(pcm), 8159) + (0x84 >> 2)
+    seg = np.searchsorted(ULAW_SEG_END, pcm)
+    uval = (seg << 4) | ((pcm >> (seg + 1)) & 0xF)
+    return (np.where(seg >= 8, 0x7F, uval) ^ mask).astype(np.uint8)
+
+def ulaw_decode(data: np.ndarray) -> np.ndarray:
+    u = ~np.asarray(data, dtype=np.int32) & 0xFF
+    t = (((u & 0x0F) << 3) + 0x84) << ((u & 0x70) >> 4)
+    return np.where(u & 0x80, 0x84 - t, t - 0x84).astype(np.int16)
+
+def alaw_encode(pcm: np.ndarray) -> np.ndarray:
+    '''int16 samples to G.711 A-law bytes.'''
+    pcm = np.asarray(pcm, dtype=np.int32) >> 3
+    mask = np.where(pcm >= 0, 0xD5, 0x55)
+    pcm = np.where(pcm >= 0, pcm, -pcm - 1)
+    seg = np.searchsorted(ALAW_SEG_END, pcm)
+    aval = (seg << 4) | (np.where(seg < 2, pcm >> 1, pcm >> np.maximum(seg, 1)) & 0xF)
+    return (np.where(seg >= 8, 0x7F, aval) ^ mask).astype(np.uint8)
+
+def alaw_decode(data: np.ndarray) -> np.ndarray:
+    a = np.asarray(data, dtype=np.int32) ^ 0x55
+    seg = (a & 0x70) >> 4
+    t = (a & 0x0F) << 4
+    t = np.where(seg == 0, t + 8, (t + 0x108) << np.maximum(seg - 1, 0))
+    return np.where(a & 0x80, t, -t).astype(np.int16)
+
+def encode(audio: np.ndarray, encoding: str = 'pcm') -> bytes:
+    '''Float audio to little-endian 16-bit PCM, μ-law or A-law bytes.'''
+    pcm = to_int16(audio)
+    if encoding == 'pcm':
+        return pcm.astype('<i2').tobytes()
+    if encoding == 'ulaw':
+        return ulaw_encode(pcm).tobytes()
+    if encoding == 'alaw':
+        return alaw_encode(pcm).tobytes()
+    raise ValueError(f'Unknown encoding {encoding!r}, expected one of {ENCODINGS}')
+
+def transcode(
+    results: Iterable,
+    sample_rate: int = 8000,
+    encoding: str = 'ulaw',
+    orig_sr: int = 24000
+) -> Generator[bytes, None, None]:
+    '''
+    Resample and encode the audio of each KPipeline.Result (or audio tensor) as it arrives.
+    Yields one payload per input with audio, then the resampler's tail.
+    '''
+    if encoding not in ENCODINGS:
+        raise ValueError(f'Unknown encoding {encoding!r}, expected one of {ENCODINGS}')
+    resampler: Optional[StreamingResampler] = None if sample_rate == orig_sr else StreamingResampler(orig_sr, sample_rate)
+    for result in results:
+        audio = getattr(result, 'audio', result)
+        if audio is None:
+            continue
+        yield encode(np.asarray(audio) if resampler is None else resampler.push(audio), encoding)
+    if resampler is not None:
+        yield encode(resampler.flush(), encoding)
@@ -0,0 +1,134 @@
+from . import metrics
+from .model import KModel
+from .pipeline import ALIASES, LANG_CODES, KPipeline
+from loguru import logger
+from typing import Callable, Dict, Generator, List, Optional, Union
+import gc
+import os
+import threading
+import time
+
+def rss() -> int:
+    '''Resident set size of this process in bytes, or 0 where /proc is unavailable.'''
+    try:
+        with open('/proc/self/statm', 'r') as r:
+            return int(r.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+class KokoroRuntime:
+    '''
+    KokoroRuntime owns one KModel and builds one KPipeline per language on first use.
+
+    Requests are routed by lang_code, or else by the voice prefix (af_heart => 'a'),
+    so nothing has to keep a dict of pipelines by hand:
+
+        runtime = KokoroRuntime(memory_budget=512 << 20, idle_timeout=600)
+        for result in runtime("Hello!", voice='af_heart'):
+            ...
+        for result in runtime("こんにちは", voice='jf_alpha'):
+            ...
+
+    Startup only pays for the model. Each language's G2P (spaCy, pyopenjtalk,
+    jieba, espeak) is imported and built the first time that language is used.
+
+    A pipeline (its G2P and voice cache) is evicted, least recently used first, when:
+    1. the G2P memory of all loaded languages exceeds memory_budget bytes. Each
+       language is charged the RSS growth measured while building it, which
+       needs /proc; elsewhere it counts as 0.
+    2. it has not been used for idle_timeout seconds.
+    The pipeline serving the current request is never evicted. Use on_load to
+    customize each new pipeline (e.g. lexicon entries) so it survives eviction.
+    '''
+    def __init__(
+        self,
+        repo_id: str = 'hexgrad/Kokoro-82M',
+        model: Union[KModel, bool] = True,
+        device: Optional[str] = None,
+        trf: bool = False,
+        en_callable: Optional[Callable[[str], str]] = None,
+        memory_budget: Optional[int] = None,
+        idle_timeout: Optional[float] = None,
+        on_load: Optional[Callable[[KPipeline], None]] = None
+    ):
+        self.repo_id = repo_id
+        self.model = KPipeline.load_model(repo_id, device) if model is True else model
+        self.trf = trf
+        self.en_callable = en_callable
+        self.memory_budget = memory_budget
+        self.idle_timeout = idle_timeout
+        self.on_load = on_load
+        self.pipelines: Dict[str, KPipeline] = {}
+        self.costs: Dict[str, int] = {}
+        self.last_used: Dict[str, float] = {}
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def route(voice: Optional[str] = None, lang_code: Optional[str] = None) -> str:
+        '''lang_code if given (aliases like 'en-us' allowed), else the first letter of the voice name.'''
+        if lang_code:
+            code = ALIASES.get(lang_code.lower(), lang_code.lower())
+        elif voice:
+            code = os.path.basename(voice)[:1].lower()
+        else:
+            raise ValueError('Pass a voice or lang_code to route the request')
+        if code not in LANG_CODES:
+            raise ValueError(f'Cannot route voice={voice!r} lang_code={lang_code!r}: {code!r} is not in {list(LANG_CODES)}')
+        return code
+
+    @property
+    def languages(self) -> List[str]:
+        return list(self.pipelines)
+
+    def pipeline(self, voice: Optional[str] = None, lang_code: Optional[str] = None) -> KPipeline:
+        code = KokoroRuntime.route(voice, lang_code)
+        with self.lock:
+            pipeline = self.pipelines.get(code)
+            if pipeline is None:
+                before, start = rss(), time.perf_counter()
+                pipeline = KPipeline(
+                    lang_code=code, repo_id=self.repo_id, model=self.model or False,
+                    trf=self.trf, en_callable=self.en_callable
+                )
+                if self.on_load is not None:
+                    self.on_load(pipeline)
+                self.pipelines[code] = pipeline
+                self.costs[code] = max(0, rss() - before)
+                metrics.inc('kokoro_g2p_loads_total', lang=code)
+                logger.debug("Built {} pipeline in {:.2f}s (+{:.0f} MiB)", code, time.perf_counter() - start, self.costs[code] / 2**20)
+            self.last_used[code] = time.monotonic()
+            self.evict(keep=code)
+        return pipeline
+
+    def evict(self, keep: Optional[str] = None) -> List[str]:
+        '''Drop idle and over-budget pipelines, least recently used first. Returns their lang_codes.'''
+        evicted = []
+        with self.lock:
+            now = time.monotonic()
+            for code in sorted(self.pipelines, key=self.last_used.__getitem__):
+                if code == keep:
+                    continue
+                idle = self.idle_timeout is not None and now - self.last_used[code] > self.idle_timeout
+                over = self.memory_budget is not None and sum(self.costs.values()) > self.memory_budget
+                if idle or over:
+                    self.unload(code)
+                    evicted.append(code)
+        if evicted:
+            gc.collect()
+        return evicted
+
+    def unload(self, lang_code: str):
+        with self.lock:
+            del self.pipelines[lang_code], self.costs[lang_code], self.last_used[lang_code]
+        metrics.inc('kokoro_g2p_evictions_total', lang=lang_code)
+        logger.debug("Evicted {} pipeline", lang_code)
+
+    def __call__(
+        self,
+        text: Union[str, List[str]],
+        voice: str,
+        lang_code: Optional[str] = None,
+        **kwargs
+    ) -> Generator[KPipeline.Result, None, None]:
+        '''Route to the pipeline for lang_code (default: the voice's) and run it. kwargs go to KPipeline.__call__.'''
+        yield from self.pipeline(voice, lang_code)(text, voice, **kwargs)
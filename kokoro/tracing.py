@@ -0,0 +1,80 @@
+'''
+Request timelines in Chrome trace / Perfetto JSON.
+
+Install a Tracer to record spans for a sampled fraction of KPipeline calls:
+
+    from kokoro import tracing
+    tracer = tracing.Tracer(sample_rate=0.01)
+    tracing.set_tracer(tracer)
+    ...
+    tracer.dump('kokoro.trace.json')  # open in ui.perfetto.dev or chrome://tracing
+
+Each sampled request gets its own track, with nested spans for
+request > segment > g2p / chunk > KModel stages (with batch_chunks, the KModel
+stages go in request > batch spans instead), and yield spans covering the time
+the caller holds each Result. Unsampled requests record nothing.
+'''
+from collections import deque
+from contextlib import contextmanager
+from itertools import count
+from threading import Lock
+from typing import Optional
+import json
+import os
+import random
+import time
+
+class Tracer:
+    def __init__(self, sample_rate: float = 1.0, max_events: int = 1_000_000):
+        assert 0 <= sample_rate <= 1, sample_rate
+        self.sample_rate = sample_rate
+        self.events = deque(maxlen=max_events)
+        self.lock = Lock()
+        self.ids = count(1)
+
+    def sample(self, name: str) -> Optional['Trace']:
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return None
+        return Trace(self, name, next(self.ids))
+
+    def record(self, event: dict):
+        with self.lock:
+            self.events.append(event)
+
+    def dump(self, path: str):
+        with self.lock:
+            events = list(self.events)
+        with open(path, 'w', encoding='utf-8') as w:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, w)
+
+class Trace:
+    '''One sampled request. Spans are complete ('X') events on the request's own track.'''
+    def __init__(self, tracer: Tracer, name: str, tid: int):
+        self.tracer = tracer
+        self.pid = os.getpid()
+        self.tid = tid
+        tracer.record(dict(name='thread_name', ph='M', pid=self.pid, tid=tid, args=dict(name=f'{name} #{tid}')))
+
+    @contextmanager
+    def span(self, name: str, **args):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            self.tracer.record(dict(
+                name=name, ph='X', pid=self.pid, tid=self.tid,
+                ts=start / 1e3, dur=(end - start) / 1e3, args=args
+            ))
+
+_tracer: Optional[Tracer] = None
+
+def set_tracer(tracer: Optional[Tracer]):
+    global _tracer
+    _tracer = tracer
+
+def get_tracer() -> Optional[Tracer]:
+    return _tracer
+
+def sample(name: str) -> Optional[Trace]:
+    return None if _tracer is None else _tracer.sample(name)
@@ -0,0 +1,263 @@
+'''
+CPU tuning: sweep worker layouts and persist the fastest as a profile.
+
+`kokoro tune` runs `workers` processes at once, each pinned to its own block of
+`threads` CPUs, on a fixed mix of phoneme lengths. It does this for every
+worker count × intra-op thread count × STFT backend, and keeps the
+configuration with the best throughput whose p95 latency meets the target.
+It then times that layout synthesizing 2, 4, ... chunks per model pass
+(KModel.forward_batch) and records the fastest as batch_chunks, for callers
+that want a whole text rather than a stream (KPipeline batch_chunks).
+The profile is written to $KOKORO_TUNING, defaulting to <KOKORO_HOME>/tuning.json:
+
+    {"workers": 2, "threads": 4, "interop_threads": 1, "stft": "fft",
+     "affinity": [[0, 1, 2, 3], [4, 5, 6, 7]], "batch_chunks": 4, "throughput": 5.1, "p95": 0.82, ...}
+
+The CLI and demo server call apply() on startup. A server running several
+workers calls apply(model, worker=i) in worker i so it gets its own CPUs.
+'''
+from . import registry
+from dataclasses import asdict, dataclass, field
+from loguru import logger
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import time
+
+if TYPE_CHECKING:
+    from .model import KModel
+
+# Phoneme lengths per request: short replies through to full 510-phoneme chunks
+LENGTHS = (24, 64, 128, 256, 500)
+BATCH_CHUNKS = (1, 2, 4, 8)
+
+@dataclass
+class TuningProfile:
+    workers: int
+    threads: int
+    stft: str
+    interop_threads: int = 1
+    affinity: List[List[int]] = field(default_factory=list)
+    batch_chunks: int = 1
+    throughput: Optional[float] = None  # requests per second, all workers together
+    p95: Optional[float] = None  # seconds per request
+    target_p95: Optional[float] = None
+    cpus: int = 0
+    machine: str = ''
+
+def profile_path() -> str:
+    return os.path.expanduser(os.environ.get('KOKORO_TUNING') or os.path.join(registry.home(), 'tuning.json'))
+
+def save(profile: TuningProfile, path: Optional[str] = None) -> str:
+    path = path or profile_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as w:
+        json.dump(asdict(profile), w, indent=2)
+    return path
+
+def load(path: Optional[str] = None) -> Optional[TuningProfile]:
+    path = path or profile_path()
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as r:
+        return TuningProfile(**json.load(r))
+
+def available_cpus() -> List[int]:
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def cpu_order() -> List[int]:
+    '''Usable CPUs, one per physical core first (grouped by socket), then SMT siblings.'''
+    def key(cpu: int) -> Tuple[int, int, int, int]:
+        topology = f'/sys/devices/system/cpu/cpu{cpu}/topology'
+        try:
+            with open(f'{topology}/physical_package_id') as r:
+                package = int(r.read())
+            with open(f'{topology}/core_id') as r:
+                core = int(r.read())
+            with open(f'{topology}/thread_siblings_list') as r:
+                first = int(r.read().replace('-', ',').split(',')[0])
+        except (OSError, ValueError):
+            return (0, 0, cpu, cpu)
+        return (int(cpu != first), package, core, cpu)
+    return sorted(available_cpus(), key=key)
+
+def layout(workers: int, threads: int) -> List[List[int]]:
+    '''Disjoint blocks of `threads` CPUs per worker, wrapping around if oversubscribed.'''
+    order = cpu_order()
+    return [[order[(w * threads + t) % len(order)] for t in range(threads)] for w in range(workers)]
+
+def apply(
+    model: Optional['KModel'] = None,
+    worker: int = 0,
+    profile: Optional[TuningProfile] = None
+) -> Optional[TuningProfile]:
+    '''
+    Apply a tuning profile (default: load()) to this process: threads, CPU affinity
+    for `worker`, and the STFT backend of model. A no-op when there is no profile.
+    '''
+    import torch
+    profile = profile or load()
+    if profile is None:
+        return None
+    if profile.cpus and profile.cpus != len(available_cpus()):
+        logger.warning("Tuning profile was made for {} CPUs, this process has {}", profile.cpus, len(available_cpus()))
+    torch.set_num_threads(profile.threads)
+    try:
+        torch.set_num_interop_threads(profile.interop_threads)
+    except RuntimeError:
+        logger.debug("Inter-op threads already started, keeping {}", torch.get_num_interop_threads())
+    if profile.affinity and hasattr(os, 'sched_setaffinity'):
+        cpus = set(profile.affinity[worker % len(profile.affinity)]) & set(available_cpus())
+        if cpus:
+            os.sched_setaffinity(0, cpus)
+    if model is not None:
+        model.set_stft(profile.stft)
+    logger.debug("Applied tuning profile: {}", profile)
+    return profile
+
+def percentile(values: Sequence[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def _worker(rank, spec, barrier, results):
+    import torch
+    from .model import KModel
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, spec['affinity'][rank])
+    torch.set_num_threads(spec['threads'])
+    torch.set_num_interop_threads(1)
+    model = KModel(repo_id=spec['repo_id'], config=spec['config'], model=spec['model']).eval()
+    pack = torch.load(spec['voice'], weights_only=True)
+    generator = torch.Generator().manual_seed(rank)
+    vocab = sorted(set(model.vocab.values()))
+    requests = [
+        torch.LongTensor([[0, *(vocab[i] for i in torch.randint(len(vocab), (n,), generator=generator)), 0]])
+        for n in spec['lengths']
+    ]
+    for stft in spec['stfts']:
+        model.set_stft(stft)
+        for input_ids in requests:  # warmup
+            model.forward_with_tokens(input_ids, pack[input_ids.shape[-1] - 3])
+        barrier.wait()
+        latencies, start, batch = [], time.monotonic(), spec['batch']
+        for i in range(0, spec['requests'], batch):
+            chunks = [requests[(j + rank) % len(requests)] for j in range(i, i + batch)]
+            t = time.monotonic()
+            if batch == 1:
+                model.forward_with_tokens(chunks[0], pack[chunks[0].shape[-1] - 3])
+            else:
+                model.forward_batch([ids[0, 1:-1] for ids in chunks], [pack[ids.shape[-1] - 3] for ids in chunks])
+            latencies.extend([time.monotonic() - t] * batch)  # each chunk waits for its whole batch
+        results.put((rank, stft, start, time.monotonic(), latencies))
+        barrier.wait()
+
+def measure(
+    workers: int,
+    threads: int,
+    stfts: Sequence[str],
+    voice: str,
+    repo_id: str = 'hexgrad/Kokoro-82M',
+    config: Optional[str] = None,
+    model: Optional[str] = None,
+    lengths: Sequence[int] = LENGTHS,
+    requests: Optional[int] = None,
+    batch: int = 1
+) -> Dict[str, Dict[str, float]]:
+    '''
+    Run `workers` pinned processes concurrently: returns {stft: {throughput, p50, p95}}.
+    With batch > 1, each model pass synthesizes batch chunks and throughput counts chunks.
+    '''
+    spec = dict(
+        repo_id=repo_id, config=config or registry.config_path(repo_id), model=model or registry.weights_path(repo_id),
+        voice=voice if voice.endswith('.pt') else registry.voice_path(repo_id, voice),
+        affinity=layout(workers, threads), threads=threads, stfts=list(stfts),
+        lengths=list(lengths), requests=requests or 2 * len(lengths), batch=batch
+    )
+    ctx = multiprocessing.get_context('spawn')
+    barrier, results = ctx.Barrier(workers), ctx.Queue()
+    processes = [ctx.Process(target=_worker, args=(rank, spec, barrier, results), daemon=True) for rank in range(workers)]
+    for p in processes:
+        p.start()
+    runs = []
+    while len(runs) < workers * len(stfts):
+        try:
+            runs.append(results.get(timeout=1))
+        except queue.Empty:
+            failed = [p.exitcode for p in processes if p.exitcode not in (None, 0)]
+            if failed:
+                raise RuntimeError(f'Tuning worker exited with code {failed[0]}')
+    for p in processes:
+        p.join()
+    report = {}
+    for stft in stfts:
+        done = [r for r in runs if r[1] == stft]
+        latencies = [t for r in done for t in r[4]]
+        elapsed = max(r[3] for r in done) - min(r[2] for r in done)
+        report[stft] = dict(throughput=len(latencies) / elapsed, p50=percentile(latencies, 0.5), p95=percentile(latencies, 0.95))
+    return report
+
+def candidates(cpus: int) -> List[int]:
+    '''1, 2, 4, ... up to cpus, plus cpus itself.'''
+    counts = [1 << i for i in range(cpus.bit_length()) if 1 << i <= cpus]
+    return sorted({*counts, cpus})
+
+def tune(
+    voice: str = 'af_heart',
+    target_p95: float = 2.0,
+    workers: Optional[Sequence[int]] = None,
+    threads: Optional[Sequence[int]] = None,
+    stfts: Optional[Sequence[str]] = None,
+    repo_id: str = 'hexgrad/Kokoro-82M',
+    config: Optional[str] = None,
+    model: Optional[str] = None,
+    lengths: Sequence[int] = LENGTHS,
+    requests: Optional[int] = None,
+    batch_chunks: Sequence[int] = BATCH_CHUNKS
+) -> Tuple[TuningProfile, List[Dict]]:
+    '''
+    Sweep workers × threads × stfts and return the best profile plus every result.
+    Layouts using more CPUs than available are skipped unless workers and threads are given.
+    The best profile has the highest throughput with p95 <= target_p95, else the lowest p95.
+    Its batch_chunks is the entry of batch_chunks with the highest throughput on that layout;
+    p95 does not apply, since batching is for whole texts rather than streams.
+    '''
+    from .istftnet import STFT_BACKENDS
+    cpus = len(available_cpus())
+    explicit = workers is not None and threads is not None
+    workers = workers or candidates(cpus)
+    threads = threads or candidates(cpus)
+    stfts = stfts or list(STFT_BACKENDS)
+    results = []
+    for w in workers:
+        for t in threads:
+            if w * t > cpus and not explicit:
+                continue
+            report = measure(w, t, stfts, voice, repo_id, config, model, lengths, requests)
+            for stft, r in report.items():
+                logger.info("workers {} threads {} stft {}: {:.2f} req/s, p95 {:.3f}s", w, t, stft, r['throughput'], r['p95'])
+                results.append(dict(workers=w, threads=t, stft=stft, batch_chunks=1, **r))
+    if not results:
+        raise ValueError(f'No layout fits in {cpus} CPUs')
+    ok = [r for r in results if r['p95'] <= target_p95]
+    best = max(ok, key=lambda r: r['throughput']) if ok else min(results, key=lambda r: r['p95'])
+    if not ok:
+        logger.warning("No configuration meets p95 <= {}s, picking the lowest p95", target_p95)
+    batched = [best]
+    for b in batch_chunks:
+        if b > 1:
+            r = measure(best['workers'], best['threads'], [best['stft']], voice, repo_id, config, model, lengths, requests, b)[best['stft']]
+            logger.info("workers {} threads {} stft {} batch {}: {:.2f} chunks/s", best['workers'], best['threads'], best['stft'], b, r['throughput'])
+            batched.append(dict(workers=best['workers'], threads=best['threads'], stft=best['stft'], batch_chunks=b, **r))
+    results.extend(batched[1:])
+    profile = TuningProfile(
+        workers=best['workers'], threads=best['threads'], stft=best['stft'],
+        batch_chunks=max(batched, key=lambda r: r['throughput'])['batch_chunks'],
+        affinity=layout(best['workers'], best['threads']), throughput=best['throughput'], p95=best['p95'],
+        target_p95=target_p95, cpus=cpus, machine=platform.processor() or platform.machine()
+    )
+    return profile, results
@@ -0,0 +1,29 @@
+import pytest
+import torch
+
+from kokoro import KModel
+
+# Lowercase letters, punctuation and the IPA that espeak uses for Spanish
+PHONEMES = 'abcdefghijklmnopqrstuvwxyz .,;:!?¡¿ˈˌβðɣɲʎʝɾθŋʃʒɛɔəʧ'
+
+
+@pytest.fixture
+def tiny_config():
+    return {
+        'istftnet': {
+            'upsample_kernel_sizes': [20, 12], 'upsample_rates': [10, 6], 'gen_istft_hop_size': 5, 'gen_istft_n_fft': 20,
+            'resblock_dilation_sizes': [[1, 3, 5]], 'resblock_kernel_sizes': [3], 'upsample_initial_channel': 512
+        },
+        'dim_in': 64, 'dropout': 0.2, 'hidden_dim': 512, 'max_conv_dim': 64, 'max_dur': 4, 'multispeaker': True,
+        'n_layer': 1, 'n_mels': 80, 'n_token': len(PHONEMES) + 1, 'style_dim': 128, 'text_encoder_kernel_size': 5,
+        'plbert': {'hidden_size': 32, 'num_attention_heads': 2, 'intermediate_size': 64, 'max_position_embeddings': 64, 'num_hidden_layers': 1},
+        'vocab': {p: i + 1 for i, p in enumerate(PHONEMES)}
+    }
+
+
+@pytest.fixture
+def tiny_model(tiny_config, tmp_path):
+    '''A KModel with the real architecture, a small ALBERT and random weights.'''
+    torch.manual_seed(0)
+    torch.save({}, tmp_path / 'model.pth')
+    return KModel(repo_id='hexgrad/Kokoro-82M', config=tiny_config, model=str(tmp_path / 'model.pth')).eval()
@@ -0,0 +1,35 @@
+import pytest
+import torch
+from kokoro.modules import AlbertConfig, CustomAlbert
+
+transformers = pytest.importorskip("transformers")
+
+
+@pytest.fixture
+def models():
+    torch.manual_seed(0)
+    kwargs = dict(
+        vocab_size=178, hidden_size=96, num_attention_heads=4,
+        intermediate_size=128, max_position_embeddings=64, num_hidden_layers=3,
+    )
+    reference = transformers.AlbertModel(transformers.AlbertConfig(**kwargs)).eval()
+    native = CustomAlbert(AlbertConfig(**kwargs)).eval()
+    native.load_state_dict(reference.state_dict(), strict=False)
+    return reference, native
+
+
+def test_state_dict_keys_match(models):
+    reference, native = models
+    expected = {k for k in reference.state_dict() if not k.endswith('position_ids')}
+    assert set(native.state_dict()) == expected
+
+
+def test_albert_equivalence(models):
+    reference, native = models
+    input_ids = torch.randint(1, 178, (2, 40))
+    attention_mask = torch.ones_like(input_ids)
+    attention_mask[1, 25:] = 0
+    with torch.no_grad():
+        expected = reference(input_ids, attention_mask=attention_mask).last_hidden_state
+        actual = native(input_ids, attention_mask=attention_mask)
+    assert torch.allclose(actual, expected, atol=1e-5)
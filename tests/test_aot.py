@@ -0,0 +1,20 @@
+import pytest
+import torch
+
+from kokoro import KModel
+from kokoro.modules import EXPORTABLE
+
+
+@pytest.mark.skipif(
+    not EXPORTABLE or not hasattr(torch._inductor, 'aoti_compile_and_package'),
+    reason='AOTInductor is unavailable'
+)
+def test_export_round_trip(tiny_model, tmp_path):
+    from kokoro.export.aot import export
+    path = export(tiny_model, str(tmp_path / 'aot'), max_frames=256)
+    compiled = KModel.from_compiled(path)
+    phonemes, ref_s = 'abc def.', torch.randn(1, 256)
+    expected = tiny_model(phonemes, ref_s, return_output=True)
+    output = compiled(phonemes, ref_s, return_output=True)
+    assert torch.equal(output.pred_dur, expected.pred_dur)
+    assert output.audio.shape == expected.audio.shape
@@ -0,0 +1,35 @@
+import torch
+from misaki import en
+
+from kokoro import KPipeline
+from kokoro.corpus import Corpus, write
+
+
+def test_corpus_round_trip(tmp_path):
+    pipeline = KPipeline(lang_code='e', repo_id='hexgrad/Kokoro-82M', model=False)
+    text = ['Hola mundo. ¿Cómo estás?', 'Segunda línea, con eñes.']
+    results = list(pipeline(text))
+    vocab = {p: i + 1 for i, p in enumerate(sorted({p for r in results for p in r.phonemes} - {'¿'}))}
+
+    path = str(tmp_path / 'corpus.kc')
+    assert write(path, pipeline, text, vocab=vocab) == len(results)
+    corpus = Corpus(path)
+    assert (corpus.lang_code, corpus.vocab) == ('e', vocab)
+    for result, chunk in zip(results, corpus):
+        assert (chunk.graphemes, chunk.phonemes, chunk.text_index) == (result.graphemes, result.phonemes, result.text_index)
+        assert chunk.input_ids.tolist() == [vocab[p] for p in result.phonemes if p in vocab]  # '¿' is dropped
+        assert chunk.tokens is None
+
+
+def test_corpus_tokens(tmp_path):
+    class Quiet:
+        model, repo_id, lang_code = None, 'hexgrad/Kokoro-82M', 'a'
+
+        def __call__(self, text, split_pattern=None):
+            tokens = [en.MToken('Hi', 'UH', ' ', 'hˈI'), en.MToken('there', 'RB', '', 'ðˈɛɹ')]
+            yield KPipeline.Result(graphemes='Hi there', phonemes='hˈI ðˈɛɹ', tokens=tokens, text_index=0)
+
+    path = str(tmp_path / 'corpus.kc')
+    write(path, Quiet(), 'Hi there', vocab={p: i + 1 for i, p in enumerate('hˈI ðɛɹ')})
+    tokens = Corpus(path)[0].tokens
+    assert [(t.text, t.tag, t.whitespace, t.phonemes) for t in tokens] == [('Hi', 'UH', ' ', 'hˈI'), ('there', 'RB', '', 'ðˈɛɹ')]
@@ -1,8 +1,8 @@
 import torch
 import numpy as np
 import pytest
-from kokoro.custom_stft import CustomSTFT
-from kokoro.istftnet import TorchSTFT
+from kokoro.custom_stft import CustomSTFT, FFTSTFT, StreamingISTFT
+from kokoro.istftnet import STFT_BACKENDS, TorchSTFT, select_stft
 import torch.nn.functional as F
 
 
@@ -79,3 +79,74 @@ def test_different_window_sizes():
 
         # Check that output length is reasonable
         assert output.shape[-1] >= signal.shape[-1]
+
+
+@pytest.mark.parametrize("filter_length,hop_length", [(20, 5), (800, 200)])
+def test_backend_transform_equivalence(sample_audio, filter_length, hop_length):
+    outputs = {
+        name: backend(filter_length, hop_length, filter_length).transform(sample_audio)
+        for name, backend in STFT_BACKENDS.items()
+    }
+    torch_mag, torch_phase = outputs["torch"]
+
+    # FFTSTFT pads like torch.stft, so every frame matches
+    fft_mag, fft_phase = outputs["fft"]
+    assert torch.allclose(fft_mag, torch_mag, atol=1e-4)
+    loud = torch_mag > 1e-2  # phase is ill-defined on near-silent bins
+    assert torch.allclose(torch.cos(fft_phase[loud]), torch.cos(torch_phase[loud]), atol=1e-3)
+
+    # CustomSTFT replicate-pads, so only the frames clear of the edges match
+    custom_mag, _ = outputs["custom"]
+    assert torch.allclose(custom_mag[..., 2:-2], torch_mag[..., 2:-2], atol=1e-3)
+
+
+@pytest.mark.parametrize("filter_length,hop_length", [(20, 5), (800, 200)])
+def test_backend_inverse_equivalence(filter_length, hop_length):
+    # The generator feeds arbitrary magnitude/phase, not the STFT of a real signal
+    torch.manual_seed(0)
+    frames = 16000 // hop_length + 1
+    magnitude = torch.rand(2, filter_length // 2 + 1, frames) * 3
+    phase = torch.rand(2, filter_length // 2 + 1, frames) * 2 * np.pi - np.pi
+
+    outputs = {
+        name: backend(filter_length, hop_length, filter_length).inverse(magnitude, phase)
+        for name, backend in STFT_BACKENDS.items()
+    }
+    for name, output in outputs.items():
+        assert output.shape == (2, 1, 16000), name
+        assert torch.allclose(output, outputs["torch"], atol=1e-5), name
+
+
+def test_fft_reconstruction(sample_audio):
+    output = FFTSTFT(filter_length=800, hop_length=200, win_length=800)(sample_audio)
+    assert torch.allclose(output.squeeze(1), sample_audio, atol=1e-5)
+
+
+def test_select_stft():
+    name, timings = select_stft(20, 5)
+    assert set(timings) == set(STFT_BACKENDS)
+    assert timings[name] == min(timings.values())
+
+    name, timings = select_stft(20, 5, target="onnx")
+    assert (name, list(timings)) == ("custom", ["custom"])
+
+
+@pytest.mark.parametrize("name", list(STFT_BACKENDS))
+@pytest.mark.parametrize("filter_length,hop_length", [(20, 5), (800, 200)])
+def test_streaming_inverse(name, filter_length, hop_length):
+    torch.manual_seed(0)
+    magnitude = torch.rand(2, filter_length // 2 + 1, 37) * 3
+    phase = torch.rand(2, filter_length // 2 + 1, 37) * 2 * np.pi - np.pi
+    stft = STFT_BACKENDS[name](filter_length, hop_length, filter_length)
+    expected = stft.inverse(magnitude, phase)
+
+    stream = StreamingISTFT(stft)
+    for _ in range(2):  # flush() resets, so the stream is reusable
+        chunks = [
+            stream.push(magnitude[..., i:j], phase[..., i:j])
+            for i, j in [(0, 1), (1, 4), (4, 5), (5, 20), (20, 37)]
+        ]
+        chunks.append(stream.flush())
+        output = torch.cat(chunks, dim=-1)
+        assert output.shape == expected.shape
+        assert torch.allclose(output, expected, atol=1e-6)
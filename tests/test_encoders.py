@@ -0,0 +1,15 @@
+import torch
+
+from kokoro.modules import DurationEncoder, TextEncoder
+
+
+def test_unpadded_fast_path_matches_packed():
+    torch.manual_seed(0)
+    text_encoder = TextEncoder(channels=32, kernel_size=5, depth=2, n_symbols=20).eval()
+    duration_encoder = DurationEncoder(sty_dim=16, d_model=32, nlayers=2).eval()
+    input_ids = torch.randint(1, 20, (1, 9))
+    lengths, mask = torch.LongTensor([9]), torch.zeros(1, 9, dtype=torch.bool)
+    d_en, s = torch.randn(1, 32, 9), torch.randn(1, 16)
+    with torch.no_grad():
+        assert torch.allclose(text_encoder(input_ids, None, mask), text_encoder(input_ids, lengths, mask), atol=1e-6)
+        assert torch.allclose(duration_encoder(d_en, s, None, mask), duration_encoder(d_en, s, lengths, mask), atol=1e-6)
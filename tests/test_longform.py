@@ -0,0 +1,38 @@
+import json
+import os
+
+import pytest
+import torch
+
+from kokoro import KPipeline, longform
+from kokoro.manifest import render
+
+
+def test_resumable_render(tiny_config, tiny_model, tmp_path):
+    config, weights = tmp_path / 'config.json', tmp_path / 'weights.pth'
+    config.write_text(json.dumps(tiny_config))
+    torch.save({k: getattr(tiny_model, k).state_dict() for k in ('bert', 'bert_encoder', 'predictor', 'text_encoder', 'decoder')}, weights)
+    voice = torch.randn(510, 1, 256)
+    lines = ['Hola mundo.', 'Una segunda frase.', 'Y la tercera.']
+    path = str(tmp_path / 'book.wav')
+    kwargs = dict(lang_code='e', seed=0, workers=0, config=str(config), model=str(weights))
+
+    def crash(progress):
+        if progress.done == 2:
+            raise KeyboardInterrupt
+    with pytest.raises(KeyboardInterrupt):
+        longform.render(lines, path, voice, progress=crash, **kwargs)
+    assert sorted(os.listdir(path + '.parts')) == ['000000.npz', '000001.npz', 'corpus.kc', 'job.json', 'voice.pt']
+
+    done = []
+    sidecar = longform.render(lines, path, voice, progress=lambda p: done.append(p.done), **kwargs)
+    assert done == [3]  # only the last chunk was left
+    assert not os.path.exists(path + '.parts')
+    chunks = json.load(open(sidecar))
+    assert [c['text_index'] for c in chunks] == [0, 1, 2]
+    assert chunks[0]['start'] == 0 and chunks[-1]['end'] > chunks[0]['end']
+
+    # Same audio as synthesizing through the pipeline
+    pipeline = KPipeline(lang_code='e', repo_id='hexgrad/Kokoro-82M', model=tiny_model)
+    expected = render(pipeline, lines, str(tmp_path / 'expected.wav'), voice, seed=0)
+    assert open(path, 'rb').read() == open(expected.path, 'rb').read()
@@ -0,0 +1,24 @@
+import torch
+
+from kokoro import KPipeline
+from kokoro.manifest import load, manifest_path, render
+
+
+def test_incremental_render(tiny_model, tmp_path):
+    pipeline = KPipeline(lang_code='e', repo_id='hexgrad/Kokoro-82M', model=tiny_model)
+    voice = torch.randn(510, 1, 256)
+    lines = ['Hola mundo.', 'Una segunda frase.', 'Y la tercera.']
+    path = str(tmp_path / 'book.wav')
+
+    report = render(pipeline, lines, path, voice, seed=0)
+    assert (report.synthesized, report.reused) == (3, 0)
+    assert load(manifest_path(path)) == report.chunks
+
+    lines[1] = 'Una frase editada.'
+    report = render(pipeline, lines, path, voice, seed=0)
+    assert (report.synthesized, report.reused) == (1, 2)
+
+    # With a seed, splicing gives the same file as rendering from scratch
+    fresh = render(pipeline, lines, str(tmp_path / 'fresh.wav'), voice, seed=0)
+    assert fresh.synthesized == 3
+    assert open(path, 'rb').read() == open(fresh.path, 'rb').read()
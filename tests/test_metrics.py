@@ -0,0 +1,33 @@
+import pytest
+
+from kokoro.metrics import MetricsRegistry, PrometheusRegistry
+
+
+def test_prometheus_render():
+    registry = PrometheusRegistry()
+    registry.inc('kokoro_chunks_total')
+    registry.inc('kokoro_chunks_total', 2)
+    registry.inc('kokoro_truncations_total', lang='a')
+    registry.observe('kokoro_chunk_phonemes', 100)
+    registry.observe('kokoro_chunk_phonemes', 500)
+    text = registry.render()
+
+    assert '# TYPE kokoro_chunks_total counter' in text
+    assert 'kokoro_chunks_total 3' in text
+    assert 'kokoro_truncations_total{lang="a"} 1' in text
+    assert 'kokoro_chunk_phonemes_bucket{le="64"} 0' in text
+    assert 'kokoro_chunk_phonemes_bucket{le="128"} 1' in text
+    assert 'kokoro_chunk_phonemes_bucket{le="+Inf"} 2' in text
+    assert 'kokoro_chunk_phonemes_sum 600' in text
+    assert 'kokoro_chunk_phonemes_count 2' in text
+
+
+def test_registry_is_abstract():
+    class Counting(MetricsRegistry):
+        def inc(self, name, value=1, **labels):
+            pass
+
+    with pytest.raises(TypeError):
+        MetricsRegistry()
+    with pytest.raises(TypeError):
+        Counting()  # observe is missing
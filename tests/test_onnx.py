@@ -0,0 +1,30 @@
+import pytest
+import torch
+
+pytest.importorskip('onnx')
+pytest.importorskip('onnxruntime')
+
+from kokoro import KPipeline
+from kokoro.export.onnx import KModelORT, export
+
+
+def test_export_matches_torch(tiny_model, tiny_config, tmp_path):
+    tiny_model.set_stft('custom')
+    tiny_model.train()
+    path = export(tiny_model, str(tmp_path / 'kokoro.onnx'), validate_lengths=(16, 40))
+    assert tiny_model.training  # the caller's model is left as it was
+
+    model = KModelORT(path, repo_id='hexgrad/Kokoro-82M', config=tiny_config)
+    phonemes, ref_s = 'abc def.', torch.randn(1, 256)
+    output = model(phonemes, ref_s, return_output=True)
+    expected = tiny_model.eval()(phonemes, ref_s, return_output=True)
+    assert torch.equal(output.pred_dur, expected.pred_dur)
+    assert output.audio.shape == expected.audio.shape
+
+    # No forward_batch: batch_chunks falls back to one chunk at a time
+    pipeline = KPipeline(lang_code='e', repo_id='hexgrad/Kokoro-82M', model=model)
+    voice = torch.randn(510, 1, 256)
+    lines = ['Hola.', 'Otra frase.', 'Adiós.']
+    batched = list(pipeline(lines, voice, batch_chunks=2))
+    assert [r.phonemes for r in batched] == [r.phonemes for r in pipeline(lines, voice)]
+    assert all(r.audio is not None for r in batched)
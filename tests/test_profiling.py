@@ -0,0 +1,38 @@
+import torch
+
+from kokoro import KPipeline
+from kokoro.profiling import StageTimer
+
+STAGES = {
+    'text_cache', 'bert', 'bert_encoder', 'text_encoder', 'predictor.text_encoder', 'duration',
+    'alignment', 'F0Ntrain', 'decoder', 'generator', 'stft'
+}
+
+
+def test_forward_stages(tiny_model):
+    timer = StageTimer()
+    output = tiny_model('abc def.', torch.randn(1, 256), return_output=True, timer=timer)
+    assert output.timings is timer.timings
+    assert set(timer.timings) == STAGES
+    t = timer.timings
+    assert t['decoder'] >= t['generator'] >= t['stft']
+    assert t['text_cache'] >= t['bert'] + t['bert_encoder'] + t['text_encoder']
+
+    # repeated stages accumulate
+    decoder = t['decoder']
+    tiny_model('abc def.', torch.randn(1, 256), timer=timer)
+    assert timer.timings['decoder'] > decoder
+    assert tiny_model('abc def.', torch.randn(1, 256), return_output=True).timings is None
+
+
+def test_result_timings(tiny_model):
+    pipeline = KPipeline(lang_code='e', repo_id='hexgrad/Kokoro-82M', model=tiny_model)
+    voice = torch.randn(510, 1, 256)
+    for result in pipeline('Hola. Adiós.', voice):
+        assert result.timings is None
+        assert result.output.timings is None
+    results = list(pipeline('Hola. Adiós.', voice, profile=True))
+    assert results
+    for result in results:
+        assert {'g2p', 'chunking', 'decoder', 'generator', 'stft'} <= set(result.timings)
+        assert result.timings['decoder'] >= result.timings['generator'] >= result.timings['stft']
@@ -0,0 +1,60 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from kokoro import registry
+from kokoro.registry import LocalRegistry, sha256
+
+
+@pytest.fixture
+def local_registry(tmp_path):
+    '''A registry with one voice of hexgrad/Kokoro-82M and its checksum.'''
+    voice = tmp_path / 'hexgrad' / 'Kokoro-82M' / 'voices' / 'af_test.pt'
+    voice.parent.mkdir(parents=True)
+    voice.write_bytes(b'voice')
+    relpath = 'hexgrad/Kokoro-82M/voices/af_test.pt'
+    manifest = {'version': 1, 'models': {'hexgrad/Kokoro-82M': {
+        'voices': {'af_test': relpath}, 'sha256': {relpath: sha256(str(voice))}
+    }}}
+    (tmp_path / 'manifest.json').write_text(json.dumps(manifest))
+    return tmp_path
+
+
+def test_checksums(local_registry):
+    assert LocalRegistry(str(local_registry), verify=True).voice('hexgrad/Kokoro-82M', 'af_test')
+    (local_registry / 'hexgrad/Kokoro-82M/voices/af_test.pt').write_bytes(b'tampered')
+    assert LocalRegistry(str(local_registry)).voice('hexgrad/Kokoro-82M', 'af_test')
+    with pytest.raises(ValueError):
+        LocalRegistry(str(local_registry), verify=True).voice('hexgrad/Kokoro-82M', 'af_test')
+
+
+def test_set_registry_keeps_env_offline(local_registry, monkeypatch):
+    monkeypatch.setenv('KOKORO_OFFLINE', '1')
+    try:
+        registry.set_registry(LocalRegistry(str(local_registry)))
+        assert registry.offline()
+        with pytest.raises(FileNotFoundError):
+            registry.voice_path('hexgrad/Kokoro-82M', 'af_missing')
+    finally:
+        registry.set_registry(None)
+
+
+def test_offline_never_imports_hub(local_registry):
+    # In a fresh interpreter, since other tests (and transformers) import huggingface_hub
+    code = '''
+import sys
+from kokoro import registry
+assert registry.voice_path('hexgrad/Kokoro-82M', 'af_test').endswith('af_test.pt')
+try:
+    registry.voice_path('hexgrad/Kokoro-82M', 'af_missing')
+    raise AssertionError('expected FileNotFoundError')
+except FileNotFoundError:
+    pass
+assert 'huggingface_hub' not in sys.modules
+'''
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {'KOKORO_HOME': str(local_registry), 'KOKORO_OFFLINE': '1', 'PYTHONPATH': root}
+    subprocess.run([sys.executable, '-c', code], env=env, check=True)
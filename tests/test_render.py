@@ -0,0 +1,120 @@
+import os
+import pytest
+import torch
+
+from kokoro import KModel, KPipeline
+from kokoro.profiling import StageTimer
+
+
+def test_render_matches_forward(tiny_model):
+    phonemes, ref_s = 'abc def.', torch.randn(1, 256)
+
+    state = tiny_model.prepare(phonemes, ref_s)
+    for speed in (0.8, 1, 1.3):
+        expected = tiny_model(phonemes, ref_s, speed, return_output=True, seed=0)
+        output = tiny_model.render(state, speed, return_output=True, seed=0)
+        assert torch.equal(output.audio, expected.audio)
+        assert torch.equal(output.pred_dur, expected.pred_dur)
+
+
+def test_forward_voices(tiny_model):
+    phonemes, ref_s = 'abc def.', torch.randn(3, 256)
+    outputs = tiny_model.forward_voices(phonemes, ref_s, return_output=True, seed=0)
+    assert len(tiny_model.text_cache) == 1
+    for i, output in enumerate(outputs):
+        expected = tiny_model(phonemes, ref_s[i:i+1], return_output=True, seed=0)
+        assert torch.equal(output.pred_dur, expected.pred_dur)
+        assert torch.allclose(output.audio, expected.audio, atol=1e-5)  # the predictor ran as a batch
+    assert len(tiny_model.text_cache) == 1
+
+
+def test_batch_chunks(tiny_model):
+    pipeline = KPipeline(lang_code='e', repo_id='hexgrad/Kokoro-82M', model=tiny_model)
+    voice = torch.randn(510, 1, 256)
+    lines = ['Hola.', 'Una frase bastante más larga que la primera.', 'Otra frase.', 'Sí.', 'Adiós.']
+    expected = list(pipeline(lines, voice, speed=1.1, seed=0))
+    tiny_model.style_cache.clear()
+    batched = list(pipeline(lines, voice, speed=1.1, seed=0, batch_chunks=3))
+    assert len(tiny_model.style_cache) == len({len(r.phonemes) for r in expected})  # styles are cached per pack row
+    assert [r.phonemes for r in batched] == [r.phonemes for r in expected]
+    for a, b in zip(batched, expected):
+        assert torch.equal(a.pred_dur, b.pred_dur)
+        assert a.audio.shape == b.audio.shape
+
+
+def test_frame_groups():
+    assert KModel.frame_groups([100, 10, 95, 12]) == [[1, 3], [2, 0]]
+    assert KModel.frame_groups([10, 100]) == [[0], [1]]
+
+
+def test_warmup(tiny_model, tmp_path):
+    report = tiny_model.warmup(lengths=[4, 100], runs=2)
+    assert list(report) == [4, 62]  # capped to the context
+    assert all(r['first'] > 0 and r['steady'] > 0 and r['audio'] > 0 for r in report.values())
+
+    voice = str(tmp_path / 'voice.pt')
+    torch.save(torch.randn(510, 1, 256), voice)
+    pipeline = KPipeline(lang_code='e', repo_id='hexgrad/Kokoro-82M', model=tiny_model)
+    report = pipeline.warmup(voices=[voice], lengths=[8], text='Hola.')
+    assert list(report['voices']) == [voice] and voice in pipeline.voices
+    assert report['g2p'] > 0 and list(report['model']) == [8]
+
+
+def test_text_cache_stages(tiny_model):
+    ref_s = torch.randn(1, 256)
+    miss, hit = StageTimer(), StageTimer()
+    tiny_model('abc def.', ref_s, timer=miss)
+    tiny_model('abc def.', ref_s, timer=hit)
+    assert {'text_cache', 'bert', 'bert_encoder', 'text_encoder'} <= set(miss.timings)
+    assert set(miss.timings) - set(hit.timings) == {'bert', 'bert_encoder', 'text_encoder'}
+
+
+
+def test_decode_ignores_padding(tiny_model):
+    # Garbage in a group's padded frames must not change any valid output sample
+    aligned = []
+    for phonemes in ('abc def.', 'a b.'):
+        pred_dur, d, t_en = tiny_model.encode(tiny_model._input_ids(phonemes), torch.randn(1, 256))
+        aligned.append(tiny_model.align(pred_dur, d, t_en))
+    frames = [en.shape[-1] for en, _ in aligned]
+    N = max(frames)
+    assert min(frames) < N
+    mask = (torch.arange(N) < torch.tensor(frames)[:, None]).unsqueeze(1)
+    ref_s = torch.randn(2, 256)
+    audio = []
+    for fill in (torch.zeros, lambda *size: 100 * torch.randn(*size)):
+        en, asr = (torch.cat([torch.cat([x[i], fill(1, x[i].shape[1], N - f)], -1) for i, f in enumerate(frames)])
+                   for x in zip(*aligned))
+        audio.append(tiny_model.decode(en, asr, ref_s, mask=mask, generator=torch.Generator().manual_seed(0)).view(2, -1))
+    hop = audio[0].shape[-1] // N
+    for i, f in enumerate(frames):
+        assert torch.equal(audio[0][i, :hop * f], audio[1][i, :hop * f])
+
+
+def test_bucketed_durations(tiny_model, tmp_path, monkeypatch):
+    phonemes, ref_s = 'abc def, ghi jkl.', torch.randn(1, 256)
+    expected = tiny_model(phonemes, ref_s, return_output=True, seed=0)
+
+    monkeypatch.setenv('TORCHINDUCTOR_CACHE_DIR', str(tmp_path / 'before'))
+    tiny_model.compile(buckets=(8, 32), cache_dir=str(tmp_path / 'inductor'), warmup=False)
+    assert os.environ['TORCHINDUCTOR_CACHE_DIR'] == str(tmp_path / 'before')
+    tiny_model._encode, tiny_model._decode = tiny_model.encode, tiny_model.decode  # bucketing without compiling
+    output = tiny_model(phonemes, ref_s, return_output=True, seed=0)
+    assert torch.equal(output.pred_dur, expected.pred_dur)
+    assert output.audio.shape == expected.audio.shape
+    assert os.environ['TORCHINDUCTOR_CACHE_DIR'] == str(tmp_path / 'before')
+
+
+def test_bucketed_lengths_follow_ids(tiny_model):
+    class Stop(Exception):
+        pass
+
+    def encode(input_ids, ref_s, speed, input_lengths):
+        # text_mask compares input_lengths with an arange on input_ids.device
+        assert input_lengths.device == input_ids.device
+        raise Stop
+
+    tiny_model.buckets, tiny_model.frame_buckets = [32], [128]
+    tiny_model._encode = encode
+    with pytest.raises(Stop):
+        tiny_model.forward_bucketed(torch.zeros(1, 10, dtype=torch.long, device='meta'), torch.randn(1, 256))
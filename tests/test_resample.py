@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+import torch
+
+from kokoro.resample import StreamingResampler, alaw_decode, alaw_encode, resample, transcode, ulaw_decode, ulaw_encode
+
+
+@pytest.mark.parametrize("target_sr", [16000, 8000])
+def test_streaming_matches_one_shot(target_sr):
+    rng = np.random.default_rng(0)
+    audio = rng.standard_normal(24000).astype(np.float32) * 0.3
+    expected = resample(audio, 24000, target_sr)
+    assert len(expected) == 24000 * target_sr // 24000
+
+    resampler = StreamingResampler(24000, target_sr)
+    for _ in range(2):  # flush() resets, so the resampler is reusable
+        bounds = [0, 1, 7, 500, 501, 9000, 24000]
+        chunks = [resampler.push(audio[i:j]) for i, j in zip(bounds, bounds[1:])]
+        chunks.append(resampler.flush())
+        assert np.array_equal(np.concatenate(chunks), expected)
+
+
+def test_resample_filters_aliases():
+    t = np.arange(24000) / 24000
+    rms = lambda f: np.sqrt(2 * np.mean(resample(np.sin(2 * np.pi * f * t), 24000, 8000)[100:-100] ** 2))
+    assert abs(rms(1000) - 1) < 1e-2
+    assert rms(6000) < 1e-2  # above the 4 kHz Nyquist frequency
+
+
+def test_g711():
+    pcm = np.arange(-32768, 32768, dtype=np.int16)
+    for encode, decode in [(ulaw_encode, ulaw_decode), (alaw_encode, alaw_decode)]:
+        codes = encode(pcm)
+        assert codes.dtype == np.uint8
+        assert np.array_equal(encode(decode(codes)), codes)
+        # 8-bit log companding: relative error stays small away from zero
+        loud = np.abs(pcm.astype(np.int32)) > 1024
+        assert np.all(np.abs(decode(codes)[loud].astype(np.int32) - pcm[loud]) <= np.abs(pcm[loud].astype(np.int32)) / 16)
+
+
+def test_transcode():
+    chunks = [torch.randn(2400) * 0.1, None, torch.randn(4800) * 0.1]
+    payloads = list(transcode(chunks, sample_rate=8000, encoding='ulaw'))
+    assert len(payloads) == 3  # one per chunk with audio, then the tail
+    assert sum(map(len, payloads)) == (2400 + 4800) // 3
@@ -0,0 +1,28 @@
+import pytest
+
+from kokoro.runtime import KokoroRuntime
+
+
+def test_routing_and_eviction():
+    assert KokoroRuntime.route(voice='af_heart') == 'a'
+    assert KokoroRuntime.route(voice='/voices/ef_dora.pt') == 'e'
+    assert KokoroRuntime.route(voice='af_heart', lang_code='en-gb') == 'b'
+    with pytest.raises(ValueError):
+        KokoroRuntime.route(voice='xx_voice')
+
+    loaded = []
+    runtime = KokoroRuntime(model=False, idle_timeout=3600, on_load=loaded.append)
+    assert runtime.languages == []  # nothing is built up front
+    spanish = runtime.pipeline(voice='ef_dora')
+    assert runtime.pipeline(lang_code='es') is spanish
+    runtime.pipeline(lang_code='fr-fr')
+    assert [p.lang_code for p in loaded] == ['e', 'f']
+
+    runtime.idle_timeout = 0
+    assert runtime.evict(keep='f') == ['e']
+    assert runtime.languages == ['f']
+
+    runtime.idle_timeout, runtime.memory_budget = None, -1  # always over budget
+    runtime.pipeline(lang_code='e')
+    assert runtime.languages == ['e']
+    assert [p.lang_code for p in loaded] == ['e', 'f', 'e']
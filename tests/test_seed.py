@@ -0,0 +1,15 @@
+import torch
+
+from kokoro.istftnet import SourceModuleHnNSF
+
+
+def test_source_is_seedable():
+    source = SourceModuleHnNSF(sampling_rate=24000, upsample_scale=300, harmonic_num=8).eval()
+    f0 = torch.rand(1, 3000, 1) * 300
+
+    def run(seed):
+        return source(f0, torch.Generator().manual_seed(seed))
+
+    for a, b in zip(run(0), run(0)):
+        assert torch.equal(a, b)
+    assert not torch.equal(run(0)[0], run(1)[0])
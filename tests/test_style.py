@@ -0,0 +1,42 @@
+import torch
+
+from kokoro import KPipeline
+from kokoro.istftnet import AdaIN1d, Style
+from kokoro.modules import AdaLayerNorm, ProsodyPredictor
+
+
+def test_precomputed_style_matches():
+    torch.manual_seed(0)
+    predictor = ProsodyPredictor(style_dim=16, d_hid=32, nlayers=2).eval()
+    s = torch.randn(1, 16)
+    layers = [m for m in predictor.modules() if isinstance(m, (AdaIN1d, AdaLayerNorm))]
+    style = Style.precompute(layers, s)
+    assert len(style.projections) == len(layers) > 0
+
+    d_en, lengths = torch.randn(1, 32, 7), torch.LongTensor([7])
+    mask = torch.zeros(1, 7, dtype=torch.bool)
+    en = torch.randn(1, 32 + 16, 20)
+    with torch.no_grad():
+        assert torch.equal(predictor.text_encoder(d_en, s, lengths, mask), predictor.text_encoder(d_en, style, lengths, mask))
+        for a, b in zip(predictor.F0Ntrain(en, s), predictor.F0Ntrain(en, style)):
+            assert torch.equal(a, b)
+
+
+def test_style_cache_follows_pack(tiny_model):
+    pipeline = KPipeline(lang_code='e', repo_id='hexgrad/Kokoro-82M', model=tiny_model)
+    def render(voice):
+        [result] = pipeline('Hola.', voice, seed=0)
+        return result
+    def uncached(result, pack):
+        return tiny_model(result.phonemes, pack[len(result.phonemes)-1], seed=0)
+
+    pipeline.voices['ef_test'] = torch.randn(510, 1, 256)
+    first = render('ef_test')
+    assert len(tiny_model.style_cache) == 1
+    pipeline.voices['ef_test'] = replaced = torch.randn(510, 1, 256)
+    result = render('ef_test')
+    assert not torch.equal(result.audio, first.audio)
+    assert torch.equal(result.audio, uncached(result, replaced))
+    replaced.mul_(2)  # edited in place
+    result = render('ef_test')
+    assert torch.equal(result.audio, uncached(result, replaced))
@@ -0,0 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from kokoro import KPipeline, KPipelinePool
+
+TEXTS = ['Hola mundo.', 'Una segunda frase, algo más larga.', 'Y la tercera.', 'Adiós.']
+
+
+def synthesize(pipeline, text, voice):
+    return [(r.phonemes, r.pred_dur, r.audio) for r in pipeline(text, voice, seed=0)]
+
+
+def test_concurrent_matches_serial(tiny_model, tmp_path):
+    voices = []
+    for i in range(2):
+        voices.append(str(tmp_path / f'voice{i}.pt'))
+        torch.save(torch.randn(510, 1, 256), voices[-1])
+    jobs = [(TEXTS[i % len(TEXTS)], voices[i % len(voices)]) for i in range(16)]
+
+    serial = KPipeline(lang_code='e', repo_id='hexgrad/Kokoro-82M', model=tiny_model)
+    expected = [synthesize(serial, text, voice) for text, voice in jobs]
+    tiny_model.style_cache.clear()
+    tiny_model.text_cache.clear()
+
+    shared = KPipeline(lang_code='e', repo_id='hexgrad/Kokoro-82M', model=tiny_model)
+    pool = KPipelinePool(lang_code='e', size=3, repo_id='hexgrad/Kokoro-82M', model=tiny_model)
+    for pipeline in (shared, pool):
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(lambda job: synthesize(pipeline, *job), jobs))
+        for got, want in zip(results, expected):
+            assert [ps for ps, _, _ in got] == [ps for ps, _, _ in want]
+            for (_, dur, audio), (_, want_dur, want_audio) in zip(got, want):
+                assert torch.equal(dur, want_dur)
+                assert torch.equal(audio, want_audio)
+        # Every thread got the same cached pack
+        assert all(pipeline.load_voice(v) is pipeline.load_voice(v) for v in voices)
+    assert pool.in_flight == [0, 0, 0]
+    assert all(p.voices is pool.pipelines[0].voices for p in pool.pipelines)
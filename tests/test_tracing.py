@@ -0,0 +1,55 @@
+import json
+
+import torch
+
+from kokoro import KPipeline, tracing
+
+
+def within(inner, outer):
+    return outer['ts'] <= inner['ts'] and inner['ts'] + inner['dur'] <= outer['ts'] + outer['dur']
+
+
+def test_nested_spans(tiny_model, tmp_path):
+    pipeline = KPipeline(lang_code='e', repo_id='hexgrad/Kokoro-82M', model=tiny_model)
+    tracer = tracing.Tracer(sample_rate=1)
+    tracing.set_tracer(tracer)
+    try:
+        list(pipeline(['Hola.', 'Adiós.'], torch.randn(510, 1, 256)))
+    finally:
+        tracing.set_tracer(None)
+    tracer.dump(str(tmp_path / 'trace.json'))
+    with open(tmp_path / 'trace.json') as r:
+        events = json.load(r)['traceEvents']
+
+    spans = [e for e in events if e['ph'] == 'X']
+    assert len({e['tid'] for e in events}) == 1
+    named = lambda name: [e for e in spans if e['name'] == name]
+    [request] = named('request')
+    segments = named('segment')
+    assert [s['args']['index'] for s in segments] == [0, 1]
+    assert all(within(s, request) for s in segments)
+    for name in ('g2p', 'chunk', 'yield'):
+        assert len(named(name)) == 2
+        assert all(any(within(e, s) for s in segments) for e in named(name))
+    for name in ('bert', 'decoder', 'generator'):  # KModel stages
+        assert named(name) and all(any(within(e, c) for c in named('chunk')) for e in named(name))
+
+
+def test_batch_spans(tiny_model):
+    pipeline = KPipeline(lang_code='e', repo_id='hexgrad/Kokoro-82M', model=tiny_model)
+    tracer = tracing.Tracer(sample_rate=1)
+    tracing.set_tracer(tracer)
+    try:
+        list(pipeline(['Hola.', 'Otra frase.', 'Adiós.'], torch.randn(510, 1, 256), batch_chunks=2))
+    finally:
+        tracing.set_tracer(None)
+
+    spans = [e for e in tracer.events if e['ph'] == 'X']
+    assert len({e['tid'] for e in tracer.events}) == 1  # G2P and batches share one sampled trace
+    named = lambda name: [e for e in spans if e['name'] == name]
+    [request] = named('request')
+    batches = named('batch')
+    assert [b['args']['chunks'] for b in batches] == [2, 1]
+    assert all(within(e, request) for e in named('segment') + batches)
+    for name in ('bert', 'decoder', 'generator'):  # KModel stages
+        assert named(name) and all(any(within(e, b) for b in batches) for e in named(name))
@@ -0,0 +1,27 @@
+import torch
+
+from kokoro import tuning
+
+
+def test_layout_and_profile(tmp_path, monkeypatch):
+    monkeypatch.setattr(tuning, 'cpu_order', lambda: [0, 2, 4, 6, 1, 3, 5, 7])
+    assert tuning.layout(2, 2) == [[0, 2], [4, 6]]
+    assert tuning.layout(3, 4)[2] == [0, 2, 4, 6]  # oversubscribed layouts wrap around
+    assert tuning.candidates(6) == [1, 2, 4, 6]
+
+    path = str(tmp_path / 'tuning.json')
+    monkeypatch.setenv('KOKORO_TUNING', path)
+    assert tuning.apply() is None
+    profile = tuning.TuningProfile(workers=1, threads=1, stft='fft', affinity=[[0]])
+    assert tuning.save(profile) == path
+    assert tuning.load() == profile
+    with open(path, 'w') as w:
+        w.write('{"workers": 2, "threads": 1, "stft": "fft"}')  # written before batch_chunks existed
+    assert tuning.load().batch_chunks == 1
+
+    threads = torch.get_num_threads()
+    try:
+        assert tuning.apply(profile=tuning.TuningProfile(workers=1, threads=1, stft='fft')).stft == 'fft'
+        assert torch.get_num_threads() == 1
+    finally:
+        torch.set_num_threads(threads)